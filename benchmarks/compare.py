@@ -0,0 +1,66 @@
+"""
+Сравнение двух результатов benchmarks/load.py.
+
+Печатает по каждому эндпоинту пропускную способность и перцентили до и после и
+возвращает код 1, если p99 какого-либо эндпоинта вырос больше чем на --threshold процентов.
+
+Запуск из корня репозитория:
+    python benchmarks/compare.py results/base.json results/head.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def change(before, after) -> str:
+    if not before or after is None:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def compare(base: dict, head: dict, threshold: float) -> list[str]:
+    """
+    Печатает сравнение результатов по эндпоинтам.
+
+    Returns:
+        list[str]: эндпоинты, у которых p99 вырос больше чем на threshold процентов
+    """
+    regressions = []
+    rows = {**base['endpoints'], **head['endpoints'], 'total': None}
+    for endpoint in rows:
+        before = base['total'] if endpoint == 'total' else base['endpoints'].get(endpoint, {})
+        after = head['total'] if endpoint == 'total' else head['endpoints'].get(endpoint, {})
+        cells = [
+            f"{metric} {before.get(metric)} -> {after.get(metric)} ({change(before.get(metric), after.get(metric))})"
+            for metric in METRICS
+        ]
+        print(f'{endpoint:24} ' + '  '.join(cells))
+        p99_before, p99_after = before.get('p99_ms'), after.get('p99_ms')
+        if p99_before and p99_after and (p99_after - p99_before) / p99_before * 100 > threshold:
+            regressions.append(endpoint)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Сравнение результатов нагрузочного теста')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=10, help='допустимый рост p99, %%')
+    args = parser.parse_args()
+
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    print(f"base {base['meta']['git_commit']} -> head {head['meta']['git_commit']}")
+
+    regressions = compare(base, head, args.threshold)
+    if regressions:
+        print(f"p99 regression over {args.threshold}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Генератор синтетического набора данных для нагрузочных тестов.
+
+Создает --users пользователей, у каждого от 1 до --max-accounts счетов (распределение
+Парето: у большинства один счет) и --transactions транзакций за последние --days дней.
+Активность пользователей распределена по Ципфу с показателем --zipf: пользователь с рангом r
+получает долю транзакций, пропорциональную 1 / r ** zipf, ранг совпадает с порядком ID.
+Подписи транзакций считаются тем же алгоритмом, что и в verify_signature, баланс счета
+равен сумме его транзакций, поэтому сверка после загрузки не находит расхождений.
+
+Пользователи делятся между --workers процессами через одного, каждый процесс загружает
+своих пользователей, их счета и транзакции через COPY в отдельном соединении. Транзакции
+генерируются детерминированно из --seed дважды: первый проход считает балансы счетов,
+второй передается в COPY кусками, поэтому память не зависит от числа транзакций.
+После загрузки пересчитываются account_summary и account_daily_summary, а в --manifest
+пишется выборка пользователей с паролем и счетами для benchmarks/load.py, а также
+--hot-users самых активных пользователей с ожидаемым числом транзакций (для сценариев
+с горячими счетами и с большими ответами).
+
+Запуск из корня репозитория после alembic upgrade head:
+    python benchmarks/generate.py --users 100000 --transactions 5000000 --workers 8
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import asyncpg
+import bcrypt
+
+from config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, TRANSACTION_SECRET_KEY
+from transactions.partitions import add_months, partition_name
+
+COPY_CHUNK_ROWS = 50000
+USER_ROLE_ID = 2
+TRANSACTION_COLUMNS = ['transaction_id', 'user_id', 'account_id', 'amount', 'signature', 'created_at']
+DSN = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+
+def transactions(
+        seed: int,
+        worker: int,
+        users: list[tuple[int, int, int]],
+        count: int,
+        weights: list[float],
+        days: int,
+        now: datetime,
+):
+    """
+    Детерминированно генерирует транзакции пользователей процесса.
+
+    Args:
+        users: тройки (user_id, ID первого счета, число счетов)
+        weights: веса активности пользователей (в том же порядке)
+    """
+    rng = random.Random(f'{seed}-{worker}-transactions')
+    cum_weights = list(itertools.accumulate(weights))
+    span = days * 86400
+    for number in range(count):
+        user_id, first_account, accounts = rng.choices(users, cum_weights=cum_weights)[0]
+        account_id = first_account + rng.randrange(accounts)
+        amount = rng.randint(1, 1000) if rng.random() < 0.8 else -rng.randint(1, 500)
+        transaction_id = f'bench-{seed}-{worker}-{number}'
+        message = f'{account_id}{amount}{transaction_id}{user_id}{TRANSACTION_SECRET_KEY}'
+        signature = hashlib.sha256(message.encode()).hexdigest()
+        created_at = now - timedelta(seconds=rng.uniform(0, span))
+        yield transaction_id, user_id, account_id, float(amount), signature, created_at
+
+
+def chunks(rows, size: int):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+async def load_slice(
+        seed: int,
+        worker: int,
+        users: list[tuple[int, int, int]],
+        count: int,
+        weights: list[float],
+        days: int,
+        now: datetime,
+        hashed_password: str,
+) -> int:
+    balances = {}
+    for _, _, account_id, amount, _, _ in transactions(seed, worker, users, count, weights, days, now):
+        balances[account_id] = balances.get(account_id, 0.0) + amount
+
+    conn = await asyncpg.connect(DSN)
+    try:
+        await conn.copy_records_to_table(
+            'user',
+            records=[
+                (user_id, f'bench{user_id}@example.com', f'Benchmark User {user_id}', hashed_password, USER_ROLE_ID)
+                for user_id, _, _ in users
+            ],
+            columns=['id', 'email', 'full_name', 'hashed_password', 'role_id'],
+        )
+        await conn.copy_records_to_table(
+            'account',
+            records=[
+                (account_id, user_id, balances.get(account_id, 0.0))
+                for user_id, first_account, accounts in users
+                for account_id in range(first_account, first_account + accounts)
+            ],
+            columns=['id', 'user_id', 'amount'],
+        )
+        rows = transactions(seed, worker, users, count, weights, days, now)
+        for chunk in chunks(rows, COPY_CHUNK_ROWS):
+            await conn.copy_records_to_table('transaction', records=chunk, columns=TRANSACTION_COLUMNS)
+            await conn.copy_records_to_table(
+                'transaction_key',
+                records=[(row[0], row[1], row[5]) for row in chunk],
+                columns=['transaction_id', 'user_id', 'created_at'],
+            )
+    finally:
+        await conn.close()
+    return count
+
+
+def _load_slice_in_process(*args) -> int:
+    return asyncio.run(load_slice(*args))
+
+
+async def create_partitions(now: datetime, days: int) -> None:
+    """Секции на все месяцы набора, чтобы старые транзакции не попали в transaction_default."""
+    month = (now - timedelta(days=days)).date().replace(day=1)
+    last = add_months(now.date().replace(day=1), 1)
+    conn = await asyncpg.connect(DSN)
+    try:
+        while month <= last:
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF transaction "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+            )
+            month = add_months(month, 1)
+    finally:
+        await conn.close()
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Генерация синтетического набора данных')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--max-accounts', type=int, default=5)
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=90, help='период, за который распределены транзакции')
+    parser.add_argument('--zipf', type=float, default=1.1, help='показатель распределения активности')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--password', default='bench123')
+    parser.add_argument('--manifest', default='benchmarks/dataset.json')
+    parser.add_argument('--manifest-users', type=int, default=1000, help='число пользователей в manifest')
+    parser.add_argument('--hot-users', type=int, default=100, help='число самых активных пользователей в manifest')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    rng = random.Random(args.seed)
+    hashed_password = bcrypt.hashpw(args.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    conn = await asyncpg.connect(DSN)
+    try:
+        user_base = await conn.fetchval('SELECT coalesce(max(id), 0) + 1 FROM "user"')
+        account_base = await conn.fetchval('SELECT coalesce(max(id), 0) + 1 FROM account')
+    finally:
+        await conn.close()
+    await create_partitions(now, args.days)
+
+    weights = zipf_weights(args.users, args.zipf)
+    users = []
+    next_account = account_base
+    for rank in range(args.users):
+        accounts = min(args.max_accounts, int(rng.paretovariate(1.5)))
+        users.append((user_base + rank, next_account, accounts))
+        next_account += accounts
+
+    total_weight = sum(weights)
+    slices = []
+    for worker in range(args.workers):
+        slice_users = users[worker::args.workers]
+        slice_weights = weights[worker::args.workers]
+        count = round(args.transactions * sum(slice_weights) / total_weight)
+        slices.append((args.seed, worker, slice_users, count, slice_weights, args.days, now, hashed_password))
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        loaded = await asyncio.gather(*(loop.run_in_executor(pool, _load_slice_in_process, *s) for s in slices))
+
+    conn = await asyncpg.connect(DSN)
+    try:
+        for table in ('"user"', 'account'):
+            await conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            )
+        await conn.execute('ANALYZE')
+    finally:
+        await conn.close()
+
+    from account.summary import rebuild
+    from database import engine
+    await rebuild(chunk_size=10000, parallel=args.workers)
+    await engine.dispose()
+
+    sample = {}
+    for user_id, first_account, accounts in rng.choices(users, weights=weights, k=args.manifest_users * 4):
+        sample.setdefault(user_id, list(range(first_account, first_account + accounts)))
+        if len(sample) >= args.manifest_users:
+            break
+    manifest = {
+        'seed': args.seed,
+        'generated_at': now.isoformat(),
+        'password': args.password,
+        'users': [
+            {'id': user_id, 'email': f'bench{user_id}@example.com', 'accounts': accounts}
+            for user_id, accounts in sample.items()
+        ],
+        # Ранг совпадает с порядком ID, поэтому первые пользователи - самые активные.
+        'hot_users': [
+            {
+                'id': user_id,
+                'accounts': list(range(first_account, first_account + accounts)),
+                'expected_transactions': round(args.transactions * weight / total_weight),
+            }
+            for (user_id, first_account, accounts), weight in zip(users[:args.hot_users], weights)
+        ],
+    }
+    Path(args.manifest).write_text(json.dumps(manifest, indent=2))
+
+    print(
+        f'loaded {args.users} users, {next_account - account_base} accounts, {sum(loaded)} transactions '
+        f'in {time.perf_counter() - started:.1f}s',
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
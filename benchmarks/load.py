@@ -0,0 +1,373 @@
+"""
+Нагрузочный драйвер для API.
+
+--concurrency виртуальных пользователей из manifest (см. benchmarks/generate.py) в течение
+--duration секунд выполняют запросы, выбирая эндпоинт по весам сценария --scenario (или --mix).
+Платежи подписываются тем же алгоритмом, что и в verify_signature, с TRANSACTION_SECRET_KEY
+из .env; админские эндпоинты запрашиваются под учетной записью администратора. Запросы первых
+--warmup секунд не учитываются.
+
+Сценарии:
+    mixed            - смешанная нагрузка пользователей и администратора
+    payments         - только make_transaction на счета виртуальных пользователей
+    batch            - make_transactions_batch по --batch-size платежей на счета виртуальных
+                       пользователей; кроме запросов в секунду считаются платежи в секунду
+    hot_accounts     - make_transaction на --hot-accounts счетов самых активных пользователей
+                       с распределением по Ципфу (--hot-zipf): конкуренция за строки счетов
+    my_account_info  - только чтение счетов текущего пользователя
+    admin_listings   - страницы админских списков размером --page-size и user_account_info
+    history          - история пользователя с числом транзакций, ближайшим к --history-rows
+    stream           - NDJSON-выгрузка всех транзакций
+    export           - COPY-выгрузка всех транзакций в формате --export-format
+
+Виртуальные пользователи входят до начала измерений; вход во время теста измеряется
+только как эндпоинт login сценария. Кроме задержек по эндпоинтам в результат пишется средний размер ответа в байтах.
+Контроль допуска при нагрузке с одного IP нужно выключить (ADMISSION_ENABLED=false),
+иначе заметная часть запросов получит 429/503 (benchmarks/run.py делает это сам).
+
+Результат - JSON с пропускной способностью и p50/p95/p99 по каждому эндпоинту,
+который можно сравнить между коммитами через benchmarks/compare.py.
+
+Запуск из корня репозитория при запущенном приложении:
+    python benchmarks/load.py --duration 60 --concurrency 50 --output results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import httpx
+
+from config import TRANSACTION_SECRET_KEY
+
+SCENARIOS = {
+    'mixed': {
+        'make_transaction': 40,
+        'my_account_info': 20,
+        'transactions_info': 20,
+        'login': 5,
+        'get_all_accounts': 5,
+        'get_all_users': 5,
+        'get_all_transactions': 5,
+        'user_account_info': 5,
+    },
+    'payments': {'make_transaction': 1},
+    'batch': {'make_transactions_batch': 1},
+    'hot_accounts': {'hot_make_transaction': 1},
+    'my_account_info': {'my_account_info': 1},
+    'admin_listings': {'get_all_accounts': 1, 'get_all_users': 1, 'get_all_transactions': 1, 'user_account_info': 1},
+    'history': {'user_transactions_info': 1},
+    'stream': {'stream_all_transactions': 1},
+    'export': {'export_transactions': 1},
+}
+ENDPOINTS = {name for mix in SCENARIOS.values() for name in mix}
+SETUP_LOGIN_CONCURRENCY = 4
+SETUP_LOGIN_ATTEMPTS = 10
+ADMIN_ENDPOINTS = {
+    'get_all_accounts', 'get_all_users', 'get_all_transactions', 'user_account_info',
+    'user_transactions_info', 'stream_all_transactions', 'export_transactions',
+}
+STREAM_ENDPOINTS = {
+    'stream_all_transactions': '/transaction/admin/stream_all_transactions',
+    'export_transactions': '/transaction/admin/export_transactions',
+}
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'unknown endpoint {name!r}')
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+class Targets:
+    """Параметры запросов сценария, общие для всех виртуальных пользователей."""
+
+    def __init__(self, manifest: dict, args: argparse.Namespace):
+        self.users = manifest['users']
+        self.page_params = {'limit': args.page_size} if args.page_size else {}
+        self.export_params = {'format': args.export_format}
+        self.batch_size = args.batch_size
+        hot_users = manifest.get('hot_users') or []
+        # Счет горячего пользователя вместе с владельцем: платеж подписывается от его имени.
+        self.hot_accounts = [(user['accounts'][0], user['id']) for user in hot_users[:args.hot_accounts]]
+        self.hot_weights = [1 / rank ** args.hot_zipf for rank in range(1, len(self.hot_accounts) + 1)]
+        self.history_user = min(
+            hot_users, key=lambda user: abs(user['expected_transactions'] - args.history_rows), default=None
+        )
+
+
+def sign(account_id: int, amount: int, transaction_id: str, user_id: int) -> str:
+    message = f'{account_id}{amount}{transaction_id}{user_id}{TRANSACTION_SECRET_KEY}'
+    return hashlib.sha256(message.encode()).hexdigest()
+
+
+class Recorder:
+    """Задержки и коды ответов по эндпоинтам; запросы до окончания прогрева не учитываются."""
+
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.sizes = Counter()
+        self.items = Counter()
+
+    def record(self, endpoint: str, started: float, status: int, size: int = 0, items: int = 1) -> None:
+        """items - число платежей в запросе, для пакетного эндпоинта больше одного."""
+        if started >= self.measure_from:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            self.statuses[endpoint][str(status)] += 1
+            self.sizes[endpoint] += size
+            self.items[endpoint] += items
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            statuses = self.statuses[endpoint]
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': sum(count for status, count in statuses.items() if int(status) >= 400),
+                'throughput_rps': round(len(latencies) / elapsed, 2),
+                **percentiles(latencies),
+                'mean_response_bytes': round(self.sizes[endpoint] / len(latencies)),
+                'statuses': dict(sorted(statuses.items())),
+            }
+            if self.items[endpoint] != len(latencies):
+                endpoints[endpoint]['items_per_second'] = round(self.items[endpoint] / elapsed, 2)
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = {
+            'requests': len(all_latencies),
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'throughput_rps': round(len(all_latencies) / elapsed, 2),
+            **percentiles(all_latencies),
+        }
+        return {'endpoints': endpoints, 'total': total}
+
+
+def percentiles(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        value = round(latencies[0] * 1000, 3) if latencies else None
+        return {'p50_ms': value, 'p95_ms': value, 'p99_ms': value, 'max_ms': value}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, email: str, password: str) -> str | None:
+    started = time.perf_counter()
+    response = await client.post('/user/login', data={'username': email, 'password': password})
+    recorder.record('login', started, response.status_code)
+    return response.json()['access_token'] if response.status_code == 200 else None
+
+
+async def setup_login(client: httpx.AsyncClient, email: str, password: str, limit: asyncio.Semaphore) -> str | None:
+    """Вход до начала измерений с повтором после 429/503, чтобы не зависеть от очереди bcrypt."""
+    for _ in range(SETUP_LOGIN_ATTEMPTS):
+        async with limit:
+            response = await client.post('/user/login', data={'username': email, 'password': password})
+        if response.status_code == 200:
+            return response.json()['access_token']
+        if response.status_code not in (429, 503):
+            return None
+        await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+    return None
+
+
+def payment_body(account_id: int, user_id: int, rng: random.Random) -> dict:
+    amount = rng.randint(1, 1000)
+    transaction_id = uuid.uuid4().hex
+    return {
+        'transaction_id': transaction_id,
+        'account_id': account_id,
+        'user_id': user_id,
+        'amount': amount,
+        'signature': sign(account_id, amount, transaction_id, user_id),
+    }
+
+
+async def stream(client: httpx.AsyncClient, url: str, headers: dict, params: dict) -> tuple[int, int]:
+    """Читает ответ целиком, не сохраняя его: большие выгрузки не держатся в памяти драйвера."""
+    size = 0
+    async with client.stream('GET', url, headers=headers, params=params) as response:
+        async for chunk in response.aiter_raw():
+            size += len(chunk)
+    return response.status_code, size
+
+
+async def virtual_user(
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        user: dict,
+        password: str,
+        token: str,
+        admin_token: str | None,
+        mix: dict[str, int],
+        targets: Targets,
+        deadline: float,
+        rng: random.Random,
+) -> None:
+    endpoints = [name for name in mix if name not in ADMIN_ENDPOINTS or admin_token]
+    weights = [mix[name] for name in endpoints]
+
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(endpoints, weights)[0]
+        if endpoint == 'login':
+            token = await login(client, recorder, user['email'], password) or token
+            continue
+
+        headers = {'Authorization': f'Bearer {admin_token if endpoint in ADMIN_ENDPOINTS else token}'}
+        started = time.perf_counter()
+        if endpoint in STREAM_ENDPOINTS:
+            params = targets.export_params if endpoint == 'export_transactions' else {}
+            status, size = await stream(client, STREAM_ENDPOINTS[endpoint], headers, params)
+            recorder.record(endpoint, started, status, size)
+            continue
+        if endpoint == 'make_transaction':
+            body = payment_body(rng.choice(user['accounts']), user['id'], rng)
+            response = await client.post('/transaction/make_transaction', headers=headers, json=body)
+        elif endpoint == 'make_transactions_batch':
+            body = [payment_body(rng.choice(user['accounts']), user['id'], rng) for _ in range(targets.batch_size)]
+            response = await client.post('/transaction/make_transactions_batch', headers=headers, json=body)
+            recorder.record(endpoint, started, response.status_code, len(response.content), items=len(body))
+            continue
+        elif endpoint == 'hot_make_transaction':
+            account_id, owner_id = rng.choices(targets.hot_accounts, targets.hot_weights)[0]
+            body = payment_body(account_id, owner_id, rng)
+            response = await client.post('/transaction/make_transaction', headers=headers, json=body)
+        elif endpoint == 'my_account_info':
+            response = await client.get('/account/my_account_info', headers=headers)
+        elif endpoint == 'transactions_info':
+            response = await client.get('/transaction/transactions_info', headers=headers)
+        elif endpoint == 'get_all_accounts':
+            response = await client.get('/account/admin/get_all_accounts', headers=headers, params=targets.page_params)
+        elif endpoint == 'get_all_users':
+            response = await client.get('/user/admin/get_all_users', headers=headers, params=targets.page_params)
+        elif endpoint == 'user_account_info':
+            target = rng.choice(targets.users)
+            response = await client.get(f"/account/admin/user_account_info/{target['id']}", headers=headers)
+        elif endpoint == 'user_transactions_info':
+            response = await client.get(
+                '/transaction/admin/user_transactions_info', headers=headers,
+                params={'user_id': targets.history_user['id']},
+            )
+        else:
+            response = await client.get(
+                '/transaction/admin/get_all_transactions', headers=headers, params=targets.page_params
+            )
+        recorder.record(endpoint, started, response.status_code, len(response.content))
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API')
+    parser.add_argument('--base-url', default='http://localhost:8080')
+    parser.add_argument('--manifest', default='benchmarks/dataset.json')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--mix', type=parse_mix,
+                        help='веса эндпоинтов вместо сценария, например make_transaction=40,login=5')
+    parser.add_argument('--page-size', type=int, help='limit админских списков (по умолчанию - серверный)')
+    parser.add_argument('--hot-accounts', type=int, default=10, help='число горячих счетов в hot_accounts')
+    parser.add_argument('--hot-zipf', type=float, default=1.1, help='показатель распределения платежей по ним')
+    parser.add_argument('--batch-size', type=int, default=100, help='платежей в запросе сценария batch')
+    parser.add_argument('--history-rows', type=int, default=10000, help='размер истории в сценарии history')
+    parser.add_argument('--export-format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут запроса, с')
+    parser.add_argument('--admin-email', default='admin@example.com')
+    parser.add_argument('--admin-password', default='admin123')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='путь к файлу результата (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    manifest = json.loads(Path(args.manifest).read_text())
+    mix = args.mix or SCENARIOS[args.scenario]
+    targets = Targets(manifest, args)
+    if 'hot_make_transaction' in mix and not targets.hot_accounts or \
+            'user_transactions_info' in mix and targets.history_user is None:
+        print('manifest has no hot_users, regenerate it with benchmarks/generate.py', file=sys.stderr)
+        return 2
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        setup = Recorder(measure_from=float('inf'))
+        admin_token = None
+        if any(name in ADMIN_ENDPOINTS for name in mix):
+            admin_token = await login(client, setup, args.admin_email, args.admin_password)
+            if admin_token is None:
+                print('admin login failed, admin endpoints are skipped', file=sys.stderr)
+
+        users = [manifest['users'][number % len(manifest['users'])] for number in range(args.concurrency)]
+        login_limit = asyncio.Semaphore(SETUP_LOGIN_CONCURRENCY)
+        tokens = await asyncio.gather(*(
+            setup_login(client, user['email'], manifest['password'], login_limit) for user in users
+        ))
+        if None in tokens:
+            print(f'{tokens.count(None)} virtual users failed to log in and are skipped', file=sys.stderr)
+
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        recorder = Recorder(measure_from=started + args.warmup)
+        deadline = started + args.warmup + args.duration
+        await asyncio.gather(*(
+            virtual_user(
+                client, recorder, user, manifest['password'], token, admin_token,
+                mix, targets, deadline, random.Random(rng.random()),
+            )
+            for user, token in zip(users, tokens) if token is not None
+        ))
+        elapsed = time.perf_counter() - recorder.measure_from
+
+    result = {
+        'meta': {
+            'git_commit': git_commit(),
+            'started_at': started_at.isoformat(),
+            'base_url': args.base_url,
+            'duration_seconds': args.duration,
+            'concurrency': args.concurrency,
+            'scenario': None if args.mix else args.scenario,
+            'mix': mix,
+            'page_size': args.page_size,
+            'dataset_seed': manifest['seed'],
+        },
+        **recorder.report(elapsed),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,224 @@
+"""
+Нагрузочный тест приложения в нескольких вариантах конфигурации.
+
+Для каждого варианта набора запускает приложение (python src/main.py в режиме production,
+WEB_CONCURRENCY=1, если вариант не задает другое) с переменными окружения варианта, ждет
+готовности, выполняет benchmarks/load.py со сценарием набора, останавливает приложение и
+пишет результат в results/<набор>/<вариант>.json. В конце печатает сравнение каждого
+варианта с первым (см. benchmarks/compare.py).
+
+С --base-ref первым добавляется вариант base: приложение из указанного коммита (git worktree
+во временном каталоге) с окружением первого варианта, а --head-ref запускает варианты набора
+из другого коммита вместо рабочего каталога. Так сравнивается код до и после изменения на
+одной БД, поэтому схема БД должна подходить обоим коммитам:
+    python benchmarks/run.py payments --base-ref <коммит>~1 --head-ref <коммит>
+
+Контроль допуска во всех вариантах выключен: драйвер выполняет все запросы с одного IP и
+упирался бы в его ограничения частоты и доли админских запросов, а не в измеряемый код
+(включается через --env ADMISSION_ENABLED=true). Аргументы, которых нет ниже, передаются
+в load.py.
+
+Запуск из корня репозитория после benchmarks/generate.py:
+    python benchmarks/run.py coalesce --duration 60 --concurrency 100
+    python benchmarks/run.py workers --variants 1,8
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+from compare import compare
+
+ROOT = Path(__file__).resolve().parent.parent
+BASE_ENV = {
+    'SERVER_MODE': 'production',
+    'WEB_CONCURRENCY': '1',
+    'ADMISSION_ENABLED': 'false',
+}
+SUITES = {
+    # Запрос к таблице user в get_current_user против данных из JWT.
+    'auth': {
+        'scenario': 'my_account_info',
+        'variants': {
+            'stateless': {'AUTH_STATELESS': 'true'},
+            'db_lookup': {'AUTH_STATELESS': 'false'},
+        },
+    },
+    # make_transaction на счета виртуальных пользователей; прежний путь - через --base-ref.
+    'payments': {
+        'scenario': 'payments',
+        'variants': {'head': {}},
+    },
+    # make_transactions_batch по 100 платежей; платежи в секунду сравниваются с набором payments.
+    'batch': {
+        'scenario': 'batch',
+        'load_args': ['--batch-size', '100'],
+        'variants': {'head': {}},
+    },
+    # Платежи на несколько горячих счетов с распределением по Ципфу.
+    'coalesce': {
+        'scenario': 'hot_accounts',
+        'variants': {
+            'off': {'TRANSACTION_COALESCE_ENABLED': 'false'},
+            'on': {'TRANSACTION_COALESCE_ENABLED': 'true'},
+        },
+    },
+    # Middleware метрик, /metrics и замер каждого SQL запроса.
+    'metrics': {
+        'scenario': 'mixed',
+        'variants': {
+            'on': {'METRICS_ENABLED': 'true'},
+            'off': {'METRICS_ENABLED': 'false'},
+        },
+    },
+    'workers': {
+        'scenario': 'mixed',
+        'variants': {str(workers): {'WEB_CONCURRENCY': str(workers)} for workers in (1, 2, 4, 8)},
+    },
+    # Ответы из 10 тыс. строк: история пользователя, ближайшего по числу транзакций.
+    'history': {
+        'scenario': 'history',
+        'load_args': ['--history-rows', '10000'],
+        'variants': {'head': {}},
+    },
+    # NDJSON-выгрузка всей таблицы транзакций (1 млн строк при generate.py --transactions 1000000).
+    'stream': {
+        'scenario': 'stream',
+        'variants': {'head': {}},
+    },
+    'admin_listings': {
+        'scenario': 'admin_listings',
+        'load_args': ['--page-size', '1000'],
+        'variants': {'head': {}},
+    },
+}
+
+
+def parse_env(value: str) -> tuple[str, str]:
+    name, sep, env_value = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'expected NAME=VALUE, got {value!r}')
+    return name, env_value
+
+
+def git(*args: str, cwd: Path = ROOT) -> str:
+    return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+@contextmanager
+def checkout(ref: str | None):
+    """Каталог с кодом коммита ref (временный git worktree) или корень репозитория."""
+    if ref is None:
+        yield ROOT
+        return
+    worktree = Path(tempfile.mkdtemp(prefix='bench-'))
+    git('worktree', 'add', '--detach', str(worktree), ref)
+    try:
+        yield worktree
+    finally:
+        git('worktree', 'remove', '--force', str(worktree))
+
+
+def start_app(cwd: Path, env: dict, base_url: str, timeout: float) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, 'src/main.py'], cwd=cwd, env={**os.environ, **env}, start_new_session=True
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'application exited with code {process.returncode}')
+        try:
+            if httpx.get(f'{base_url}/openapi.json', timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    stop_app(process)
+    raise RuntimeError(f'application did not start in {timeout}s')
+
+
+def stop_app(process: subprocess.Popen) -> None:
+    # Сигнал всей группе процессов: в режиме production воркеры - дочерние процессы.
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def run_variant(
+        name: str, cwd: Path, env: dict, suite: dict, args: argparse.Namespace, load_args: list[str]
+) -> dict:
+    output = Path(args.output_dir) / args.suite / f'{name}.json'
+    print(f'== {args.suite}/{name}: {env}', file=sys.stderr)
+    process = start_app(cwd, env, args.base_url, args.startup_timeout)
+    try:
+        subprocess.run(
+            [
+                sys.executable, 'benchmarks/load.py', '--base-url', args.base_url, '--scenario', suite['scenario'],
+                *suite.get('load_args', []), *load_args, '--output', str(output),
+            ],
+            cwd=ROOT,
+            check=True,
+        )
+    finally:
+        stop_app(process)
+
+    result = json.loads(output.read_text())
+    result['meta'].update({'git_commit': git('rev-parse', 'HEAD', cwd=cwd), 'suite': args.suite,
+                           'variant': name, 'env': env})
+    output.write_text(json.dumps(result, indent=2))
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест в нескольких конфигурациях')
+    parser.add_argument('suite', choices=SUITES)
+    parser.add_argument('--variants', help='запустить только эти варианты, через запятую')
+    parser.add_argument('--base-ref', help='коммит, с которым сравнить текущий код')
+    parser.add_argument('--head-ref', help='коммит, код которого проверять вместо рабочего каталога')
+    parser.add_argument('--env', type=parse_env, action='append', default=[],
+                        help='переменная окружения всех вариантов, NAME=VALUE')
+    parser.add_argument('--base-url', default='http://localhost:8080')
+    parser.add_argument('--output-dir', default='results')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--threshold', type=float, default=10, help='допустимый рост p99, %%')
+    args, load_args = parser.parse_known_args()
+
+    suite = SUITES[args.suite]
+    variants = suite['variants']
+    if args.variants:
+        variants = {name: variants[name] for name in args.variants.split(',')}
+    common_env = {**BASE_ENV, **dict(args.env)}
+
+    results = {}
+    if args.base_ref:
+        with checkout(args.base_ref) as cwd:
+            first_env = next(iter(variants.values()))
+            results['base'] = run_variant('base', cwd, {**common_env, **first_env}, suite, args, load_args)
+    with checkout(args.head_ref) as cwd:
+        for name, env in variants.items():
+            results[name] = run_variant(name, cwd, {**common_env, **env}, suite, args, load_args)
+
+    names = list(results)
+    regressions = []
+    for name in names[1:]:
+        print(f'\n{names[0]} -> {name}')
+        regressions += [f'{name}:{endpoint}' for endpoint in compare(results[names[0]], results[name], args.threshold)]
+    if regressions:
+        print(f"p99 regression over {args.threshold}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
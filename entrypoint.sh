@@ -1,5 +1,4 @@
 #!/bin/sh
-alembic upgrade b9497af71930
-alembic upgrade 1b3fadd0c80b
+alembic upgrade head
 
-exec python src/main.py
\ No newline at end of file
+exec python src/main.py
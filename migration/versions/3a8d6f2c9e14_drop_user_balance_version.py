@@ -0,0 +1,32 @@
+"""drop_user_balance_version
+
+Revision ID: 3a8d6f2c9e14
+Revises: f4b7d2e91a60
+Create Date: 2026-10-17 16:42:05.113870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a8d6f2c9e14'
+down_revision: Union[str, Sequence[str], None] = 'f4b7d2e91a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ETag счетов и истории считается по xmin строк account (см. select_accounts_version).
+    op.drop_column('user', 'balance_version')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column(
+        'user',
+        sa.Column('balance_version', sa.BigInteger(), server_default='0', nullable=False),
+    )
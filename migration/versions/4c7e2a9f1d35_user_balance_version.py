@@ -0,0 +1,31 @@
+"""user_balance_version
+
+Revision ID: 4c7e2a9f1d35
+Revises: 9d01fd88b71e
+Create Date: 2026-10-17 11:03:27.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7e2a9f1d35'
+down_revision: Union[str, Sequence[str], None] = '9d01fd88b71e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'user',
+        sa.Column('balance_version', sa.BigInteger(), server_default='0', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user', 'balance_version')
@@ -0,0 +1,48 @@
+"""payment_queue
+
+Revision ID: 7e31b5c8a2d4
+Revises: 4c7e2a9f1d35
+Create Date: 2026-10-17 12:41:08.733915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e31b5c8a2d4'
+down_revision: Union[str, Sequence[str], None] = '4c7e2a9f1d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'payment_queue',
+        sa.Column('transaction_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Double(), nullable=False),
+        sa.Column('signature', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), server_default='pending', nullable=False),
+        sa.Column('new_balance', sa.Double(), nullable=True),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('enqueued_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('transaction_id'),
+    )
+    op.create_index(
+        'ix_payment_queue_pending', 'payment_queue', ['enqueued_at'],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index('ix_payment_queue_processed_at', 'payment_queue', ['processed_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_payment_queue_processed_at', table_name='payment_queue')
+    op.drop_index('ix_payment_queue_pending', table_name='payment_queue')
+    op.drop_table('payment_queue')
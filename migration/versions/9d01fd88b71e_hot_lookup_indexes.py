@@ -0,0 +1,38 @@
+"""hot_lookup_indexes
+
+Revision ID: 9d01fd88b71e
+Revises: 1b3fadd0c80b
+Create Date: 2026-10-17 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d01fd88b71e'
+down_revision: Union[str, Sequence[str], None] = '1b3fadd0c80b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_user_email', 'user', ['email'], unique=True)
+    op.create_index(
+        'ix_account_user_id_id', 'account', ['user_id', 'id'],
+        postgresql_include=['amount'],
+    )
+    op.create_index(
+        'ix_transaction_user_id', 'transaction', ['user_id'],
+        postgresql_include=['transaction_id', 'account_id', 'amount', 'signature'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transaction_user_id', table_name='transaction')
+    op.drop_index('ix_account_user_id_id', table_name='account')
+    op.drop_index('ix_user_email', table_name='user')
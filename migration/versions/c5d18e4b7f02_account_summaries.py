@@ -0,0 +1,76 @@
+"""account_summaries
+
+Revision ID: c5d18e4b7f02
+Revises: 7e31b5c8a2d4
+Create Date: 2026-10-17 14:22:51.190467
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d18e4b7f02'
+down_revision: Union[str, Sequence[str], None] = '7e31b5c8a2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_transaction_account_id', 'transaction', ['account_id'],
+        postgresql_include=['user_id', 'amount'],
+    )
+    op.create_table(
+        'account_summary',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('total', sa.Double(), server_default='0', nullable=False),
+        sa.Column('inflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('outflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('transaction_count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('account_id'),
+    )
+    op.create_index(
+        'ix_account_summary_user_id', 'account_summary', ['user_id'],
+        postgresql_include=['account_id', 'total', 'inflow', 'outflow', 'transaction_count'],
+    )
+    op.create_table(
+        'account_daily_summary',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Double(), server_default='0', nullable=False),
+        sa.Column('inflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('outflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('transaction_count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('account_id', 'day'),
+    )
+    op.create_index(
+        'ix_account_daily_summary_user_id_day', 'account_daily_summary', ['user_id', 'day'],
+        postgresql_include=['total', 'inflow', 'outflow', 'transaction_count'],
+    )
+    op.execute(
+        """
+        INSERT INTO account_summary (account_id, user_id, total, inflow, outflow, transaction_count)
+        SELECT account_id, min(user_id), sum(amount),
+               coalesce(sum(amount) FILTER (WHERE amount > 0), 0),
+               coalesce(sum(amount) FILTER (WHERE amount < 0), 0),
+               count(*)
+        FROM transaction
+        WHERE account_id IS NOT NULL
+        GROUP BY account_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_account_daily_summary_user_id_day', table_name='account_daily_summary')
+    op.drop_table('account_daily_summary')
+    op.drop_index('ix_account_summary_user_id', table_name='account_summary')
+    op.drop_table('account_summary')
+    op.drop_index('ix_transaction_account_id', table_name='transaction')
@@ -0,0 +1,74 @@
+"""ledger_reconciliation
+
+Revision ID: e2a9c4f6b813
+Revises: c5d18e4b7f02
+Create Date: 2026-10-17 15:48:03.562119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c4f6b813'
+down_revision: Union[str, Sequence[str], None] = 'c5d18e4b7f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Без значения по умолчанию при добавлении столбца таблица не перезаписывается:
+    # у существующих строк txid остается NULL, и они сворачиваются ниже.
+    op.execute('ALTER TABLE transaction ADD COLUMN txid xid8')
+    op.execute('ALTER TABLE transaction ALTER COLUMN txid SET DEFAULT pg_current_xact_id()')
+    op.create_index('ix_transaction_txid', 'transaction', ['txid'])
+    # Полная сверка читает диапазоны счетов только из индекса.
+    op.drop_index('ix_transaction_account_id', table_name='transaction')
+    op.create_index(
+        'ix_transaction_account_id', 'transaction', ['account_id'],
+        postgresql_include=['user_id', 'amount', 'txid'],
+    )
+    op.create_table(
+        'reconciliation_checkpoint',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('ledger_total', sa.Double(), server_default='0', nullable=False),
+        sa.Column('transaction_count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('drift', sa.Double(), server_default='0', nullable=False),
+        sa.Column('checked_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('account_id'),
+    )
+    op.execute(
+        """
+        CREATE TABLE reconciliation_state (
+            id integer PRIMARY KEY,
+            horizon xid8 NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now()
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO reconciliation_checkpoint (account_id, ledger_total, transaction_count)
+        SELECT account_id, sum(amount), count(*)
+        FROM transaction
+        WHERE account_id IS NOT NULL
+        GROUP BY account_id
+        """
+    )
+    op.execute('INSERT INTO reconciliation_state (id, horizon) VALUES (1, pg_snapshot_xmin(pg_current_snapshot()))')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('reconciliation_state')
+    op.drop_table('reconciliation_checkpoint')
+    op.drop_index('ix_transaction_account_id', table_name='transaction')
+    op.create_index(
+        'ix_transaction_account_id', 'transaction', ['account_id'],
+        postgresql_include=['user_id', 'amount'],
+    )
+    op.drop_index('ix_transaction_txid', table_name='transaction')
+    op.drop_column('transaction', 'txid')
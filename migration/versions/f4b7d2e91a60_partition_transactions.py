@@ -0,0 +1,151 @@
+"""partition_transactions
+
+Revision ID: f4b7d2e91a60
+Revises: e2a9c4f6b813
+Create Date: 2026-10-17 17:22:41.913057
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b7d2e91a60'
+down_revision: Union[str, Sequence[str], None] = 'e2a9c4f6b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Время прежних транзакций неизвестно. Они получают эту метку, попадают в transaction_default
+# и не выглядят активностью месяца миграции; archive их не трогает.
+LEGACY_CREATED_AT = '1970-01-01 00:00:00+00'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('ALTER TABLE transaction RENAME TO transaction_legacy')
+    op.execute('ALTER INDEX transaction_pkey RENAME TO transaction_legacy_pkey')
+    op.drop_index('ix_transaction_user_id', table_name='transaction_legacy')
+    op.drop_index('ix_transaction_account_id', table_name='transaction_legacy')
+    op.drop_index('ix_transaction_txid', table_name='transaction_legacy')
+
+    op.execute(
+        """
+        CREATE TABLE transaction (
+            transaction_id varchar NOT NULL,
+            user_id integer REFERENCES "user" (id),
+            account_id integer REFERENCES account (id),
+            amount double precision NOT NULL,
+            signature varchar NOT NULL,
+            txid xid8 DEFAULT pg_current_xact_id(),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (transaction_id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    # Секции на текущий и три следующих месяца (дальше их создает python -m transactions.partitions create)
+    # и секция по умолчанию для строк, которым секции не нашлось.
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC');
+        BEGIN
+            FOR i IN 0..3 LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF transaction FOR VALUES FROM (%L) TO (%L)',
+                    'transaction_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month AT TIME ZONE 'UTC',
+                    (month + interval '1 month') AT TIME ZONE 'UTC'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+        """
+    )
+    op.execute('CREATE TABLE transaction_default PARTITION OF transaction DEFAULT')
+    op.execute(
+        f"""
+        INSERT INTO transaction (transaction_id, user_id, account_id, amount, signature, txid, created_at)
+        SELECT transaction_id, user_id, account_id, amount, signature, txid, TIMESTAMPTZ '{LEGACY_CREATED_AT}'
+        FROM transaction_legacy
+        """
+    )
+
+    op.create_table(
+        'transaction_key',
+        sa.Column('transaction_id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('transaction_id'),
+    )
+    op.execute(
+        f"""
+        INSERT INTO transaction_key (transaction_id, user_id, created_at)
+        SELECT transaction_id, user_id, TIMESTAMPTZ '{LEGACY_CREATED_AT}'
+        FROM transaction_legacy
+        """
+    )
+    op.drop_table('transaction_legacy')
+
+    op.create_index(
+        'ix_transaction_user_id_created_at', 'transaction', ['user_id', 'created_at'],
+        postgresql_include=['transaction_id', 'account_id', 'amount', 'signature'],
+    )
+    op.create_index(
+        'ix_transaction_account_id', 'transaction', ['account_id'],
+        postgresql_include=['user_id', 'amount', 'txid', 'created_at'],
+    )
+    op.create_index('ix_transaction_txid', 'transaction', ['txid'])
+    op.create_index('ix_transaction_created_at', 'transaction', ['created_at'], postgresql_using='brin')
+
+    op.create_table(
+        'archived_transaction_totals',
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Double(), server_default='0', nullable=False),
+        sa.Column('inflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('outflow', sa.Double(), server_default='0', nullable=False),
+        sa.Column('transaction_count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('account_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Архивированные секции не возвращаются: их строки остаются только в выгрузках.
+    op.drop_table('archived_transaction_totals')
+    op.drop_table('transaction_key')
+    op.execute('ALTER TABLE transaction RENAME TO transaction_partitioned')
+    op.execute('ALTER INDEX transaction_pkey RENAME TO transaction_partitioned_pkey')
+    op.drop_index('ix_transaction_account_id', table_name='transaction_partitioned')
+    op.drop_index('ix_transaction_txid', table_name='transaction_partitioned')
+    op.execute(
+        """
+        CREATE TABLE transaction (
+            transaction_id varchar NOT NULL PRIMARY KEY,
+            user_id integer REFERENCES "user" (id),
+            account_id integer REFERENCES account (id),
+            amount double precision NOT NULL,
+            signature varchar NOT NULL,
+            txid xid8 DEFAULT pg_current_xact_id()
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO transaction (transaction_id, user_id, account_id, amount, signature, txid)
+        SELECT transaction_id, user_id, account_id, amount, signature, txid
+        FROM transaction_partitioned
+        """
+    )
+    op.drop_table('transaction_partitioned')
+    op.create_index(
+        'ix_transaction_user_id', 'transaction', ['user_id'],
+        postgresql_include=['transaction_id', 'account_id', 'amount', 'signature'],
+    )
+    op.create_index(
+        'ix_transaction_account_id', 'transaction', ['account_id'],
+        postgresql_include=['user_id', 'amount', 'txid'],
+    )
+    op.create_index('ix_transaction_txid', 'transaction', ['txid'])
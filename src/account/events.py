@@ -0,0 +1,210 @@
+"""
+Рассылка событий о платежах подписчикам /account/events.
+
+Запрос применения платежей (build_apply_statement) вызывает pg_notify для каждой
+вставленной транзакции, и Postgres доставляет уведомления только после фиксации транзакции
+БД, поэтому событие получает любой процесс, а откаченный платеж не виден никому.
+Каждый процесс держит одно выделенное соединение с LISTEN (не из пула) и раскладывает
+события по ограниченным очередям подписчиков владельца счета. Если подписчик не успевает
+читать и его очередь заполнена, накопленные события отбрасываются и вместо них
+отправляется событие resync: клиент должен заново запросить /account/my_account_info.
+То же событие получают все подписчики после переподключения к БД. Полуоткрытое TCP-соединение
+не закрывается само, поэтому раз в liveness_interval секунд по нему выполняется SELECT 1;
+ошибка или таймаут проверки, как и любая другая ошибка соединения, ведет к переподключению.
+"""
+import asyncio
+import logging
+
+import asyncpg
+import orjson
+from fastapi import HTTPException
+
+from config import (
+    DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME,
+    ACCOUNT_EVENTS_BUFFER, ACCOUNT_EVENTS_MAX_SUBSCRIBERS, ACCOUNT_EVENTS_KEEPALIVE,
+    ACCOUNT_EVENTS_LIVENESS_INTERVAL, ACCOUNT_EVENTS_LIVENESS_TIMEOUT,
+)
+
+ACCOUNT_EVENTS_CHANNEL = 'account_events'
+RECONNECT_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+RESYNC = {'event': 'resync'}
+
+
+class Subscriber:
+    def __init__(self, user_id: int, account_ids: set[int] | None, buffer: int):
+        self.user_id = user_id
+        self.account_ids = account_ids
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=buffer)
+
+    def push(self, event: dict) -> int:
+        """
+        Returns:
+            int: число событий, отброшенных из-за переполнения очереди
+        """
+        if event is not RESYNC and self.account_ids is not None and event['account_id'] not in self.account_ids:
+            return 0
+        try:
+            self.queue.put_nowait(event)
+            return 0
+        except asyncio.QueueFull:
+            # Медленный клиент: вместо неограниченного буфера он перечитает состояние сам.
+            dropped = self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return dropped
+
+
+class AccountEventHub:
+    """Общее на процесс LISTEN-соединение и подписчики событий по user_id."""
+
+    def __init__(
+            self, dsn: str, buffer: int, max_subscribers: int, liveness_interval: float, liveness_timeout: float
+    ):
+        self._dsn = dsn
+        self._buffer = buffer
+        self._max_subscribers = max_subscribers
+        self._liveness_interval = liveness_interval
+        self._liveness_timeout = liveness_timeout
+        self._subscribers: dict[int, set[Subscriber]] = {}
+        self._count = 0
+        self._task: asyncio.Task | None = None
+        self.connected = False
+        self.received = 0
+        self.dropped = 0
+        self.malformed = 0
+        self.reconnects = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._listen_connection()
+                logger.warning('Account events connection lost, reconnecting')
+            except Exception:
+                # Ошибки add_listener, проверки и самого соединения не должны останавливать цикл.
+                logger.exception('Account events connection failed, reconnecting')
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen_connection(self) -> None:
+        """Слушает канал по одному соединению, пока оно не разорвется или не перестанет отвечать."""
+        conn = await asyncpg.connect(self._dsn, timeout=self._liveness_timeout)
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _: lost.set())
+        try:
+            await conn.add_listener(ACCOUNT_EVENTS_CHANNEL, self._on_notification)
+            self.connected = True
+            # События, пришедшие, пока соединения не было, потеряны.
+            self._broadcast_resync()
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), self._liveness_interval)
+                except asyncio.TimeoutError:
+                    await conn.fetchval('SELECT 1', timeout=self._liveness_timeout)
+        finally:
+            self.connected = False
+            try:
+                await conn.close(timeout=RECONNECT_DELAY)
+            except Exception:
+                conn.terminate()
+
+    def _on_notification(self, _connection, _pid, _channel, payload: str) -> None:
+        self.received += 1
+        try:
+            event = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            event = None
+        if not isinstance(event, dict) or 'user_id' not in event or 'account_id' not in event:
+            self.malformed += 1
+            logger.warning('Malformed account event payload: %r', payload)
+            return
+        for subscriber in self._subscribers.get(event['user_id'], ()):
+            self.dropped += subscriber.push(event)
+
+    def _broadcast_resync(self) -> None:
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                self.dropped += subscriber.push(RESYNC)
+
+    def check_capacity(self) -> None:
+        """
+        Raises:
+            HTTPException: 503 - Если в процессе уже max_subscribers подписчиков
+        """
+        if self._count >= self._max_subscribers:
+            raise HTTPException(status_code=503, detail='Too many event subscribers')
+
+    def subscribe(self, user_id: int, account_ids: set[int] | None = None) -> Subscriber:
+        """
+        Raises:
+            HTTPException: 503 - Если в процессе уже max_subscribers подписчиков
+        """
+        self.check_capacity()
+        subscriber = Subscriber(user_id, account_ids, self._buffer)
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+        self._count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.user_id]
+        self._count -= 1
+
+    async def stream(self, user_id: int, account_ids: set[int] | None = None):
+        """
+        Подписывает пользователя и отдает его события в формате text/event-stream, пока клиент
+        не отключится. Подписка создается только при чтении тела ответа, поэтому клиент,
+        отключившийся до этого, не оставляет подписчика, которому рассылаются события.
+        """
+        subscriber = self.subscribe(user_id, account_ids)
+        try:
+            yield b'event: ready\ndata: {}\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), ACCOUNT_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Комментарий SSE не дает прокси закрыть простаивающее соединение.
+                    yield b': keepalive\n\n'
+                    continue
+                if event is RESYNC:
+                    yield b'event: resync\ndata: {}\n\n'
+                else:
+                    yield b'event: transaction\ndata: ' + orjson.dumps(event) + b'\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            'connected': self.connected,
+            'subscribers': self._count,
+            'users': len(self._subscribers),
+            'received': self.received,
+            'dropped': self.dropped,
+            'malformed': self.malformed,
+            'reconnects': self.reconnects,
+        }
+
+
+account_event_hub = AccountEventHub(
+    f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
+    ACCOUNT_EVENTS_BUFFER,
+    ACCOUNT_EVENTS_MAX_SUBSCRIBERS,
+    ACCOUNT_EVENTS_LIVENESS_INTERVAL,
+    ACCOUNT_EVENTS_LIVENESS_TIMEOUT,
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Double, ForeignKey
+from sqlalchemy import MetaData, Table, Column, Integer, BigInteger, String, Double, Date, ForeignKey, Index
 
 from user.models import user
 
@@ -10,4 +10,37 @@ account = Table(
     Column("id", Integer, primary_key=True),
     Column("user_id", Integer, ForeignKey(user.c.id)),
     Column("amount", Double, nullable=False),
-)
\ No newline at end of file
+    Index("ix_account_user_id_id", "user_id", "id", postgresql_include=["amount"]),
+)
+
+# Агрегаты по счетам, которые запрос применения платежей обновляет в той же транзакции БД.
+account_summary = Table(
+    "account_summary",
+    account_metadata,
+    Column("account_id", Integer, primary_key=True),
+    Column("user_id", Integer),
+    Column("total", Double, nullable=False, server_default="0"),
+    Column("inflow", Double, nullable=False, server_default="0"),
+    Column("outflow", Double, nullable=False, server_default="0"),
+    Column("transaction_count", BigInteger, nullable=False, server_default="0"),
+    Index(
+        "ix_account_summary_user_id", "user_id",
+        postgresql_include=["account_id", "total", "inflow", "outflow", "transaction_count"],
+    ),
+)
+
+account_daily_summary = Table(
+    "account_daily_summary",
+    account_metadata,
+    Column("account_id", Integer, primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("total", Double, nullable=False, server_default="0"),
+    Column("inflow", Double, nullable=False, server_default="0"),
+    Column("outflow", Double, nullable=False, server_default="0"),
+    Column("transaction_count", BigInteger, nullable=False, server_default="0"),
+    Index(
+        "ix_account_daily_summary_user_id_day", "user_id", "day",
+        postgresql_include=["total", "inflow", "outflow", "transaction_count"],
+    ),
+)
@@ -0,0 +1,42 @@
+from sqlalchemy import Integer, Text, bindparam, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from account.models import account, account_summary, account_daily_summary
+
+select_user_accounts = select(account).where(account.c.user_id == bindparam('user_id'))
+# Версия счетов пользователя для ETag: xmin строки счета меняется при каждом ее обновлении, в том
+# числе при применении платежа, который и так блокирует эту строку. Новые транзакции всегда
+# обновляют свой счет, поэтому версия покрывает и историю транзакций.
+select_accounts_version = (
+    select(func.md5(func.string_agg(
+        cast(account.c.id, Text) + ':' + cast(literal_column('account.xmin'), Text),
+        aggregate_order_by(literal_column("','"), account.c.id),
+    )))
+    .where(account.c.user_id == bindparam('user_id'))
+)
+select_user_summaries = (
+    select(
+        account_summary.c.account_id,
+        account_summary.c.total,
+        account_summary.c.inflow,
+        account_summary.c.outflow,
+        account_summary.c.transaction_count,
+    )
+    .where(account_summary.c.user_id == bindparam('user_id'))
+    .order_by(account_summary.c.account_id)
+)
+select_user_daily_summaries = (
+    select(
+        account_daily_summary.c.day,
+        func.sum(account_daily_summary.c.total).label('total'),
+        func.sum(account_daily_summary.c.inflow).label('inflow'),
+        func.sum(account_daily_summary.c.outflow).label('outflow'),
+        func.sum(account_daily_summary.c.transaction_count).label('transaction_count'),
+    )
+    .where(
+        account_daily_summary.c.user_id == bindparam('user_id'),
+        account_daily_summary.c.day > func.current_date() - bindparam('days', type_=Integer),
+    )
+    .group_by(account_daily_summary.c.day)
+    .order_by(account_daily_summary.c.day.desc())
+)
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_async_session
-from user.utils import get_current_user
+from database import get_read_session
+from pagination import keyset_page, ndjson_response, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from user.utils import get_current_user, get_user_read_session, get_balance_etag, etag_matches
 from user.schemas import User
 from account.models import account
+from account.queries import select_user_accounts
+from account.schemas import AccountInfo, AccountPage, UserSummary, UserDailySummary
+from account.utils import get_user_summary, get_user_daily_summary
+from account.events import account_event_hub
+from singleflight import coalesced_response
+from config import ACCOUNT_EVENTS_ENABLED
 from transactions.models import transaction
 
 from user.utils import verify_admin
@@ -15,15 +22,21 @@ router = APIRouter(
 )
 
 
-@router.get('/my_account_info')
+@router.get('/my_account_info', response_model=AccountInfo)
 async def get_account_info(
-        session: AsyncSession = Depends(get_async_session),
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_user_read_session),
         current_user: User = Depends(get_current_user)
 ):
     """
     Получает информацию о всех счетах текущего авторизованного пользователя.
+    Поддерживает условный запрос: если If-None-Match совпадает с текущим ETag,
+    возвращается 304 без чтения счетов.
 
     Args:
+        request (Request): Входящий запрос (заголовок If-None-Match).
+        response (Response): Ответ, в который добавляется заголовок ETag.
         session (AsyncSession): Асинхронная сессия для работы с БД.
         current_user (User): Данные текущего пользователя.
 
@@ -33,27 +46,30 @@ async def get_account_info(
     Raises:
         HTTPException: 404 если у пользователя нет счетов.
     """
-    query = select(account).where(account.c.user_id == current_user['id'])
-    result = await session.execute(query)
-    account_info = [dict(r._mapping) for r in result]
+    etag = await get_balance_etag(current_user['id'], session)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+
+    result = await session.execute(select_user_accounts, {'user_id': current_user['id']})
+    account_info = result.all()
     if not account_info:
         raise HTTPException(status_code=404, detail='This user has no accounts')
     return {'account_info': account_info}
 
 
-@router.get('/admin/user_account_info/{user_id}')
+@router.get('/admin/user_account_info/{user_id}', response_model=AccountInfo)
 async def get_user_account_info(
         user_id: int,
-        session: AsyncSession = Depends(get_async_session),
         _: User = Depends(verify_admin),
 ):
     """
     Получает информацию о всех счетах указанного пользователя.
     Доступно только для администраторов (проверяется через verify_admin).
+    Одинаковые одновременные запросы выполняют одну выборку (см. singleflight).
 
     Args:
         user_id (int): ID пользователя в БД, для которого запрашиваются счета
-        session (AsyncSession): Асинхронная сессия БД
         _ (User): Параметр для проверки прав администратора
 
     Returns:
@@ -63,33 +79,183 @@ async def get_user_account_info(
         HTTPException: 404 - Если у пользователя нет счетов
         HTTPException: 403 - Если запрашивающий не является администратором
     """
-    query = select(account).where(account.c.user_id == user_id)
-    result = await session.execute(query)
-    account_info = [dict(r._mapping) for r in result]
-    if not account_info:
-        raise HTTPException(status_code=404, detail='This user has no accounts')
-    return {'account_info': account_info}
+    async def query(session: AsyncSession) -> dict:
+        result = await session.execute(select_user_accounts, {'user_id': user_id})
+        account_info = result.all()
+        if not account_info:
+            raise HTTPException(status_code=404, detail='This user has no accounts')
+        return {'account_info': account_info}
+
+    return await coalesced_response('accounts', ('user_account_info', user_id), AccountInfo, query)
 
 
-@router.get('/admin/get_all_accounts')
+@router.get('/admin/get_all_accounts', response_model=AccountPage)
 async def get_all_accounts(
-        session: AsyncSession = Depends(get_async_session),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+        after: int | None = None,
         _: User = Depends(verify_admin),
 ):
     """
-    Получает информацию о всех существующих счетах в системе.
+    Получает страницу списка всех существующих счетов в системе, упорядоченного по ID.
+    Требует административных прав доступа. Одинаковые одновременные запросы выполняют
+    одну выборку (см. singleflight).
+
+    Args:
+        limit (int): Максимальное количество счетов на странице
+        after (int | None): ID последнего счета предыдущей страницы
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'accounts', содержащим страницу счетов, и ключом 'next_after'
+        со значением after для следующей страницы (None, если страница последняя)
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    async def query(session: AsyncSession) -> dict:
+        accounts, next_after = await keyset_page(session, account, account.c.id, limit, after)
+        return {'accounts': accounts, 'next_after': next_after}
+
+    return await coalesced_response('accounts', ('get_all_accounts', limit, after), AccountPage, query)
+
+
+@router.get('/admin/stream_all_accounts')
+async def stream_all_accounts(
+        _: User = Depends(verify_admin),
+):
+    """
+    Выгружает все счета в формате NDJSON (по одному JSON-объекту на строку) потоком.
     Требует административных прав доступа.
 
     Args:
-        session (AsyncSession): Асинхронная сессия подключения к БД
         _ (User): Параметр для проверки прав администратора
 
     Returns:
-        dict: Словарь с ключом 'accounts', содержащим список всех счетов
+        StreamingResponse: Поток application/x-ndjson со всеми счетами, упорядоченными по ID
 
     Raises:
         HTTPException: 403 - Если запрашивающий не имеет прав администратора
     """
-    query = select(account)
-    result = await session.execute(query)
-    return {'accounts': [dict(r._mapping) for r in result]}
+    return ndjson_response(account, account.c.id)
+
+
+@router.get('/summary', response_model=UserSummary)
+async def get_summary(
+        session: AsyncSession = Depends(get_user_read_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Получает итоги текущего пользователя: общую сумму, поступления, списания и число
+    транзакций по всем счетам и по каждому счету.
+
+    Args:
+        session (AsyncSession): Асинхронная сессия для работы с БД.
+        current_user (User): Данные текущего пользователя.
+
+    Returns:
+        dict: Словарь с итогами пользователя и ключом 'accounts' с итогами по счетам.
+    """
+    return await get_user_summary(current_user['id'], session)
+
+
+@router.get('/daily_summary', response_model=UserDailySummary)
+async def get_daily_summary(
+        days: int = Query(30, ge=1, le=366),
+        session: AsyncSession = Depends(get_user_read_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Получает суммы текущего пользователя по дням применения транзакций.
+
+    Args:
+        days (int): Количество последних дней, включая текущий.
+        session (AsyncSession): Асинхронная сессия для работы с БД.
+        current_user (User): Данные текущего пользователя.
+
+    Returns:
+        dict: Словарь с ключом 'days', содержащим итоги по дням от новых к старым
+        (дни без транзакций пропускаются).
+    """
+    return await get_user_daily_summary(current_user['id'], days, session)
+
+
+@router.get('/events')
+async def get_events(
+        account_id: list[int] | None = Query(None),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Поток событий о платежах по счетам текущего пользователя (Server-Sent Events).
+    Сначала отправляется событие ready, после которого клиенту стоит один раз прочитать
+    /account/my_account_info, затем по событию transaction на каждый примененный платеж
+    (account_id, transaction_id, amount, balance). Событие resync означает, что часть
+    событий пропущена и состояние нужно перечитать.
+
+    Args:
+        account_id (list[int] | None): Счета, по которым нужны события (по умолчанию все счета)
+        current_user (User): Данные текущего пользователя.
+
+    Returns:
+        StreamingResponse: Поток text/event-stream
+
+    Raises:
+        HTTPException: 503 - Если события выключены или в процессе слишком много подписчиков
+    """
+    if not ACCOUNT_EVENTS_ENABLED:
+        raise HTTPException(status_code=503, detail='Account events are disabled')
+    account_event_hub.check_capacity()
+    return StreamingResponse(
+        account_event_hub.stream(current_user['id'], set(account_id) if account_id else None),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@router.get('/admin/user_summary/{user_id}', response_model=UserSummary)
+async def get_user_summary_info(
+        user_id: int,
+        session: AsyncSession = Depends(get_read_session),
+        _: User = Depends(verify_admin),
+):
+    """
+    Получает итоги указанного пользователя по всем его счетам и по каждому счету.
+    Доступно только для администраторов (проверяется через verify_admin).
+
+    Args:
+        user_id (int): ID пользователя в БД
+        session (AsyncSession): Асинхронная сессия БД
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с итогами пользователя и ключом 'accounts' с итогами по счетам
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не является администратором
+    """
+    return await get_user_summary(user_id, session)
+
+
+@router.get('/admin/user_daily_summary/{user_id}', response_model=UserDailySummary)
+async def get_user_daily_summary_info(
+        user_id: int,
+        days: int = Query(30, ge=1, le=366),
+        session: AsyncSession = Depends(get_read_session),
+        _: User = Depends(verify_admin),
+):
+    """
+    Получает суммы указанного пользователя по дням применения транзакций.
+    Доступно только для администраторов (проверяется через verify_admin).
+
+    Args:
+        user_id (int): ID пользователя в БД
+        days (int): Количество последних дней, включая текущий
+        session (AsyncSession): Асинхронная сессия БД
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'days', содержащим итоги по дням от новых к старым
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не является администратором
+    """
+    return await get_user_daily_summary(user_id, days, session)
@@ -1,6 +1,47 @@
-from pydantic import BaseModel
+from datetime import date
+
+from pydantic import BaseModel, ConfigDict
+
+class Account(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-class Account:
     id: int
+    user_id: int | None
+    amount: float
+
+class AccountInfo(BaseModel):
+    account_info: list[Account]
+
+class AccountPage(BaseModel):
+    accounts: list[Account]
+    next_after: int | None
+
+class AccountSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    account_id: int
+    total: float
+    inflow: float
+    outflow: float
+    transaction_count: int
+
+class UserSummary(BaseModel):
+    user_id: int
+    total: float
+    inflow: float
+    outflow: float
+    transaction_count: int
+    accounts: list[AccountSummary]
+
+class DailySummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    day: date
+    total: float
+    inflow: float
+    outflow: float
+    transaction_count: int
+
+class UserDailySummary(BaseModel):
     user_id: int
-    amount: float
\ No newline at end of file
+    days: list[DailySummary]
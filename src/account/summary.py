@@ -0,0 +1,139 @@
+"""
+Пересчет account_summary и account_daily_summary по истории транзакций.
+
+Диапазон ID счетов делится на куски по --chunk-size, куски пересчитываются параллельно
+в --parallel соединениях, каждый в своей транзакции БД. Счета куска блокируются через
+FOR UPDATE, поэтому платежи по ним ждут окончания пересчета куска, а не теряются.
+Итоги счета включают архивированные секции (archived_transaction_totals), а дневные
+итоги пересчитываются только начиная с первого дня, который есть в таблице transaction.
+
+Запуск из каталога src:
+    python -m account.summary --chunk-size 10000 --parallel 4
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import Date, bindparam, cast, delete, func, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+
+from account.models import account, account_summary, account_daily_summary
+from config import DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW
+from database import async_session_maker, engine
+from transactions.models import transaction, archived_transaction_totals
+
+_in_chunk = (bindparam('low'), bindparam('high'))
+
+select_account_id_range = select(func.min(account.c.id), func.max(account.c.id))
+lock_chunk_accounts = (
+    select(account.c.id)
+    .where(account.c.id.between(*_in_chunk))
+    .with_for_update()
+)
+delete_chunk_summaries = delete(account_summary).where(account_summary.c.account_id.between(*_in_chunk))
+
+_amount = transaction.c.amount
+_sums = (
+    func.sum(_amount),
+    func.coalesce(func.sum(_amount).filter(_amount > 0), 0),
+    func.coalesce(func.sum(_amount).filter(_amount < 0), 0),
+    func.count(),
+)
+_totals = union_all(
+    select(transaction.c.account_id, *_sums)
+    .where(transaction.c.account_id.between(*_in_chunk))
+    .group_by(transaction.c.account_id),
+    select(
+        archived_transaction_totals.c.account_id,
+        archived_transaction_totals.c.total,
+        archived_transaction_totals.c.inflow,
+        archived_transaction_totals.c.outflow,
+        archived_transaction_totals.c.transaction_count,
+    )
+    .where(archived_transaction_totals.c.account_id.between(*_in_chunk)),
+).subquery('totals')
+_rebuilt = insert(account_summary).from_select(
+    ['account_id', 'user_id', 'total', 'inflow', 'outflow', 'transaction_count'],
+    select(
+        _totals.c.account_id,
+        account.c.user_id,
+        *(func.sum(c) for c in list(_totals.c)[1:]),
+    )
+    .join(account, account.c.id == _totals.c.account_id)
+    .group_by(_totals.c.account_id, account.c.user_id),
+)
+# Счет, созданный платежом во время пересчета, еще не заблокирован: его строку перезаписываем.
+rebuild_chunk_summaries = _rebuilt.on_conflict_do_update(
+    index_elements=[account_summary.c.account_id],
+    set_={name: _rebuilt.excluded[name] for name in ('user_id', 'total', 'inflow', 'outflow', 'transaction_count')},
+)
+
+_day = cast(transaction.c.created_at, Date)
+_first_live_day = (
+    select(cast(func.min(transaction.c.created_at), Date))
+    .where(transaction.c.account_id == account_daily_summary.c.account_id)
+    .scalar_subquery()
+)
+delete_chunk_daily_summaries = delete(account_daily_summary).where(
+    account_daily_summary.c.account_id.between(*_in_chunk),
+    account_daily_summary.c.day >= _first_live_day,
+)
+_rebuilt_daily = insert(account_daily_summary).from_select(
+    ['account_id', 'day', 'user_id', 'total', 'inflow', 'outflow', 'transaction_count'],
+    select(transaction.c.account_id, _day, func.min(transaction.c.user_id), *_sums)
+    .where(transaction.c.account_id.between(*_in_chunk))
+    .group_by(transaction.c.account_id, _day),
+)
+rebuild_chunk_daily_summaries = _rebuilt_daily.on_conflict_do_update(
+    index_elements=list(account_daily_summary.primary_key),
+    set_={name: _rebuilt_daily.excluded[name] for name in ('user_id', 'total', 'inflow', 'outflow', 'transaction_count')},
+)
+
+
+async def rebuild_chunk(low: int, high: int) -> None:
+    params = {'low': low, 'high': high}
+    async with async_session_maker() as session:
+        await session.execute(lock_chunk_accounts, params)
+        await session.execute(delete_chunk_summaries, params)
+        await session.execute(rebuild_chunk_summaries, params)
+        await session.execute(delete_chunk_daily_summaries, params)
+        await session.execute(rebuild_chunk_daily_summaries, params)
+        await session.commit()
+
+
+async def rebuild(chunk_size: int, parallel: int) -> int:
+    """
+    Returns:
+        int: число пересчитанных кусков
+    """
+    async with async_session_maker() as session:
+        low, high = (await session.execute(select_account_id_range)).one()
+    if low is None:
+        return 0
+
+    chunks = [(start, min(start + chunk_size - 1, high)) for start in range(low, high + 1, chunk_size)]
+    semaphore = asyncio.Semaphore(min(parallel, DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW))
+
+    async def run(chunk: tuple[int, int]) -> None:
+        async with semaphore:
+            await rebuild_chunk(*chunk)
+            print(f'rebuilt accounts {chunk[0]}..{chunk[1]}', file=sys.stderr)
+
+    await asyncio.gather(*(run(chunk) for chunk in chunks))
+    return len(chunks)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Пересчет итогов счетов по таблице transaction')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='число ID счетов в куске')
+    parser.add_argument('--parallel', type=int, default=4, help='число кусков, пересчитываемых одновременно')
+    args = parser.parse_args()
+
+    chunks = await rebuild(args.chunk_size, args.parallel)
+    print(f'rebuilt {chunks} chunks', file=sys.stderr)
+    await engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,23 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from account.queries import select_user_summaries, select_user_daily_summaries
+
+
+async def get_user_summary(user_id: int, session: AsyncSession) -> dict:
+    """Итоги пользователя по всем его счетам из account_summary, без чтения истории транзакций."""
+    result = await session.execute(select_user_summaries, {'user_id': user_id})
+    accounts = result.all()
+    return {
+        'user_id': user_id,
+        'total': sum(a.total for a in accounts),
+        'inflow': sum(a.inflow for a in accounts),
+        'outflow': sum(a.outflow for a in accounts),
+        'transaction_count': sum(a.transaction_count for a in accounts),
+        'accounts': accounts,
+    }
+
+
+async def get_user_daily_summary(user_id: int, days: int, session: AsyncSession) -> dict:
+    """Суммы пользователя по дням за последние days дней, начиная с текущего."""
+    result = await session.execute(select_user_daily_summaries, {'user_id': user_id, 'days': days})
+    return {'user_id': user_id, 'days': result.all()}
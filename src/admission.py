@@ -0,0 +1,215 @@
+"""
+Контроль допуска запросов (admission control) перед обращением к БД.
+
+Запросы делятся на классы приоритета: платежи, пользовательские запросы и админские.
+Число одновременно выполняемых запросов процесса ограничено емкостью пула соединений
+(DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW), и каждый класс может начать выполнение, только пока
+занято меньше его доли емкости: платежам доступна вся емкость, остальным - часть, поэтому
+при перегрузке админские и пользовательские запросы отсекаются раньше платежей.
+Запрос, не получивший места, ждет не дольше max_wait своего класса (освободившееся место
+отдается самому приоритетному ожидающему) и затем получает 503 с Retry-After.
+Пользовательские и админские запросы дополнительно ограничены корзинами токенов по токену
+авторизации и по IP клиента (429 с Retry-After). Платежи не ограничиваются по частоте:
+повторы провайдера ограничены очередью ожидания.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.responses import JSONResponse
+
+from config import (
+    DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW,
+    ADMISSION_USER_SHARE, ADMISSION_ADMIN_SHARE,
+    ADMISSION_PAYMENT_MAX_WAIT, ADMISSION_USER_MAX_WAIT, ADMISSION_ADMIN_MAX_WAIT, ADMISSION_MAX_WAITERS,
+    ADMISSION_USER_RATE, ADMISSION_USER_BURST, ADMISSION_IP_RATE, ADMISSION_IP_BURST, ADMISSION_RETRY_AFTER,
+)
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT
+
+PAYMENT_PATHS = {
+    '/transaction/make_transaction',
+    '/transaction/make_transactions_batch',
+    '/transaction/enqueue_transaction',
+}
+# Не обращаются к пулу или должны отвечать и при перегрузке.
+EXEMPT_PREFIXES = ('/metrics', '/docs', '/redoc', '/openapi.json', '/diagnostics/', '/account/events')
+MAX_BUCKETS = 100000
+
+
+@dataclass(frozen=True)
+class PriorityClass:
+    name: str
+    priority: int
+    limit: int
+    max_wait: float
+    rate_limited: bool
+
+
+class TokenBuckets:
+    """Корзины токенов по ключу; самые давно не использованные удаляются сверх max_keys."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_BUCKETS):
+        self._rate = rate
+        self._burst = burst
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """
+        Returns:
+            float: 0, если токен взят, иначе число секунд до появления токена
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - updated) * self._rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self._rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionController:
+    """Общий на процесс счетчик выполняемых запросов и очередь ожидающих по приоритету."""
+
+    def __init__(self, classes: list[PriorityClass], max_waiters: int):
+        self.classes = {cls.name: cls for cls in classes}
+        self._max_waiters = max_waiters
+        self._waiters: list[tuple[int, int, asyncio.Future, PriorityClass]] = []
+        self._sequence = itertools.count()
+        self.inflight = 0
+        self.waiting = {cls.name: 0 for cls in classes}
+        self.admitted = {cls.name: 0 for cls in classes}
+
+    def _waiting_ahead(self, cls: PriorityClass) -> bool:
+        return any(self.waiting[other.name] for other in self.classes.values() if other.priority <= cls.priority)
+
+    async def acquire(self, cls: PriorityClass) -> bool:
+        if self.inflight < cls.limit and not self._waiting_ahead(cls):
+            self.inflight += 1
+            self.admitted[cls.name] += 1
+            return True
+        if cls.max_wait <= 0 or sum(self.waiting.values()) >= self._max_waiters:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (cls.priority, next(self._sequence), future, cls))
+        self.waiting[cls.name] += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({future}, timeout=cls.max_wait)
+        finally:
+            self.waiting[cls.name] -= 1
+            if not future.done():
+                future.cancel()
+            elif asyncio.current_task().cancelling():
+                # Место уже выдано, но клиент ушел: возвращаем его следующему.
+                self.release()
+            ADMISSION_WAIT.labels(cls.name).observe(time.perf_counter() - start)
+        if future.cancelled():
+            return False
+        self.admitted[cls.name] += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
+        while self._waiters:
+            _, _, future, cls = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            # Лимиты классов убывают вместе с приоритетом: если не проходит первый, не пройдут и остальные.
+            if self.inflight >= cls.limit:
+                return
+            heapq.heappop(self._waiters)
+            self.inflight += 1
+            future.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            'inflight': self.inflight,
+            'limits': {name: cls.limit for name, cls in self.classes.items()},
+            'waiting': dict(self.waiting),
+            'admitted': dict(self.admitted),
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware, отклоняющий запросы сверх лимитов с 429/503 и Retry-After."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+        self.user_buckets = TokenBuckets(ADMISSION_USER_RATE, ADMISSION_USER_BURST)
+        self.ip_buckets = TokenBuckets(ADMISSION_IP_RATE, ADMISSION_IP_BURST)
+
+    def classify(self, path: str) -> PriorityClass | None:
+        if path.startswith(EXEMPT_PREFIXES):
+            return None
+        if path in PAYMENT_PATHS:
+            return self.controller.classes['payment']
+        if '/admin/' in path:
+            return self.controller.classes['admin']
+        return self.controller.classes['user']
+
+    def rate_limit_wait(self, scope) -> float:
+        wait = 0.0
+        if scope.get('client'):
+            wait = self.ip_buckets.take(scope['client'][0])
+        for name, value in scope['headers']:
+            if name == b'authorization':
+                # Ключ - сам токен: подделать чужую корзину без токена пользователя нельзя.
+                wait = max(wait, self.user_buckets.take(value.decode('latin-1')))
+                break
+        return wait
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        cls = self.classify(scope['path'])
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+
+        if cls.rate_limited:
+            wait = self.rate_limit_wait(scope)
+            if wait:
+                ADMISSION_REJECTED.labels(cls.name, 'rate_limit').inc()
+                await self._reject(scope, receive, send, 429, 'Too many requests', wait)
+                return
+
+        if not await self.controller.acquire(cls):
+            ADMISSION_REJECTED.labels(cls.name, 'overload').inc()
+            await self._reject(scope, receive, send, 503, 'Server is overloaded', ADMISSION_RETRY_AFTER)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: float) -> None:
+        response = JSONResponse(
+            {'detail': detail}, status_code=status_code, headers={'Retry-After': str(math.ceil(retry_after))}
+        )
+        await response(scope, receive, send)
+
+
+_capacity = DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW
+admission_controller = AdmissionController(
+    [
+        PriorityClass('payment', 0, _capacity, ADMISSION_PAYMENT_MAX_WAIT, False),
+        PriorityClass('user', 1, max(1, int(_capacity * ADMISSION_USER_SHARE)), ADMISSION_USER_MAX_WAIT, True),
+        PriorityClass('admin', 2, max(1, int(_capacity * ADMISSION_ADMIN_SHARE)), ADMISSION_ADMIN_MAX_WAIT, True),
+    ],
+    ADMISSION_MAX_WAITERS,
+)
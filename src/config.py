@@ -9,8 +9,82 @@ DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 DB_NAME = os.getenv('DB_NAME')
 
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'true').lower() == 'true'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 5))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+DB_POOL_WARMUP = int(os.getenv('DB_POOL_WARMUP', DB_POOL_SIZE))
+DB_QUERY_CACHE_SIZE = int(os.getenv('DB_QUERY_CACHE_SIZE', 500))
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', 500))
+DB_REPLICA_URLS = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv('DB_REPLICA_HEALTH_INTERVAL', 5))
+DB_REPLICA_HEALTH_TIMEOUT = float(os.getenv('DB_REPLICA_HEALTH_TIMEOUT', 2))
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 10))
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', 5))
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'development')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)) if SERVER_MODE == 'production' else 1
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', 30))
+DB_CONNECTION_BUDGET = int(os.getenv('DB_CONNECTION_BUDGET', 90))
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_USER_SHARE = float(os.getenv('ADMISSION_USER_SHARE', 0.8))
+ADMISSION_ADMIN_SHARE = float(os.getenv('ADMISSION_ADMIN_SHARE', 0.3))
+ADMISSION_PAYMENT_MAX_WAIT = float(os.getenv('ADMISSION_PAYMENT_MAX_WAIT', 2))
+ADMISSION_USER_MAX_WAIT = float(os.getenv('ADMISSION_USER_MAX_WAIT', 0.1))
+ADMISSION_ADMIN_MAX_WAIT = float(os.getenv('ADMISSION_ADMIN_MAX_WAIT', 0))
+ADMISSION_MAX_WAITERS = int(os.getenv('ADMISSION_MAX_WAITERS', 200))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', 20))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', 40))
+ADMISSION_IP_RATE = float(os.getenv('ADMISSION_IP_RATE', 50))
+ADMISSION_IP_BURST = float(os.getenv('ADMISSION_IP_BURST', 100))
+ADMISSION_RETRY_AFTER = float(os.getenv('ADMISSION_RETRY_AFTER', 1))
+SINGLEFLIGHT_CACHE_TTL = float(os.getenv('SINGLEFLIGHT_CACHE_TTL', 0))
+SINGLEFLIGHT_CACHE_SIZE = int(os.getenv('SINGLEFLIGHT_CACHE_SIZE', 1000))
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+EVENT_LOOP_MONITOR_ENABLED = os.getenv('EVENT_LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+EVENT_LOOP_PROBE_INTERVAL = float(os.getenv('EVENT_LOOP_PROBE_INTERVAL', 0.1))
+EVENT_LOOP_STALL_THRESHOLD_MS = float(os.getenv('EVENT_LOOP_STALL_THRESHOLD_MS', 100))
+EVENT_LOOP_STALL_HISTORY = int(os.getenv('EVENT_LOOP_STALL_HISTORY', 50))
+
 TRANSACTION_SECRET_KEY = os.getenv('TRANSACTION_SECRET_KEY')
+TRANSACTION_BATCH_MAX_SIZE = int(os.getenv('TRANSACTION_BATCH_MAX_SIZE', 1000))
+TRANSACTION_COALESCE_ENABLED = os.getenv('TRANSACTION_COALESCE_ENABLED', 'false').lower() == 'true'
+TRANSACTION_COALESCE_MAX_BATCH = int(os.getenv('TRANSACTION_COALESCE_MAX_BATCH', 100))
+TRANSACTION_COALESCE_MAX_LINGER_MS = float(os.getenv('TRANSACTION_COALESCE_MAX_LINGER_MS', 2))
+TRANSACTION_FILTER_ENABLED = os.getenv('TRANSACTION_FILTER_ENABLED', 'true').lower() == 'true'
+TRANSACTION_FILTER_RECENT_SIZE = int(os.getenv('TRANSACTION_FILTER_RECENT_SIZE', 100000))
+TRANSACTION_FILTER_CAPACITY = int(os.getenv('TRANSACTION_FILTER_CAPACITY', 10000000))
+TRANSACTION_FILTER_ERROR_RATE = float(os.getenv('TRANSACTION_FILTER_ERROR_RATE', 0.01))
+PAYMENT_QUEUE_ENABLED = os.getenv('PAYMENT_QUEUE_ENABLED', 'false').lower() == 'true'
+PAYMENT_QUEUE_WORKERS = int(os.getenv('PAYMENT_QUEUE_WORKERS', 2))
+PAYMENT_QUEUE_BATCH_SIZE = int(os.getenv('PAYMENT_QUEUE_BATCH_SIZE', 500))
+PAYMENT_QUEUE_POLL_INTERVAL = float(os.getenv('PAYMENT_QUEUE_POLL_INTERVAL', 0.2))
+PAYMENT_QUEUE_MAX_ATTEMPTS = int(os.getenv('PAYMENT_QUEUE_MAX_ATTEMPTS', 5))
+PAYMENT_QUEUE_RETENTION_HOURS = int(os.getenv('PAYMENT_QUEUE_RETENTION_HOURS', 24))
+PAYMENT_QUEUE_STATS_INTERVAL = float(os.getenv('PAYMENT_QUEUE_STATS_INTERVAL', 5))
+ACCOUNT_EVENTS_ENABLED = os.getenv('ACCOUNT_EVENTS_ENABLED', 'true').lower() == 'true'
+ACCOUNT_EVENTS_BUFFER = int(os.getenv('ACCOUNT_EVENTS_BUFFER', 100))
+ACCOUNT_EVENTS_MAX_SUBSCRIBERS = int(os.getenv('ACCOUNT_EVENTS_MAX_SUBSCRIBERS', 10000))
+ACCOUNT_EVENTS_KEEPALIVE = float(os.getenv('ACCOUNT_EVENTS_KEEPALIVE', 15))
+ACCOUNT_EVENTS_LIVENESS_INTERVAL = float(os.getenv('ACCOUNT_EVENTS_LIVENESS_INTERVAL', 10))
+ACCOUNT_EVENTS_LIVENESS_TIMEOUT = float(os.getenv('ACCOUNT_EVENTS_LIVENESS_TIMEOUT', 5))
+
+# Бюджет соединений одного сервера БД на все процессы. Каждый процесс держит свой пул и, при
+# ACCOUNT_EVENTS_ENABLED, одно соединение LISTEN вне пула, поэтому
+# workers * (pool_size + max_overflow + listen) не должно превышать бюджет. Воркеры очереди,
+# группировка платежей и single-flight берут соединения из пула и в бюджет уже входят. Пул каждой
+# реплики получает те же размеры, то есть тот же бюджет на своем сервере. При DB_POOL_ENABLED=false
+# (NullPool) число соединений не ограничено.
+_listen_connections = 1 if ACCOUNT_EVENTS_ENABLED else 0
+_connections_per_worker = max(1, DB_CONNECTION_BUDGET // WEB_CONCURRENCY - _listen_connections)
+DB_POOL_SIZE = min(DB_POOL_SIZE, _connections_per_worker)
+DB_POOL_MAX_OVERFLOW = min(DB_POOL_MAX_OVERFLOW, _connections_per_worker - DB_POOL_SIZE)
 SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = os.getenv('ALGORITHM')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES'))
+AUTH_STATELESS = os.getenv('AUTH_STATELESS', 'true').lower() == 'true'
 
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
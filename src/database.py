@@ -1,20 +1,225 @@
+import asyncio
+import itertools
+import time
 from typing import AsyncGenerator
 
-from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import NullPool, AsyncAdaptedQueuePool, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
-from config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+from config import (
+    DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME,
+    DB_POOL_ENABLED, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE, DB_POOL_TIMEOUT, DB_POOL_WARMUP, DB_QUERY_CACHE_SIZE, DB_PREPARED_STATEMENT_CACHE_SIZE,
+    DB_REPLICA_URLS, DB_REPLICA_HEALTH_TIMEOUT, DB_REPLICA_MAX_LAG_SECONDS,
+    DB_READ_YOUR_WRITES_SECONDS, METRICS_ENABLED,
+)
+from metrics import DB_POOL_WAIT, instrument_engine
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 Base = declarative_base()
 
 
-engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+class PoolWaitStats:
+    """Накопительная статистика ожидания соединения из пула."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        DB_POOL_WAIT.observe(wait)
+        self.acquired += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время ожидания свободного соединения."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - start)
+
+
+# Кэш скомпилированных запросов SQLAlchemy общий для движка, кэш подготовленных
+# запросов asyncpg - свой у каждого соединения и живет, пока соединение в пуле.
+cache_options = {
+    'query_cache_size': DB_QUERY_CACHE_SIZE,
+    'connect_args': {'prepared_statement_cache_size': DB_PREPARED_STATEMENT_CACHE_SIZE},
+}
+
+
+def create_engine(url: str, poolclass=InstrumentedPool) -> AsyncEngine:
+    if DB_POOL_ENABLED:
+        new_engine = create_async_engine(
+            url,
+            **cache_options,
+            poolclass=poolclass,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    else:
+        new_engine = create_async_engine(url, **cache_options, poolclass=NullPool)
+    if METRICS_ENABLED:
+        instrument_engine(new_engine)
+    return new_engine
+
+
+engine = create_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
+class Replica:
+    """Реплика БД только для чтения со своим пулом соединений."""
+
+    def __init__(self, url: str):
+        # Статистика ожидания в pool_stats относится только к основной БД.
+        self.engine = create_engine(url, poolclass=AsyncAdaptedQueuePool)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        # До первой успешной проверки чтение идет в основную БД.
+        self.healthy = False
+        self.lag = 0.0
+        self.error = None
+
+        @event.listens_for(self.engine.sync_engine, 'handle_error')
+        def _handle_error(context):
+            # Разрыв соединения снимает реплику с чтения сразу, не дожидаясь проверки.
+            if context.is_disconnect:
+                self.healthy = False
+                self.error = str(context.original_exception)
+
+
+class ReplicaSet:
+    """
+    Распределение запросов на чтение по репликам.
+
+    Реплики выбираются по кругу среди здоровых; если здоровых нет, чтение идет в основную
+    БД. Реплика считается здоровой, если она в режиме recovery и отстает не больше чем на
+    max_lag секунд. Пользователь, недавно записавший данные, на read_your_writes секунд
+    направляется в основную БД. Отметки о записи хранятся внутри процесса.
+    """
+
+    _health_query = text(
+        'SELECT pg_is_in_recovery(), '
+        'CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    )
+
+    def __init__(self, urls: list[str], max_lag: float, health_timeout: float, read_your_writes: float):
+        self.replicas = [Replica(url) for url in urls]
+        self._max_lag = max_lag
+        self._health_timeout = health_timeout
+        self._read_your_writes = read_your_writes
+        self._round_robin = itertools.count()
+        self._written_until: dict[int, float] = {}
+
+    def mark_write(self, user_id: int) -> None:
+        if not self.replicas or self._read_your_writes <= 0:
+            return
+        now = time.monotonic()
+        if len(self._written_until) > 10000:
+            self._written_until = {uid: until for uid, until in self._written_until.items() if until > now}
+        self._written_until[user_id] = now + self._read_your_writes
+
+    def choose(self, user_id: int | None = None) -> Replica | None:
+        if user_id is not None and self._written_until.get(user_id, 0) > time.monotonic():
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with asyncio.timeout(self._health_timeout):
+                async with replica.engine.connect() as conn:
+                    in_recovery, lag = (await conn.execute(self._health_query)).one()
+        except Exception as ex:
+            replica.healthy, replica.error = False, str(ex) or type(ex).__name__
+            return
+        replica.lag = float(lag)
+        replica.healthy = in_recovery and replica.lag <= self._max_lag
+        replica.error = None if in_recovery else 'not in recovery'
+
+    async def run_health_checks(self, interval: float) -> None:
+        while True:
+            await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+            await asyncio.sleep(interval)
+
+    async def dispose(self) -> None:
+        await asyncio.gather(*(replica.engine.dispose() for replica in self.replicas))
+
+    def stats(self) -> list[dict]:
+        return [
+            {'replica': r.name, 'healthy': r.healthy, 'lag_seconds': r.lag, 'error': r.error}
+            for r in self.replicas
+        ]
+
+
+replica_set = ReplicaSet(
+    DB_REPLICA_URLS, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_HEALTH_TIMEOUT, DB_READ_YOUR_WRITES_SECONDS
+)
+
+
+def read_session_maker(user_id: int | None = None) -> async_sessionmaker:
+    replica = replica_set.choose(user_id)
+    return replica.session_maker if replica is not None else async_session_maker
+
+
+def read_engine() -> AsyncEngine:
+    replica = replica_set.choose()
+    return replica.engine if replica is not None else engine
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия для маршрутов только на чтение: реплика, если есть здоровая, иначе основная БД."""
+    async with read_session_maker()() as session:
+        yield session
+
+
+async def warmup_pool() -> None:
+    """Заранее открывает DB_POOL_WARMUP соединений, чтобы первые запросы не платили за handshake."""
+    if not DB_POOL_ENABLED or DB_POOL_WARMUP <= 0:
+        return
+
+    connections = await asyncio.gather(
+        *(engine.connect().start() for _ in range(min(DB_POOL_WARMUP, DB_POOL_SIZE)))
+    )
+    await asyncio.gather(*(conn.close() for conn in connections))
+
+
+def get_pool_stats() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedPool):
+        return {'enabled': False}
+    acquired = pool_wait_stats.acquired
+    return {
+        'enabled': True,
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': DB_POOL_MAX_OVERFLOW,
+        'acquired': acquired,
+        'avg_wait_ms': pool_wait_stats.total_wait / acquired * 1000 if acquired else 0.0,
+        'max_wait_ms': pool_wait_stats.max_wait * 1000,
+    }
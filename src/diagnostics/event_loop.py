@@ -0,0 +1,125 @@
+"""
+Мониторинг задержки event loop и поиск блокирующих вызовов.
+
+Корутина-зонд каждые EVENT_LOOP_PROBE_INTERVAL секунд засыпает и замеряет, насколько
+позже запланированного она проснулась; задержка пишется в гистограмму event_loop_lag_seconds.
+Сама корутина не может увидеть, кто занял loop, поэтому отдельный поток-сторож следит за
+отметкой последнего пробуждения зонда. Если loop не отвечает дольше
+EVENT_LOOP_STALL_THRESHOLD_MS, сторож снимает стек потока loop (sys._current_frames)
+и запоминает текущую задачу asyncio - это и есть код, который блокирует loop.
+Когда зонд снова просыпается, блокировка закрывается с ее полной длительностью.
+Стек снимается только при блокировке, в остальное время сторож лишь сравнивает время.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+
+from config import EVENT_LOOP_PROBE_INTERVAL, EVENT_LOOP_STALL_THRESHOLD_MS, EVENT_LOOP_STALL_HISTORY
+from metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+STACK_LIMIT = 40
+
+
+class EventLoopMonitor:
+    """Зонд задержки event loop и поток-сторож, снимающий стек при блокировке."""
+
+    def __init__(self, interval: float, threshold: float, history: int):
+        self._interval = interval
+        self._threshold = threshold
+        self._stalls = deque(maxlen=history)
+        self._stall: dict | None = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._probe_task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._beat = time.monotonic()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls_total = 0
+
+    def start(self) -> None:
+        """Запускает зонд и сторож; вызывается из потока event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._probe_task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name='event-loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+        self._probe_task = self._watchdog = None
+
+    async def _probe(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, time.perf_counter() - start - self._interval)
+            self._beat = time.monotonic()
+            EVENT_LOOP_LAG.observe(lag)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            with self._lock:
+                stall, self._stall = self._stall, None
+            if stall is not None:
+                stall['duration_seconds'] = round(lag, 4)
+                self._stalls.appendleft(stall)
+
+    def _watch(self) -> None:
+        # Проверяем вдвое чаще порога, чтобы стек снимался, пока loop еще заблокирован.
+        while not self._stopped.wait(self._threshold / 2):
+            blocked = time.monotonic() - self._beat - self._interval
+            if blocked < self._threshold:
+                continue
+            with self._lock:
+                if self._stall is not None:
+                    continue
+                self._stall = self._capture(blocked)
+            self.stalls_total += 1
+            EVENT_LOOP_STALLS.inc()
+
+    def _capture(self, blocked: float) -> dict:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT) if frame is not None else []
+        # Чтение текущей задачи из другого потока не меняет состояние loop.
+        task = asyncio.current_task(self._loop)
+        return {
+            'started_at': datetime.fromtimestamp(time.time() - blocked, timezone.utc).isoformat(),
+            'duration_seconds': None,
+            'task': task.get_name() if task is not None else None,
+            'coroutine': task.get_coro().__qualname__ if task is not None else None,
+            'stack': [line.rstrip() for line in stack],
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            current = self._stall
+        return {
+            'running': self._probe_task is not None and not self._probe_task.done(),
+            'probe_interval_seconds': self._interval,
+            'stall_threshold_seconds': self._threshold,
+            'last_lag_seconds': self.last_lag,
+            'max_lag_seconds': self.max_lag,
+            'stalls_total': self.stalls_total,
+            'current_stall': current,
+            'recent_stalls': list(self._stalls),
+        }
+
+
+event_loop_monitor = EventLoopMonitor(
+    EVENT_LOOP_PROBE_INTERVAL,
+    EVENT_LOOP_STALL_THRESHOLD_MS / 1000,
+    EVENT_LOOP_STALL_HISTORY,
+)
@@ -0,0 +1,86 @@
+"""
+Проверка планов горячих запросов.
+
+Выполняет EXPLAIN для каждого запроса роутеров на локальной БД с тестовыми данными
+и завершается с кодом 1, если хотя бы один из них использует Seq Scan.
+Последовательное сканирование запрещается через enable_seqscan = off, поэтому на
+маленькой тестовой БД Seq Scan в плане означает, что подходящего индекса нет.
+
+Запуск из каталога src:
+    python -m diagnostics.query_plans
+"""
+import asyncio
+import json
+import sys
+
+from sqlalchemy import text
+
+from account.models import account
+from account.queries import (
+    select_user_accounts, select_accounts_version, select_user_summaries, select_user_daily_summaries,
+)
+from database import engine
+from pagination import page_query
+from transactions.models import transaction
+from transactions.queries import (
+    select_user_transactions, select_transaction_id, select_existing_transaction_ids,
+    select_queued_payment, claim_pending_payments, select_queue_depth,
+)
+from transactions.utils import apply_payment
+from user.models import user
+from user.queries import select_user_by_email, select_user_by_id
+
+HOT_QUERIES = {
+    'user.get_user': select_user_by_email.params(email='admin@example.com'),
+    'user.user_info': select_user_by_id.params(user_id=1),
+    'user.get_all_users': page_query(user, 'id', True).params(limit=100, after=1),
+    'account.my_account_info': select_user_accounts.params(user_id=1),
+    'account.balance_etag': select_accounts_version.params(user_id=1),
+    'account.summary': select_user_summaries.params(user_id=1),
+    'account.daily_summary': select_user_daily_summaries.params(user_id=1, days=30),
+    'account.get_all_accounts': page_query(account, 'id', True).params(limit=100, after=1),
+    'transaction.transactions_info': select_user_transactions.params(user_id=1, from_time=None, to_time=None),
+    'transaction.get_all_transactions': page_query(transaction, 'transaction_id', True).params(limit=100, after=''),
+    'transaction.duplicate_lookup': select_transaction_id.params(transaction_id='plan-check'),
+    'transaction.existing_ids': select_existing_transaction_ids.params(transaction_ids=['plan-check']),
+    'transaction.queue_status': select_queued_payment.params(transaction_id='plan-check'),
+    'transaction.queue_claim': claim_pending_payments.params(limit=500),
+    'transaction.queue_depth': select_queue_depth,
+    'transaction.make_transaction': apply_payment.params(
+        transaction_id='plan-check', user_id=1, account_id=1, amount=0.0, signature=''
+    ),
+}
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan['Node Type'] == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def main() -> int:
+    failed = False
+    async with engine.connect() as conn:
+        await conn.execute(text('SET enable_seqscan = off'))
+        for name, query in HOT_QUERIES.items():
+            sql = query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+            result = await conn.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'))
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            seq_scans = find_seq_scans(plan[0]['Plan'])
+            if seq_scans:
+                failed = True
+                print(f'FAIL {name}: Seq Scan on {", ".join(seq_scans)}')
+            else:
+                print(f'ok   {name}')
+        await conn.rollback()
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
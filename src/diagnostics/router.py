@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Depends
+
+from admission import admission_controller
+from database import get_pool_stats, replica_set
+from singleflight import singleflight
+from diagnostics.event_loop import event_loop_monitor
+from account.events import account_event_hub
+from transactions.router import seen_transactions
+from transactions.queue import payment_queue_workers
+from user.schemas import User
+from user.utils import verify_admin
+
+router = APIRouter(
+    prefix='/diagnostics',
+    tags=['Diagnostics']
+)
+
+
+@router.get('/admin/pool_stats')
+async def pool_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает текущее состояние пула соединений с БД.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'pool', содержащим размер пула, число занятых и свободных
+        соединений, а также среднее и максимальное время ожидания соединения
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'pool': get_pool_stats()}
+
+
+@router.get('/admin/replica_stats')
+async def replica_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает состояние реплик БД, на которые направляются запросы на чтение.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'replicas', содержащим для каждой реплики ее адрес (без пароля),
+        признак исправности, отставание в секундах и последнюю ошибку проверки
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'replicas': replica_set.stats()}
+
+
+@router.get('/admin/transaction_filter_stats')
+async def transaction_filter_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает статистику фильтра уже обработанных transaction_id.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'transaction_filter', содержащим число проверок, долю попаданий
+        в LRU недавних ID и долю ложноположительных ответов фильтра Блума
+        (None, если фильтр выключен)
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'transaction_filter': seen_transactions.stats() if seen_transactions is not None else None}
+
+
+@router.get('/admin/payment_queue_stats')
+async def payment_queue_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает состояние очереди платежей.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'payment_queue', содержащим число ожидающих платежей, возраст
+        самого старого из них и число платежей, обработанных воркерами этого процесса, по статусам
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'payment_queue': await payment_queue_workers.stats()}
+
+
+@router.get('/admin/event_loop')
+async def event_loop_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает задержку event loop этого процесса и последние блокировки loop.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'event_loop', содержащим последнюю и максимальную задержку,
+        число блокировок дольше порога и для последних из них время начала, длительность,
+        задачу asyncio и стек потока event loop в момент блокировки
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'event_loop': event_loop_monitor.stats()}
+
+
+@router.get('/admin/account_events')
+async def account_events_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает состояние рассылки событий /account/events в этом процессе.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'account_events', содержащим признак подключения LISTEN,
+        число подписчиков, число полученных уведомлений и число событий, отброшенных
+        из-за переполнения очередей медленных подписчиков
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'account_events': account_event_hub.stats()}
+
+
+@router.get('/admin/admission')
+async def admission_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает состояние контроля допуска запросов в этом процессе.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'admission', содержащим число выполняемых запросов, лимиты
+        и число ожидающих и допущенных запросов по классам приоритета
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'admission': admission_controller.stats()}
+
+
+@router.get('/admin/singleflight')
+async def singleflight_stats(
+        _: User = Depends(verify_admin),
+):
+    """
+    Возвращает статистику объединения одинаковых запросов на чтение в этом процессе.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'singleflight', содержащим число выполненных, объединенных
+        и отданных из кэша запросов, а также размер кэша
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return {'singleflight': singleflight.stats()}
@@ -1,16 +1,91 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
+from config import (
+    SERVER_MODE, WEB_CONCURRENCY, SHUTDOWN_TIMEOUT, PAYMENT_QUEUE_ENABLED, DB_REPLICA_HEALTH_INTERVAL,
+    EVENT_LOOP_MONITOR_ENABLED, ACCOUNT_EVENTS_ENABLED, ADMISSION_ENABLED, METRICS_ENABLED,
+)
+from database import engine, replica_set, warmup_pool
+from metrics import MetricsMiddleware, mark_process_dead, metrics_endpoint
+from admission import AdmissionMiddleware, admission_controller
 from user.router import router as auth_router
 from account.router import router as account_router
-from transactions.router import router as transaction_router
+from transactions.router import router as transaction_router, payment_coalescer, seen_transactions
+from transactions.queue import payment_queue_workers
+from diagnostics.router import router as diagnostics_router
+from diagnostics.event_loop import event_loop_monitor
+from account.events import account_event_hub
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if EVENT_LOOP_MONITOR_ENABLED:
+        event_loop_monitor.start()
+    await warmup_pool()
+    # Фильтр прогревается в фоне: до окончания загрузки дубликаты все равно ловит первичный ключ.
+    warmup = asyncio.create_task(seen_transactions.warmup()) if seen_transactions is not None else None
+    if PAYMENT_QUEUE_ENABLED:
+        payment_queue_workers.start()
+    if ACCOUNT_EVENTS_ENABLED:
+        account_event_hub.start()
+    health_checks = asyncio.create_task(
+        replica_set.run_health_checks(DB_REPLICA_HEALTH_INTERVAL)
+    ) if replica_set.replicas else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    if health_checks is not None:
+        health_checks.cancel()
+    await account_event_hub.stop()
+    await payment_queue_workers.stop()
+    await payment_coalescer.close()
+    await replica_set.dispose()
+    await engine.dispose()
+    await event_loop_monitor.stop()
+    mark_process_dead()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# Middleware, добавленный последним, выполняется первым: метрики учитывают и отклоненные запросы.
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route('/metrics', metrics_endpoint, include_in_schema=False)
 
 app.include_router(auth_router)
 app.include_router(account_router)
 app.include_router(transaction_router)
+app.include_router(diagnostics_router)
 
 if __name__ == '__main__':
-    uvicorn.run('main:app', host='0.0.0.0', port=8080, reload=True)
+    if SERVER_MODE == 'production':
+        # Метрики воркеров собираются через общий каталог prometheus_client. Созданный здесь
+        # каталог удаляется после остановки; заданный извне остается на совести того, кто его задал.
+        # Один воркер uvicorn запускает в этом же процессе, где prometheus_client уже импортирован
+        # без каталога, поэтому каталог нужен только нескольким воркерам.
+        metrics_dir = None
+        if METRICS_ENABLED and WEB_CONCURRENCY > 1 and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+            metrics_dir = tempfile.mkdtemp(prefix='prometheus-')
+            os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+        try:
+            uvicorn.run(
+                'main:app',
+                host='0.0.0.0',
+                port=8080,
+                workers=WEB_CONCURRENCY,
+                loop='uvloop',
+                http='httptools',
+                timeout_graceful_shutdown=SHUTDOWN_TIMEOUT,
+            )
+        finally:
+            if metrics_dir is not None:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+    else:
+        uvicorn.run('main:app', host='0.0.0.0', port=8080, reload=True)
@@ -0,0 +1,161 @@
+import os
+import re
+import time
+from functools import lru_cache
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки HTTP запроса',
+    ['method', 'route', 'status'],
+)
+DB_STATEMENT_LATENCY = Histogram(
+    'db_statement_duration_seconds',
+    'Время выполнения SQL запроса',
+    ['operation', 'table'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5),
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_wait_seconds',
+    'Время ожидания соединения из пула',
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5),
+)
+DB_COMPILED_CACHE = Counter(
+    'db_compiled_cache_total',
+    'Обращения к кэшу скомпилированных запросов SQLAlchemy',
+    ['result'],
+)
+DB_PREPARED_CACHE = Counter(
+    'db_prepared_statement_cache_total',
+    'Обращения к кэшу подготовленных запросов asyncpg на соединении',
+    ['result'],
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_duration_seconds',
+    'Время выполнения bcrypt',
+    ['operation'],
+)
+SIGNATURE_VERIFY_LATENCY = Histogram(
+    'signature_verify_duration_seconds',
+    'Время проверки подписи транзакции',
+    buckets=(.000005, .00001, .000025, .00005, .0001, .00025, .001),
+)
+
+PAYMENT_QUEUE_DEPTH = Gauge(
+    'payment_queue_depth',
+    'Число платежей в очереди, ожидающих применения',
+    multiprocess_mode='max',
+)
+PAYMENT_QUEUE_LAG = Gauge(
+    'payment_queue_lag_seconds',
+    'Возраст самого старого непримененного платежа в очереди',
+    multiprocess_mode='max',
+)
+PAYMENT_QUEUE_PROCESSED = Counter(
+    'payment_queue_processed_total',
+    'Платежи, обработанные воркерами очереди',
+    ['status'],
+)
+PAYMENT_QUEUE_BATCH_LATENCY = Histogram(
+    'payment_queue_batch_duration_seconds',
+    'Время применения пакета платежей из очереди',
+)
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total',
+    'Запросы, отклоненные контролем допуска',
+    ['priority_class', 'reason'],
+)
+ADMISSION_WAIT = Histogram(
+    'admission_wait_seconds',
+    'Время ожидания места для выполнения запроса',
+    ['priority_class'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Задержка срабатывания таймера event loop относительно запланированного времени',
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5),
+)
+EVENT_LOOP_STALLS = Counter(
+    'event_loop_stalls_total',
+    'Блокировки event loop дольше EVENT_LOOP_STALL_THRESHOLD_MS',
+)
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(statement: str) -> tuple[str, str]:
+    """Метки (операция, таблица) для SQL запроса, чтобы число временных рядов не росло."""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    match = _TABLE_PATTERN.search(statement)
+    return operation, match.group(1) if match else ''
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Замеряет время каждого запроса через события SQLAlchemy."""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        DB_COMPILED_CACHE.labels('hit' if context.cache_hit is CACHE_HIT else 'miss').inc()
+        prepared = getattr(getattr(cursor, '_adapt_connection', None), '_prepared_statement_cache', None)
+        if prepared is not None:
+            DB_PREPARED_CACHE.labels('hit' if statement in prepared else 'miss').inc()
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        DB_STATEMENT_LATENCY.labels(*statement_labels(statement)).observe(
+            time.perf_counter() - context._metrics_start
+        )
+
+
+class MetricsMiddleware:
+    """ASGI middleware, замеряющий время запросов по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            REQUEST_LATENCY.labels(
+                scope['method'],
+                getattr(route, 'path', 'unmatched'),
+                status,
+            ).observe(time.perf_counter() - start)
+
+
+def mark_process_dead() -> None:
+    """Удаляет live-метрики завершающегося процесса из каталога PROMETHEUS_MULTIPROC_DIR."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+async def metrics_endpoint(_: Request) -> Response:
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
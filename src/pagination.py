@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import AsyncIterator
+
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Column, Integer, Table, bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import read_engine
+
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+STREAM_CHUNK_ROWS = 1000
+
+
+@lru_cache(maxsize=None)
+def page_query(table: Table, key_name: str, with_after: bool):
+    key = table.c[key_name]
+    query = select(table).order_by(key).limit(bindparam('limit', type_=Integer))
+    if with_after:
+        query = query.where(key > bindparam('after'))
+    return query
+
+
+async def keyset_page(
+        session: AsyncSession,
+        table: Table,
+        key: Column,
+        limit: int,
+        after=None,
+) -> tuple[list, object]:
+    """
+    Возвращает страницу строк таблицы, упорядоченных по ключу key, начиная после after.
+
+    Returns:
+        tuple: список строк (Row) и значение ключа для запроса следующей страницы
+        (None, если страница последняя).
+    """
+    query = page_query(table, key.name, after is not None)
+    result = await session.execute(query, {'limit': limit, 'after': after})
+    rows = result.all()
+    next_after = getattr(rows[-1], key.name) if len(rows) == limit else None
+    return rows, next_after
+
+
+async def _ndjson_rows(table: Table, key: Column) -> AsyncIterator[bytes]:
+    query = select(table).order_by(key).execution_options(yield_per=STREAM_CHUNK_ROWS)
+    async with read_engine().connect() as conn:
+        result = await conn.stream(query)
+        # Имена колонок - quoted_name (подкласс str), а orjson принимает ключами только str.
+        keys = [str(key) for key in result.keys()]
+        async for partition in result.partitions():
+            yield b''.join(orjson.dumps(dict(zip(keys, r))) + b'\n' for r in partition)
+
+
+def ndjson_response(table: Table, key: Column) -> StreamingResponse:
+    """Отдает всю таблицу в формате NDJSON через серверный курсор, не загружая ее в память."""
+    return StreamingResponse(_ndjson_rows(table, key), media_type='application/x-ndjson')
@@ -0,0 +1,115 @@
+"""
+Объединение одинаковых одновременных запросов на чтение (single-flight).
+
+Пока запрос с ключом выполняется, такие же запросы не идут в БД, а ждут его результат:
+выполняется одна выборка и одна сериализация ответа, все ждущие получают те же байты.
+Выборка запускается отдельной задачей со своей сессией, поэтому отключение клиента,
+начавшего ее, не обрывает ответ остальным. С SINGLEFLIGHT_CACHE_TTL > 0 готовый ответ
+еще столько секунд отдается из памяти процесса.
+
+Ключи объединены в пространства имен (accounts, users); запись в процессе вызывает
+invalidate, которая удаляет кэш пространства и не дает сохранить в кэш результаты выборок,
+начатых до записи. Уже выполняющиеся выборки не прерываются: присоединившиеся к ним
+запросы получают данные не старше длительности одной выборки. Другие процессы о записи
+не знают, поэтому у них кэш живет до истечения TTL.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from fastapi import Response
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SINGLEFLIGHT_CACHE_TTL, SINGLEFLIGHT_CACHE_SIZE
+from database import read_session_maker
+
+
+class SingleFlight:
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        self._cache: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self.executed = 0
+        self.shared = 0
+        self.cached = 0
+
+    async def do(self, namespace: str, key: Hashable, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Возвращает результат fetch для ключа, выполняя не больше одного fetch одновременно.
+
+        Raises:
+            Exception: то же исключение, что и fetch, у всех ждущих его запросов
+        """
+        full_key = (namespace, key)
+        entry = self._cache.get(full_key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.cached += 1
+                return entry[1]
+            del self._cache[full_key]
+
+        task = self._inflight.get(full_key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.executed += 1
+            # Поколение фиксируется здесь, а не в задаче: запись до ее первого шага тоже учитывается.
+            generation = self._generations.get(namespace, 0)
+            task = asyncio.create_task(self._run(namespace, full_key, fetch, generation))
+            self._inflight[full_key] = task
+        # shield: отмена одного ждущего (отключение клиента) не отменяет выборку для остальных.
+        return await asyncio.shield(task)
+
+    async def _run(
+            self, namespace: str, full_key: tuple, fetch: Callable[[], Awaitable[bytes]], generation: int
+    ) -> bytes:
+        try:
+            body = await fetch()
+        finally:
+            del self._inflight[full_key]
+        if self._ttl > 0 and self._generations.get(namespace, 0) == generation:
+            self._cache[full_key] = (time.monotonic() + self._ttl, body)
+            if len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    def invalidate(self, *namespaces: str) -> None:
+        for namespace in namespaces:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for full_key in [key for key in self._cache if key[0] == namespace]:
+                del self._cache[full_key]
+
+    def stats(self) -> dict:
+        return {
+            'ttl_seconds': self._ttl,
+            'inflight': len(self._inflight),
+            'cached_entries': len(self._cache),
+            'executed': self.executed,
+            'shared': self.shared,
+            'cache_hits': self.cached,
+        }
+
+
+singleflight = SingleFlight(SINGLEFLIGHT_CACHE_TTL, SINGLEFLIGHT_CACHE_SIZE)
+
+
+async def coalesced_response(
+        namespace: str,
+        key: Hashable,
+        model: type[BaseModel],
+        query: Callable[[AsyncSession], Awaitable[dict]],
+) -> Response:
+    """
+    JSON-ответ модели model по результату query, общий для одинаковых одновременных запросов.
+    query выполняется в собственной сессии чтения, а не в сессии запроса.
+    """
+    async def fetch() -> bytes:
+        async with read_session_maker()() as session:
+            result = await query(session)
+        return model.model_validate(result).model_dump_json().encode()
+
+    return Response(await singleflight.do(namespace, key, fetch), media_type='application/json')
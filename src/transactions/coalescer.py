@@ -0,0 +1,111 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from database import async_session_maker
+from transactions.schemas import Payment
+from transactions.utils import apply_payments
+
+
+class PaymentCoalescer:
+    """
+    Group commit платежей по счету.
+
+    Одновременные платежи на один account_id собираются в очередь и применяются
+    одним запросом (одно обновление баланса и многострочная вставка транзакций)
+    в одной транзакции БД. Очередь сбрасывается, когда в ней max_batch платежей
+    или когда с момента первого платежа прошло max_linger секунд.
+    """
+
+    def __init__(self, max_batch: int, max_linger: float):
+        self._max_batch = max_batch
+        self._max_linger = max_linger
+        self._queues: dict[int, list[tuple[Payment, asyncio.Future]]] = {}
+        self._full: dict[int, asyncio.Event] = {}
+        self._drainers: dict[int, asyncio.Task] = {}
+
+    async def submit(self, payment: Payment) -> float:
+        """
+        Ставит платеж в очередь его счета и ждет применения.
+
+        Returns:
+            float: баланс счета сразу после применения этого платежа
+
+        Raises:
+            HTTPException: 400 - При повторной обработке транзакции или если счет
+                принадлежит другому пользователю
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(payment.account_id, [])
+        queue.append((payment, future))
+        full = self._full.setdefault(payment.account_id, asyncio.Event())
+        if len(queue) >= self._max_batch:
+            full.set()
+        if payment.account_id not in self._drainers:
+            self._drainers[payment.account_id] = asyncio.create_task(self._drain(payment.account_id))
+        return await future
+
+    async def close(self) -> None:
+        """Дожидается применения всех уже поставленных в очередь платежей."""
+        await asyncio.gather(*self._drainers.values(), return_exceptions=True)
+
+    async def _drain(self, account_id: int) -> None:
+        queue = self._queues[account_id]
+        full = self._full[account_id]
+        try:
+            while queue:
+                if len(queue) < self._max_batch:
+                    try:
+                        await asyncio.wait_for(full.wait(), self._max_linger)
+                    except asyncio.TimeoutError:
+                        pass
+                batch = queue[:self._max_batch]
+                del queue[:self._max_batch]
+                full.clear()
+                if len(queue) >= self._max_batch:
+                    full.set()
+                await self._apply(batch)
+        finally:
+            del self._drainers[account_id]
+            del self._queues[account_id]
+            del self._full[account_id]
+
+    async def _apply(self, batch: list[tuple[Payment, asyncio.Future]]) -> None:
+        # Владельца счета определяет запрос применения по данным БД, поэтому платеж другого
+        # пользователя, пришедший первым, не отклоняет платежи владельца.
+        unique = {}
+        for payment, _ in batch:
+            unique.setdefault(payment.transaction_id, payment)
+
+        try:
+            async with async_session_maker() as session:
+                applied, existing_ids = await apply_payments(session, list(unique.values()))
+                await session.commit()
+        except Exception as ex:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(ex)
+            return
+
+        # Баланс после каждого платежа: итоговый баланс минус платежи, примененные после него.
+        balance_after = {}
+        running = None
+        for payment in reversed(list(unique.values())):
+            if payment.transaction_id not in applied:
+                continue
+            if running is None:
+                running = applied[payment.transaction_id]
+            balance_after[payment.transaction_id] = running
+            running -= payment.amount
+
+        resolved = set()
+        for payment, future in batch:
+            if future.done():
+                continue
+            if payment.transaction_id in balance_after and payment.transaction_id not in resolved:
+                resolved.add(payment.transaction_id)
+                future.set_result(balance_after[payment.transaction_id])
+            elif payment.transaction_id in existing_ids or payment.transaction_id in resolved:
+                future.set_exception(HTTPException(status_code=400, detail="Transaction already processed"))
+            else:
+                future.set_exception(HTTPException(status_code=400, detail="Account belongs to another user"))
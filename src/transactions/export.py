@@ -0,0 +1,181 @@
+"""
+Выгрузка таблицы transaction через COPY ... TO STDOUT.
+
+Строки не проходят через SQLAlchemy: asyncpg передает куски вывода COPY в ограниченную
+очередь, из которой они сразу отдаются клиенту, поэтому память не зависит от размера
+таблицы, а медленный клиент через очередь притормаживает чтение из БД. Для Parquet куски
+CSV собираются в группы строк по PARQUET_ROW_GROUP_BYTES, разбираются pyarrow в потоке
+и дописываются в файл по мере готовности. pyarrow - необязательная зависимость.
+
+Запуск из каталога src:
+    python -m transactions.export --format parquet --user-id 1 --output transactions.parquet
+"""
+import argparse
+import asyncio
+import contextlib
+import sys
+from typing import AsyncIterator
+
+from sqlalchemy import DateTime, Double, Integer, Select, select
+
+from database import engine, read_engine
+from transactions.models import transaction
+from transactions.schemas import ExportFormat
+
+COPY_QUEUE_CHUNKS = 16
+PARQUET_ROW_GROUP_BYTES = 8 * 1024 * 1024
+
+MEDIA_TYPES = {
+    ExportFormat.csv: 'text/csv',
+    ExportFormat.parquet: 'application/vnd.apache.parquet',
+}
+
+
+def export_query(user_id: int | None = None, account_id: int | None = None) -> Select:
+    query = select(transaction)
+    if user_id is not None:
+        query = query.where(transaction.c.user_id == user_id)
+    if account_id is not None:
+        query = query.where(transaction.c.account_id == account_id)
+    return query
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def copy_chunks(query: Select, header: bool = True) -> AsyncIterator[bytes]:
+    """Отдает вывод COPY (query) TO STDOUT в формате CSV кусками по мере чтения из БД."""
+    compiled = query.compile(dialect=engine.dialect)
+    args = [compiled.params[name] for name in compiled.positiontup]
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=COPY_QUEUE_CHUNKS)
+
+    async with read_engine().connect() as conn:
+        raw = await conn.get_raw_connection()
+
+        async def produce():
+            try:
+                await raw.driver_connection.copy_from_query(
+                    str(compiled), *args, output=chunks.put, format='csv', header=header
+                )
+            finally:
+                await chunks.put(None)
+
+        copy = asyncio.create_task(produce())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            await copy
+        finally:
+            copy.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await copy
+
+
+class _ChunkSink:
+    """Файлоподобный объект для ParquetWriter, из которого можно забирать записанные байты."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _record_boundary(buffer: bytearray) -> int:
+    """Позиция после последней полной CSV-записи (перевод строки вне кавычек)."""
+    cut = buffer.rfind(b'\n')
+    while cut >= 0 and buffer.count(b'"', 0, cut) % 2:
+        cut = buffer.rfind(b'\n', 0, cut)
+    return cut + 1
+
+
+async def parquet_chunks(query: Select) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    from pyarrow import csv, parquet
+
+    arrow_types = {Integer: pa.int32(), Double: pa.float64(), DateTime: pa.timestamp('us', tz='UTC')}
+    schema = pa.schema([
+        (c.name, next((t for sa_type, t in arrow_types.items() if isinstance(c.type, sa_type)), pa.string()))
+        for c in query.selected_columns
+    ])
+    read_options = csv.ReadOptions(column_names=schema.names)
+    parse_options = csv.ParseOptions(newlines_in_values=True)
+    convert_options = csv.ConvertOptions(
+        column_types=schema, null_values=[''], quoted_strings_can_be_null=False
+    )
+
+    sink = _ChunkSink()
+    writer = parquet.ParquetWriter(sink, schema)
+
+    def write_row_group(data: bytes) -> None:
+        table = csv.read_csv(pa.BufferReader(data), read_options, parse_options, convert_options)
+        writer.write_table(table)
+
+    buffer = bytearray()
+    async for chunk in copy_chunks(query, header=False):
+        buffer += chunk
+        if len(buffer) < PARQUET_ROW_GROUP_BYTES:
+            continue
+        cut = _record_boundary(buffer)
+        if not cut:
+            continue
+        await asyncio.to_thread(write_row_group, bytes(buffer[:cut]))
+        del buffer[:cut]
+        yield sink.drain()
+    if buffer:
+        await asyncio.to_thread(write_row_group, bytes(buffer))
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(query: Select, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    if export_format is ExportFormat.parquet:
+        return parquet_chunks(query)
+    return copy_chunks(query)
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Выгрузка таблицы transaction')
+    parser.add_argument('--format', type=ExportFormat, default=ExportFormat.csv, choices=list(ExportFormat))
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--account-id', type=int)
+    parser.add_argument('--output', help='путь к файлу (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    if args.format is ExportFormat.parquet and not parquet_available():
+        print('Parquet export requires pyarrow', file=sys.stderr)
+        return 1
+
+    query = export_query(args.user_id, args.account_id)
+    with open(args.output, 'wb') if args.output else contextlib.nullcontext(sys.stdout.buffer) as output:
+        async for chunk in export_chunks(query, args.format):
+            output.write(chunk)
+    await engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -1,10 +1,25 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Double, ForeignKey
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, BigInteger, String, Double, DateTime, ForeignKey, Index, func, text,
+)
+from sqlalchemy.types import UserDefinedType
 
 from account.models import account
 from user.models import user
 
 transaction_metadata = MetaData()
 
+
+class XID8(UserDefinedType):
+    """64-битный ID транзакции Postgres (xid8, PostgreSQL 13+)."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "xid8"
+
+
+# Секционирована по месяцам created_at (секции создает python -m transactions.partitions),
+# поэтому первичный ключ включает created_at, а уникальность transaction_id обеспечивает transaction_key.
 transaction = Table(
     "transaction",
     transaction_metadata,
@@ -13,4 +28,73 @@ transaction = Table(
     Column("account_id", Integer, ForeignKey(account.c.id)),
     Column("amount", Double, nullable=False),
     Column("signature", String, nullable=False),
-)
\ No newline at end of file
+    # ID транзакции БД, вставившей строку: по нему сверка находит строки после прошлой контрольной точки.
+    Column("txid", XID8, server_default=text("pg_current_xact_id()")),
+    Column("created_at", DateTime(timezone=True), primary_key=True, server_default=func.now()),
+    Index(
+        "ix_transaction_user_id_created_at", "user_id", "created_at",
+        postgresql_include=["transaction_id", "account_id", "amount", "signature"],
+    ),
+    Index("ix_transaction_account_id", "account_id", postgresql_include=["user_id", "amount", "txid", "created_at"]),
+    Index("ix_transaction_txid", "txid"),
+    Index("ix_transaction_created_at", "created_at", postgresql_using="brin"),
+    postgresql_partition_by="RANGE (created_at)",
+)
+
+# Все когда-либо принятые transaction_id, включая архивированные секции.
+transaction_key = Table(
+    "transaction_key",
+    transaction_metadata,
+    Column("transaction_id", String, primary_key=True),
+    Column("user_id", Integer),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# Итоги транзакций из отсоединенных и архивированных секций по счетам.
+archived_transaction_totals = Table(
+    "archived_transaction_totals",
+    transaction_metadata,
+    Column("account_id", Integer, primary_key=True),
+    Column("total", Double, nullable=False, server_default="0"),
+    Column("inflow", Double, nullable=False, server_default="0"),
+    Column("outflow", Double, nullable=False, server_default="0"),
+    Column("transaction_count", BigInteger, nullable=False, server_default="0"),
+)
+
+# Очередь принятых, но еще не примененных платежей (режим accept-and-enqueue).
+payment_queue = Table(
+    "payment_queue",
+    transaction_metadata,
+    Column("transaction_id", String, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("account_id", Integer, nullable=False),
+    Column("amount", Double, nullable=False),
+    Column("signature", String, nullable=False),
+    Column("status", String, nullable=False, server_default="pending"),
+    Column("new_balance", Double),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+    Column("enqueued_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("processed_at", DateTime(timezone=True)),
+    Index("ix_payment_queue_pending", "enqueued_at", postgresql_where=text("status = 'pending'")),
+    Index("ix_payment_queue_processed_at", "processed_at"),
+)
+
+# Свернутые сверкой суммы транзакций по счетам и найденное расхождение с account.amount.
+reconciliation_checkpoint = Table(
+    "reconciliation_checkpoint",
+    transaction_metadata,
+    Column("account_id", Integer, primary_key=True),
+    Column("ledger_total", Double, nullable=False, server_default="0"),
+    Column("transaction_count", BigInteger, nullable=False, server_default="0"),
+    Column("drift", Double, nullable=False, server_default="0"),
+    Column("checked_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# Единственная строка: все транзакции БД с ID меньше horizon уже свернуты в контрольные точки.
+reconciliation_state = Table(
+    "reconciliation_state",
+    transaction_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("horizon", XID8, nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
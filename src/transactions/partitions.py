@@ -0,0 +1,199 @@
+"""
+Обслуживание месячных секций таблицы transaction.
+
+create заранее создает секции на текущий и следующие месяцы. Строки, для которых
+секции нет, попадают в transaction_default; секцию на месяц, строки которого уже
+лежат в transaction_default, создать нельзя, поэтому create стоит запускать по
+расписанию с запасом в несколько месяцев. Транзакции, созданные до секционирования,
+лежат в transaction_default с created_at = 1970-01-01 00:00 UTC: их время неизвестно.
+
+archive отсоединяет секции старше --older-than-months месяцев и выгружает их в CSV.
+В той же транзакции БД итоги секции по счетам добавляются в archived_transaction_totals,
+а еще не свернутые сверкой строки - в reconciliation_checkpoint, поэтому сверка и
+пересчет итогов счетов дают те же суммы и после удаления секции (--drop).
+Повторные платежи с архивированными transaction_id по-прежнему отклоняются:
+ID остаются в transaction_key.
+
+Запуск из каталога src:
+    python -m transactions.partitions create --months-ahead 3
+    python -m transactions.partitions archive --older-than-months 12 --output-dir /backup --drop
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+
+from database import async_session_maker, engine
+from transactions.models import archived_transaction_totals, reconciliation_checkpoint, reconciliation_state
+from transactions.reconciliation import state_horizon
+
+PARTITION_NAME = re.compile(r'^transaction_y(\d{4})m(\d{2})$')
+
+select_partitions = text(
+    """
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = 'transaction'::regclass
+    ORDER BY child.relname
+    """
+)
+lock_state = select(reconciliation_state.c.id).where(reconciliation_state.c.id == 1).with_for_update()
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'transaction_y{month.year:04d}m{month.month:02d}'
+
+
+def current_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+async def create_partitions(months_ahead: int) -> list[str]:
+    """
+    Returns:
+        list: имена секций с текущего месяца на months_ahead месяцев вперед
+    """
+    names = []
+    async with async_session_maker() as session:
+        for offset in range(months_ahead + 1):
+            month = add_months(current_month(), offset)
+            name = partition_name(month)
+            await session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transaction "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+            ))
+            names.append(name)
+        await session.commit()
+    return names
+
+
+def _partition_totals(name: str):
+    part = table(name, column('account_id'), column('amount'), column('txid'))
+    amount = part.c.amount
+    return part, (
+        select(
+            part.c.account_id,
+            func.sum(amount).label('total'),
+            func.coalesce(func.sum(amount).filter(amount > 0), 0).label('inflow'),
+            func.coalesce(func.sum(amount).filter(amount < 0), 0).label('outflow'),
+            func.count().label('transaction_count'),
+        )
+        .where(part.c.account_id.is_not(None))
+        .group_by(part.c.account_id)
+    )
+
+
+def add_archived_totals(name: str):
+    _, totals = _partition_totals(name)
+    archived = archived_transaction_totals
+    statement = insert(archived).from_select(
+        ['account_id', 'total', 'inflow', 'outflow', 'transaction_count'], totals
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[archived.c.account_id],
+        set_={
+            key: archived.c[key] + statement.excluded[key]
+            for key in ('total', 'inflow', 'outflow', 'transaction_count')
+        },
+    )
+
+
+def fold_unreconciled(name: str):
+    """Строки секции, которые сверка еще не свернула, добавляются в контрольные точки напрямую."""
+    part, totals = _partition_totals(name)
+    totals = totals.where(part.c.txid >= state_horizon).subquery('totals')
+    checkpoint = reconciliation_checkpoint
+    statement = insert(checkpoint).from_select(
+        ['account_id', 'ledger_total', 'transaction_count'],
+        select(totals.c.account_id, totals.c.total, totals.c.transaction_count),
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[checkpoint.c.account_id],
+        set_={
+            'ledger_total': checkpoint.c.ledger_total + statement.excluded.ledger_total,
+            'transaction_count': checkpoint.c.transaction_count + statement.excluded.transaction_count,
+        },
+    )
+
+
+async def archive_partition(name: str, output_dir: str, drop: bool) -> str:
+    """
+    Отсоединяет секцию и выгружает ее в output_dir/<name>.csv.
+
+    Returns:
+        str: путь к файлу выгрузки
+    """
+    path = os.path.join(output_dir, f'{name}.csv')
+    async with async_session_maker() as session:
+        # Сверка не должна работать одновременно: иначе она свернет строки секции второй раз.
+        await session.execute(lock_state)
+        await session.execute(text(f'ALTER TABLE transaction DETACH PARTITION {name}'))
+        await session.execute(add_archived_totals(name))
+        await session.execute(fold_unreconciled(name))
+        conn = await session.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_from_table(name, output=path, format='csv', header=True)
+        await session.commit()
+
+    if drop:
+        async with async_session_maker() as session:
+            await session.execute(text(f'DROP TABLE {name}'))
+            await session.commit()
+    return path
+
+
+async def archive_partitions(older_than_months: int, output_dir: str, drop: bool) -> list[str]:
+    """
+    Returns:
+        list: пути к файлам выгрузки архивированных секций
+    """
+    cutoff = add_months(current_month(), -older_than_months)
+    async with async_session_maker() as session:
+        names = (await session.execute(select_partitions)).scalars().all()
+
+    paths = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match is None:
+            continue
+        month = date(int(match[1]), int(match[2]), 1)
+        if add_months(month, 1) <= cutoff:
+            paths.append(await archive_partition(name, output_dir, drop))
+    return paths
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Обслуживание секций таблицы transaction')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='создать секции на следующие месяцы')
+    create.add_argument('--months-ahead', type=int, default=3)
+    archive = commands.add_parser('archive', help='отсоединить и выгрузить старые секции')
+    archive.add_argument('--older-than-months', type=int, required=True)
+    archive.add_argument('--output-dir', required=True)
+    archive.add_argument('--drop', action='store_true', help='удалить секцию после выгрузки')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        for name in await create_partitions(args.months_ahead):
+            print(name)
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for path in await archive_partitions(args.older_than_months, args.output_dir, args.drop):
+            print(path)
+    await engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,89 @@
+from sqlalchemy import DateTime, Integer, bindparam, delete, func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from transactions.models import transaction, transaction_key, payment_queue
+from transactions.schemas import QueueStatus
+
+# Границы периода - параметры, а не текст запроса, поэтому лишние секции отсекаются
+# при запуске подготовленного запроса (runtime partition pruning).
+_from_time = func.coalesce(
+    bindparam('from_time', type_=DateTime(timezone=True)), literal_column("'-infinity'::timestamptz")
+)
+_to_time = func.coalesce(
+    bindparam('to_time', type_=DateTime(timezone=True)), literal_column("'infinity'::timestamptz")
+)
+select_user_transactions = (
+    select(
+        transaction.c.transaction_id,
+        transaction.c.user_id,
+        transaction.c.account_id,
+        transaction.c.amount,
+        transaction.c.signature,
+        transaction.c.created_at,
+    )
+    .where(
+        transaction.c.user_id == bindparam('user_id'),
+        transaction.c.created_at >= _from_time,
+        transaction.c.created_at < _to_time,
+    )
+    .order_by(transaction.c.created_at)
+)
+select_transaction_id = (
+    select(transaction_key.c.transaction_id)
+    .where(transaction_key.c.transaction_id == bindparam('transaction_id'))
+)
+select_existing_transaction_ids = (
+    select(transaction_key.c.transaction_id)
+    .where(transaction_key.c.transaction_id.in_(bindparam('transaction_ids', expanding=True)))
+)
+select_transaction_user_id = (
+    select(transaction_key.c.user_id)
+    .where(transaction_key.c.transaction_id == bindparam('transaction_id'))
+)
+
+# Статус подставляется в текст запроса, а не параметром: иначе в общем плане
+# подготовленного запроса не используется частичный индекс ix_payment_queue_pending.
+_pending = payment_queue.c.status == literal(QueueStatus.pending.value, literal_execute=True)
+
+enqueue_payment = (
+    insert(payment_queue)
+    .values(
+        transaction_id=bindparam('transaction_id'),
+        user_id=bindparam('user_id'),
+        account_id=bindparam('account_id'),
+        amount=bindparam('amount'),
+        signature=bindparam('signature'),
+    )
+    .on_conflict_do_nothing(index_elements=[payment_queue.c.transaction_id])
+    .returning(payment_queue.c.transaction_id, payment_queue.c.status, payment_queue.c.new_balance)
+)
+select_queued_payment = (
+    select(payment_queue.c.transaction_id, payment_queue.c.user_id, payment_queue.c.status, payment_queue.c.new_balance)
+    .where(payment_queue.c.transaction_id == bindparam('transaction_id'))
+)
+claim_pending_payments = (
+    select(payment_queue)
+    .where(_pending)
+    .order_by(payment_queue.c.enqueued_at)
+    .limit(bindparam('limit', type_=Integer))
+    .with_for_update(skip_locked=True)
+)
+finish_queued_payment = (
+    update(payment_queue)
+    .where(payment_queue.c.transaction_id == bindparam('queued_id'))
+    .values(status=bindparam('status'), new_balance=bindparam('new_balance'), processed_at=func.now())
+)
+retry_queued_payments = (
+    update(payment_queue)
+    .where(payment_queue.c.transaction_id.in_(bindparam('transaction_ids', expanding=True)))
+    .values(attempts=payment_queue.c.attempts + 1)
+    .returning(payment_queue.c.transaction_id, payment_queue.c.attempts)
+)
+select_queue_depth = select(
+    func.count(),
+    func.coalesce(func.extract('epoch', func.now() - func.min(payment_queue.c.enqueued_at)), 0),
+).where(_pending)
+purge_processed_payments = (
+    delete(payment_queue)
+    .where(payment_queue.c.processed_at < bindparam('cutoff'))
+)
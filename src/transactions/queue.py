@@ -0,0 +1,243 @@
+"""
+Воркеры очереди платежей (режим accept-and-enqueue).
+
+Эндпоинт /transaction/enqueue_transaction только проверяет подпись и сохраняет платеж
+в таблицу payment_queue, а применяют платежи воркеры: каждый забирает пакет ожидающих
+платежей через FOR UPDATE SKIP LOCKED, применяет его одним запросом (см.
+build_apply_statement) и в той же транзакции БД проставляет платежам итоговый статус.
+Поэтому при падении воркера платеж либо применен вместе со статусом, либо снова
+достанется следующему воркеру.
+
+Если запрос пакета завершился ошибкой (например, платеж удаленного пользователя нарушает
+внешний ключ), платежи пакета применяются по одному, каждый в своей точке сохранения:
+попытка засчитывается только платежам, которые не применяются и по отдельности, а
+остальные платежи пакета применяются как обычно.
+
+Воркеры запускаются в lifespan приложения при PAYMENT_QUEUE_ENABLED=true или отдельным
+процессом из каталога src:
+    python -m transactions.queue
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    PAYMENT_QUEUE_WORKERS, PAYMENT_QUEUE_BATCH_SIZE, PAYMENT_QUEUE_POLL_INTERVAL,
+    PAYMENT_QUEUE_MAX_ATTEMPTS, PAYMENT_QUEUE_RETENTION_HOURS, PAYMENT_QUEUE_STATS_INTERVAL,
+)
+from database import async_session_maker, engine
+from metrics import PAYMENT_QUEUE_DEPTH, PAYMENT_QUEUE_LAG, PAYMENT_QUEUE_PROCESSED, PAYMENT_QUEUE_BATCH_LATENCY
+from singleflight import singleflight
+from transactions.queries import (
+    claim_pending_payments, finish_queued_payment, retry_queued_payments,
+    select_queue_depth, purge_processed_payments,
+)
+from transactions.schemas import Payment, QueueStatus
+from transactions.utils import apply_payments
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentQueueWorkers:
+    """Пул асинхронных воркеров, применяющих платежи из payment_queue пакетами."""
+
+    def __init__(
+            self,
+            workers: int,
+            batch_size: int,
+            poll_interval: float,
+            max_attempts: int,
+            retention: timedelta,
+            stats_interval: float,
+    ):
+        self._workers = workers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._retention = retention
+        self._stats_interval = stats_interval
+        self._tasks: list[asyncio.Task] = []
+        self.batches = 0
+        self.processed = {status.value: 0 for status in QueueStatus if status is not QueueStatus.pending}
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self) -> None:
+        """
+        Останавливает воркеры. Незавершенный пакет откатывается вместе с блокировками
+        строк и будет обработан после перезапуска.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.process_batch()
+            except Exception:
+                logger.exception('Payment queue batch failed')
+                claimed = 0
+            if claimed < self._batch_size:
+                await asyncio.sleep(self._poll_interval)
+
+    async def process_batch(self) -> int:
+        """
+        Применяет один пакет ожидающих платежей.
+
+        Returns:
+            int: число платежей, забранных из очереди
+        """
+        async with async_session_maker() as session:
+            result = await session.execute(claim_pending_payments, {'limit': self._batch_size})
+            claimed = result.all()
+            if not claimed:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                # Точка сохранения: при ошибке блокировки забранных строк остаются за нами.
+                async with session.begin_nested():
+                    statuses = await self._apply(session, claimed)
+            except Exception:
+                logger.exception('Payment queue batch failed, applying payments one by one')
+                statuses = await self._apply_each(session, claimed)
+            await session.commit()
+            singleflight.invalidate('accounts')
+            PAYMENT_QUEUE_BATCH_LATENCY.observe(time.perf_counter() - start)
+
+        self.batches += 1
+        for status in statuses:
+            self.processed[status] += 1
+            PAYMENT_QUEUE_PROCESSED.labels(status).inc()
+        return len(claimed)
+
+    async def _apply(self, session: AsyncSession, claimed: list) -> list[str]:
+        # Подписи проверены при постановке в очередь, владельца счета определяет запрос применения.
+        to_apply = [
+            Payment(
+                transaction_id=row.transaction_id,
+                account_id=row.account_id,
+                user_id=row.user_id,
+                amount=row.amount,
+                signature=row.signature,
+            )
+            for row in claimed
+        ]
+        applied, existing_ids = await apply_payments(session, to_apply)
+        updates = []
+        for payment in to_apply:
+            if payment.transaction_id in applied:
+                status, new_balance = QueueStatus.applied, applied[payment.transaction_id]
+            elif payment.transaction_id in existing_ids:
+                status, new_balance = QueueStatus.duplicate, None
+            else:
+                status, new_balance = QueueStatus.account_mismatch, None
+            updates.append({'queued_id': payment.transaction_id, 'status': status.value,
+                            'new_balance': new_balance})
+
+        await session.execute(finish_queued_payment, updates)
+        return [update['status'] for update in updates]
+
+    async def _apply_each(self, session: AsyncSession, claimed: list) -> list[str]:
+        """
+        Применяет платежи пакета по одному в точках сохранения; не применившимся
+        засчитывается попытка.
+
+        Returns:
+            list[str]: итоговые статусы обработанных платежей (без оставшихся в очереди)
+        """
+        statuses = []
+        failed_ids = []
+        for row in claimed:
+            try:
+                async with session.begin_nested():
+                    statuses += await self._apply(session, [row])
+            except Exception:
+                logger.exception('Queued payment %s failed', row.transaction_id)
+                failed_ids.append(row.transaction_id)
+        if failed_ids:
+            statuses += await self._retry_later(session, failed_ids)
+        return statuses
+
+    async def _retry_later(self, session: AsyncSession, transaction_ids: list[str]) -> list[str]:
+        """
+        Увеличивает число попыток платежей; платежи, исчерпавшие попытки, помечаются failed.
+
+        Returns:
+            list[str]: статусы платежей, помеченных failed
+        """
+        result = await session.execute(retry_queued_payments, {'transaction_ids': transaction_ids})
+        failed = [
+            {'queued_id': row.transaction_id, 'status': QueueStatus.failed.value, 'new_balance': None}
+            for row in result if row.attempts >= self._max_attempts
+        ]
+        if failed:
+            await session.execute(finish_queued_payment, failed)
+        return [update['status'] for update in failed]
+
+    async def _monitor(self) -> None:
+        """Периодически обновляет метрики глубины и задержки очереди и удаляет старые обработанные платежи."""
+        while True:
+            try:
+                await self.depth()
+                async with async_session_maker() as session:
+                    cutoff = datetime.now(timezone.utc) - self._retention
+                    await session.execute(purge_processed_payments, {'cutoff': cutoff})
+                    await session.commit()
+            except Exception:
+                logger.exception('Payment queue monitor failed')
+            await asyncio.sleep(self._stats_interval)
+
+    async def depth(self) -> tuple[int, float]:
+        """
+        Returns:
+            tuple: число ожидающих платежей и возраст самого старого из них в секундах
+        """
+        async with async_session_maker() as session:
+            result = await session.execute(select_queue_depth)
+            depth, lag = result.one()
+        PAYMENT_QUEUE_DEPTH.set(depth)
+        PAYMENT_QUEUE_LAG.set(lag)
+        return depth, float(lag)
+
+    async def stats(self) -> dict:
+        depth, lag = await self.depth()
+        return {
+            'workers': self._workers,
+            'running': sum(not task.done() for task in self._tasks),
+            'depth': depth,
+            'lag_seconds': lag,
+            'batches': self.batches,
+            'processed': dict(self.processed),
+        }
+
+
+payment_queue_workers = PaymentQueueWorkers(
+    PAYMENT_QUEUE_WORKERS,
+    PAYMENT_QUEUE_BATCH_SIZE,
+    PAYMENT_QUEUE_POLL_INTERVAL,
+    PAYMENT_QUEUE_MAX_ATTEMPTS,
+    timedelta(hours=PAYMENT_QUEUE_RETENTION_HOURS),
+    PAYMENT_QUEUE_STATS_INTERVAL,
+)
+
+
+async def main() -> None:
+    payment_queue_workers.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await payment_queue_workers.stop()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,256 @@
+"""
+Сверка account.amount с суммой транзакций счета.
+
+Инкрементальная сверка сворачивает в reconciliation_checkpoint только транзакции,
+вставленные с прошлого запуска. Граница - xmin снимка (pg_snapshot_xmin): все транзакции
+БД с меньшим ID уже завершены, поэтому строка, вставленная долгой транзакцией, не будет
+пропущена, как при границе по последовательности. Затем для каждого счета
+account.amount сравнивается с суммой контрольной точки и еще не свернутых видимых
+транзакций (все в одном снимке REPEATABLE READ), расхождения записываются в drift.
+Суммы считает Postgres, в Python возвращаются только счета с расхождением.
+
+Полная сверка пересчитывает контрольные точки заново по диапазонам ID счетов в
+нескольких процессах, учитывая итоги архивированных секций (archived_transaction_totals).
+
+Запуск из каталога src:
+    python -m transactions.reconciliation
+    python -m transactions.reconciliation --full --processes 4 --chunk-size 100000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from account.models import account
+from database import async_session_maker, engine
+from transactions.models import (
+    transaction, reconciliation_checkpoint, reconciliation_state, archived_transaction_totals,
+)
+
+TOLERANCE = 1e-6
+DRIFT_REPORT_LIMIT = 1000
+
+checkpoint = reconciliation_checkpoint
+snapshot_xmin = func.pg_snapshot_xmin(func.pg_current_snapshot())
+state_horizon = select(reconciliation_state.c.horizon).where(reconciliation_state.c.id == 1).scalar_subquery()
+
+lock_state = (
+    select(reconciliation_state.c.id)
+    .where(reconciliation_state.c.id == 1)
+    .with_for_update(nowait=True)
+)
+
+_new_rows = (
+    select(
+        transaction.c.account_id,
+        func.sum(transaction.c.amount).label('total'),
+        func.count().label('count'),
+    )
+    .where(transaction.c.txid >= state_horizon, transaction.c.txid < snapshot_xmin)
+    .group_by(transaction.c.account_id)
+)
+_fold = insert(checkpoint).from_select(['account_id', 'ledger_total', 'transaction_count'], _new_rows)
+fold_new_transactions = _fold.on_conflict_do_update(
+    index_elements=[checkpoint.c.account_id],
+    set_={
+        'ledger_total': checkpoint.c.ledger_total + _fold.excluded.ledger_total,
+        'transaction_count': checkpoint.c.transaction_count + _fold.excluded.transaction_count,
+        'checked_at': func.now(),
+    },
+)
+
+_tail = (
+    select(transaction.c.account_id, func.sum(transaction.c.amount).label('total'))
+    .where(transaction.c.txid >= snapshot_xmin)
+    .group_by(transaction.c.account_id)
+    .cte('tail')
+)
+_drift = account.c.amount - (
+    func.coalesce(checkpoint.c.ledger_total, 0) + func.coalesce(_tail.c.total, 0)
+)
+_changed = insert(checkpoint).from_select(
+    ['account_id', 'drift'],
+    select(account.c.id, _drift)
+    .select_from(
+        account
+        .outerjoin(checkpoint, checkpoint.c.account_id == account.c.id)
+        .outerjoin(_tail, _tail.c.account_id == account.c.id)
+    )
+    .where(func.abs(_drift - func.coalesce(checkpoint.c.drift, 0)) > TOLERANCE),
+)
+# Пишутся только счета, у которых расхождение изменилось с прошлой сверки.
+record_drift = _changed.on_conflict_do_update(
+    index_elements=[checkpoint.c.account_id],
+    set_={'drift': _changed.excluded.drift, 'checked_at': func.now()},
+)
+
+advance_horizon = (
+    update(reconciliation_state)
+    .where(reconciliation_state.c.id == 1)
+    .values(horizon=snapshot_xmin, updated_at=func.now())
+)
+
+count_drifted = select(func.count()).where(func.abs(checkpoint.c.drift) > TOLERANCE)
+select_drifted = (
+    select(checkpoint.c.account_id, checkpoint.c.drift)
+    .where(func.abs(checkpoint.c.drift) > TOLERANCE)
+    .order_by(checkpoint.c.account_id)
+    .limit(DRIFT_REPORT_LIMIT)
+)
+
+# Полная сверка диапазона счетов: свернутая часть (до horizon) пересчитывается заново,
+# к ней добавляются итоги архивированных секций.
+archived = archived_transaction_totals
+_in_range = (bindparam('low'), bindparam('high'))
+_folded = or_(transaction.c.txid.is_(None), transaction.c.txid < state_horizon)
+_ledger = (
+    select(
+        transaction.c.account_id,
+        func.sum(transaction.c.amount).filter(_folded).label('folded_total'),
+        func.count().filter(_folded).label('folded_count'),
+        func.sum(transaction.c.amount).label('total'),
+    )
+    .where(transaction.c.account_id.between(*_in_range))
+    .group_by(transaction.c.account_id)
+    .cte('ledger')
+)
+_recomputed = insert(checkpoint).from_select(
+    ['account_id', 'ledger_total', 'transaction_count', 'drift'],
+    select(
+        account.c.id,
+        func.coalesce(archived.c.total, 0) + func.coalesce(_ledger.c.folded_total, 0),
+        func.coalesce(archived.c.transaction_count, 0) + func.coalesce(_ledger.c.folded_count, 0),
+        account.c.amount - func.coalesce(archived.c.total, 0) - func.coalesce(_ledger.c.total, 0),
+    )
+    .select_from(
+        account
+        .outerjoin(_ledger, _ledger.c.account_id == account.c.id)
+        .outerjoin(archived, archived.c.account_id == account.c.id)
+    )
+    .where(account.c.id.between(*_in_range)),
+)
+_recomputed_rows = (
+    _recomputed.on_conflict_do_update(
+        index_elements=[checkpoint.c.account_id],
+        set_={
+            'ledger_total': _recomputed.excluded.ledger_total,
+            'transaction_count': _recomputed.excluded.transaction_count,
+            'drift': _recomputed.excluded.drift,
+            'checked_at': func.now(),
+        },
+    )
+    .returning(checkpoint.c.account_id, checkpoint.c.drift)
+    .cte('recomputed')
+)
+recompute_range = (
+    select(_recomputed_rows.c.account_id, _recomputed_rows.c.drift)
+    .where(func.abs(_recomputed_rows.c.drift) > TOLERANCE)
+)
+share_state = select(reconciliation_state.c.id).where(reconciliation_state.c.id == 1).with_for_update(read=True)
+select_account_id_range = select(func.min(account.c.id), func.max(account.c.id))
+
+
+async def _repeatable_read(session: AsyncSession) -> None:
+    await session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+
+async def reconcile_incremental(session: AsyncSession) -> dict:
+    """
+    Сворачивает новые транзакции в контрольные точки и ищет расхождения.
+
+    Raises:
+        HTTPException: 409 - Если сверка уже выполняется
+    """
+    await _repeatable_read(session)
+    try:
+        await session.execute(lock_state)
+    except DBAPIError:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail='Reconciliation is already running')
+
+    folded = await session.execute(fold_new_transactions)
+    await session.execute(record_drift)
+    await session.execute(advance_horizon)
+    drifted_count = (await session.execute(count_drifted)).scalar()
+    drifted = (await session.execute(select_drifted)).all()
+    await session.commit()
+    return {
+        'mode': 'incremental',
+        'accounts_folded': folded.rowcount,
+        'drifted_accounts': drifted_count,
+        'drift': [{'account_id': row.account_id, 'drift': row.drift} for row in drifted],
+    }
+
+
+async def _recompute(low: int, high: int) -> list[tuple[int, float]]:
+    try:
+        async with async_session_maker() as session:
+            await _repeatable_read(session)
+            # Инкрементальная сверка ждет, пока диапазон пересчитывается относительно текущего horizon.
+            await session.execute(share_state)
+            rows = await session.execute(recompute_range, {'low': low, 'high': high})
+            drifted = [(row.account_id, row.drift) for row in rows]
+            await session.commit()
+        return drifted
+    finally:
+        await engine.dispose()
+
+
+def _recompute_in_process(low: int, high: int) -> list[tuple[int, float]]:
+    return asyncio.run(_recompute(low, high))
+
+
+async def reconcile_full(processes: int, chunk_size: int) -> dict:
+    """Пересчитывает контрольные точки всех счетов по диапазонам ID в processes процессах."""
+    async with async_session_maker() as session:
+        low, high = (await session.execute(select_account_id_range)).one()
+    await engine.dispose()
+    if low is None:
+        return {'mode': 'full', 'chunks': 0, 'drifted_accounts': 0, 'drift': []}
+
+    chunks = [(start, min(start + chunk_size - 1, high)) for start in range(low, high + 1, chunk_size)]
+    loop = asyncio.get_running_loop()
+    # spawn, а не fork: дочерние процессы не должны наследовать соединения пула родителя.
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _recompute_in_process, *chunk) for chunk in chunks)
+        )
+
+    drifted = sorted(item for result in results for item in result)
+    return {
+        'mode': 'full',
+        'chunks': len(chunks),
+        'drifted_accounts': len(drifted),
+        'drift': [{'account_id': account_id, 'drift': drift} for account_id, drift in drifted[:DRIFT_REPORT_LIMIT]],
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Сверка балансов счетов с историей транзакций')
+    parser.add_argument('--full', action='store_true', help='пересчитать все контрольные точки')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=100000, help='число ID счетов в куске')
+    args = parser.parse_args()
+
+    if args.full:
+        report = await reconcile_full(args.processes, args.chunk_size)
+    else:
+        async with async_session_maker() as session:
+            report = await reconcile_incremental(session)
+        await engine.dispose()
+
+    print(f"{report['mode']}: {report['drifted_accounts']} drifted accounts")
+    for row in report['drift']:
+        print(f"account {row['account_id']}: drift {row['drift']}")
+    return 1 if report['drifted_accounts'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
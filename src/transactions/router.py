@@ -1,15 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, and_, insert, update
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_async_session
-from user.utils import get_current_user
+from database import get_async_session, get_read_session, replica_set
+from pagination import keyset_page, ndjson_response, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from singleflight import singleflight
+from user.utils import get_current_user, get_user_read_session, get_balance_etag, etag_matches
 from user.schemas import User
 from transactions.models import transaction
-from transactions.utils import verify_signature
-from transactions.schemas import Payment
-from config import TRANSACTION_SECRET_KEY
+from transactions.queries import (
+    select_user_transactions, select_transaction_id, select_transaction_user_id,
+    enqueue_payment, select_queued_payment,
+)
+from transactions.utils import verify_signature, apply_payment, apply_payments, prepare_batch
+from transactions.schemas import (
+    Payment, PaymentStatus, QueueStatus, TransactionInfo, UserTransactions, TransactionPage, TransactionResult,
+    BatchResult, QueuedPayment, ExportFormat, ReconciliationReport,
+)
+from transactions.coalescer import PaymentCoalescer
+from transactions.export import export_query, export_chunks, parquet_available, MEDIA_TYPES
+from transactions.reconciliation import reconcile_incremental
+from transactions.seen_ids import SeenTransactions, SeenState
+from config import (
+    TRANSACTION_SECRET_KEY, TRANSACTION_BATCH_MAX_SIZE,
+    TRANSACTION_COALESCE_ENABLED, TRANSACTION_COALESCE_MAX_BATCH, TRANSACTION_COALESCE_MAX_LINGER_MS,
+    TRANSACTION_FILTER_ENABLED, TRANSACTION_FILTER_RECENT_SIZE, TRANSACTION_FILTER_CAPACITY,
+    TRANSACTION_FILTER_ERROR_RATE, PAYMENT_QUEUE_ENABLED,
+)
 from account.schemas import Account
-from account.models import account
 
 from user.utils import verify_admin
 
@@ -18,16 +37,68 @@ router = APIRouter(
     tags=['Transaction']
 )
 
+payment_coalescer = PaymentCoalescer(
+    TRANSACTION_COALESCE_MAX_BATCH, TRANSACTION_COALESCE_MAX_LINGER_MS / 1000
+)
+seen_transactions = SeenTransactions(
+    TRANSACTION_FILTER_RECENT_SIZE, TRANSACTION_FILTER_CAPACITY, TRANSACTION_FILTER_ERROR_RATE
+) if TRANSACTION_FILTER_ENABLED else None
+
+
+async def reject_seen_transaction(transaction_id: str, session: AsyncSession) -> None:
+    """
+    Отклоняет уже обработанную транзакцию до ее применения.
+
+    Недавние ID отклоняются без обращения к БД, для ID, которые фильтр Блума считает
+    возможно виденными, выполняется проверка по первичному ключу. Точно новые ID
+    сразу идут на применение.
+
+    Raises:
+        HTTPException: 400 - Если транзакция уже обработана
+    """
+    if seen_transactions is None:
+        return
+    seen = seen_transactions.check(transaction_id)
+    if seen is SeenState.maybe:
+        existing_transaction = await session.execute(select_transaction_id, {'transaction_id': transaction_id})
+        if existing_transaction.scalar() is not None:
+            seen_transactions.add(transaction_id)
+            seen = SeenState.recent
+        else:
+            seen_transactions.record_false_positive()
+    if seen is SeenState.recent:
+        raise HTTPException(
+            status_code=400,
+            detail="Transaction already processed"
+        )
+
+
+def remember_transactions(transaction_ids) -> None:
+    if seen_transactions is not None:
+        for transaction_id in transaction_ids:
+            seen_transactions.add(transaction_id)
 
-@router.get('/transactions_info')
+
+@router.get('/transactions_info', response_model=TransactionInfo)
 async def transactions_info(
-        session: AsyncSession = Depends(get_async_session),
+        request: Request,
+        response: Response,
+        from_time: datetime | None = Query(None, alias='from'),
+        to_time: datetime | None = Query(None, alias='to'),
+        session: AsyncSession = Depends(get_user_read_session),
         current_user: User = Depends(get_current_user)
 ):
     """
     Получает историю транзакций для текущего авторизованного пользователя.
+    Диапазон времени from/to ограничивает чтение нужными секциями таблицы transaction.
+    Поддерживает условный запрос: если If-None-Match совпадает с текущим ETag,
+    возвращается 304 без чтения таблицы transaction.
 
     Args:
+        request (Request): Входящий запрос (заголовок If-None-Match)
+        response (Response): Ответ, в который добавляется заголовок ETag
+        from_time (datetime | None): Начало диапазона времени транзакций (включительно)
+        to_time (datetime | None): Конец диапазона времени транзакций (не включительно)
         session (AsyncSession): Асинхронная сессия подключения к БД
         current_user (User): Данные текущего аутентифицированного пользователя
 
@@ -38,18 +109,27 @@ async def transactions_info(
         HTTPException: 404 - Если у пользователя нет транзакций
         HTTPException: 401 - Если пользователь не авторизован
     """
-    query = select(transaction).where(transaction.c.user_id == current_user['id'])
-    result = await session.execute(query)
-    transaction_info = [dict(r._mapping) for r in result]
+    etag = await get_balance_etag(current_user['id'], session)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+
+    result = await session.execute(
+        select_user_transactions,
+        {'user_id': current_user['id'], 'from_time': from_time, 'to_time': to_time},
+    )
+    transaction_info = result.all()
     if not transaction_info:
         raise HTTPException(status_code=404, detail='No transactions')
     return {'transaction_info': transaction_info}
 
 
-@router.get('/admin/user_transactions_info')
+@router.get('/admin/user_transactions_info', response_model=UserTransactions)
 async def transactions_info(
         user_id: int,
-        session: AsyncSession = Depends(get_async_session),
+        from_time: datetime | None = Query(None, alias='from'),
+        to_time: datetime | None = Query(None, alias='to'),
+        session: AsyncSession = Depends(get_read_session),
         _: User = Depends(verify_admin),
 ):
     """
@@ -58,6 +138,8 @@ async def transactions_info(
 
     Args:
         user_id (int): ID пользователя, для которого запрашиваются транзакции
+        from_time (datetime | None): Начало диапазона времени транзакций (включительно)
+        to_time (datetime | None): Конец диапазона времени транзакций (не включительно)
         session (AsyncSession): Асинхронная сессия подключения к БД
         _ (User): Параметр для проверки прав администратора
 
@@ -68,18 +150,104 @@ async def transactions_info(
         HTTPException: 403 - Если запрашивающий не имеет прав администратора
         HTTPException: 404 - Если пользователь не найден (опционально)
     """
-    query = select(transaction).where(transaction.c.user_id == user_id)
-    result = await session.execute(query)
-    return {'user_id': user_id, 'transactions': [dict(r._mapping) for r in result]}
+    result = await session.execute(
+        select_user_transactions, {'user_id': user_id, 'from_time': from_time, 'to_time': to_time}
+    )
+    return {'user_id': user_id, 'transactions': result.all()}
 
 
-@router.get('/admin/get_all_transactions')
+@router.get('/admin/get_all_transactions', response_model=TransactionPage)
 async def get_all_transactions(
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+        after: str | None = None,
+        session: AsyncSession = Depends(get_read_session),
+        _: User = Depends(verify_admin),
+):
+    """
+    Получает страницу списка всех транзакций в системе, упорядоченного по transaction_id.
+    Требует административных прав доступа.
+
+    Args:
+        limit (int): Максимальное количество транзакций на странице
+        after (str | None): transaction_id последней транзакции предыдущей страницы
+        session (AsyncSession): Асинхронная сессия подключения к БД
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        dict: Словарь с ключом 'transactions', содержащим страницу транзакций, и ключом
+        'next_after' со значением after для следующей страницы (None, если страница последняя)
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    transactions, next_after = await keyset_page(
+        session, transaction, transaction.c.transaction_id, limit, after
+    )
+    return {'transactions': transactions, 'next_after': next_after}
+
+
+@router.get('/admin/stream_all_transactions')
+async def stream_all_transactions(
+        _: User = Depends(verify_admin),
+):
+    """
+    Выгружает все транзакции в формате NDJSON (по одному JSON-объекту на строку) потоком.
+    Требует административных прав доступа.
+
+    Args:
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        StreamingResponse: Поток application/x-ndjson со всеми транзакциями,
+        упорядоченными по transaction_id
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+    """
+    return ndjson_response(transaction, transaction.c.transaction_id)
+
+
+@router.get('/admin/export_transactions')
+async def export_transactions(
+        export_format: ExportFormat = Query(ExportFormat.csv, alias='format'),
+        user_id: int | None = None,
+        account_id: int | None = None,
+        _: User = Depends(verify_admin),
+):
+    """
+    Выгружает транзакции через COPY ... TO STDOUT потоком в формате CSV или Parquet.
+    Требует административных прав доступа.
+
+    Args:
+        export_format (ExportFormat): Формат выгрузки (csv или parquet)
+        user_id (int | None): Выгрузить только транзакции этого пользователя
+        account_id (int | None): Выгрузить только транзакции этого счета
+        _ (User): Параметр для проверки прав администратора
+
+    Returns:
+        StreamingResponse: Поток text/csv (с заголовком) или application/vnd.apache.parquet
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не имеет прав администратора
+        HTTPException: 501 - Если запрошен Parquet, а pyarrow не установлен
+    """
+    if export_format is ExportFormat.parquet and not parquet_available():
+        raise HTTPException(status_code=501, detail='Parquet export requires pyarrow')
+    return StreamingResponse(
+        export_chunks(export_query(user_id, account_id), export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="transactions.{export_format.value}"'},
+    )
+
+
+@router.post('/admin/reconcile', response_model=ReconciliationReport)
+async def reconcile(
         session: AsyncSession = Depends(get_async_session),
         _: User = Depends(verify_admin),
 ):
     """
-    Получает полный список всех транзакций в системе.
+    Запускает инкрементальную сверку балансов счетов с историей транзакций: сворачивает
+    транзакции, добавленные с прошлой сверки, и сравнивает результат с балансами счетов.
     Требует административных прав доступа.
 
     Args:
@@ -87,17 +255,17 @@ async def get_all_transactions(
         _ (User): Параметр для проверки прав администратора
 
     Returns:
-        dict: Словарь с ключом 'transactions', содержащим список всех транзакций
+        ReconciliationReport: Число свернутых счетов, число счетов с расхождением и сами
+        расхождения (не больше 1000 счетов)
 
     Raises:
         HTTPException: 403 - Если запрашивающий не имеет прав администратора
+        HTTPException: 409 - Если сверка уже выполняется
     """
-    query = select(transaction)
-    result = await session.execute(query)
-    return {'transactions': [dict(r._mapping) for r in result]}
+    return await reconcile_incremental(session)
 
 
-@router.post('/make_transaction')
+@router.post('/make_transaction', response_model=TransactionResult)
 async def make_transaction(
         data: Payment,
         session: AsyncSession = Depends(get_async_session),
@@ -120,6 +288,7 @@ async def make_transaction(
         Raises:
             HTTPException: 403 - При невалидной подписи транзакции
             HTTPException: 400 - При попытке повторной обработки транзакции
+                или если счет принадлежит другому пользователю
         """
     if not verify_signature(data, TRANSACTION_SECRET_KEY):
         raise HTTPException(
@@ -127,66 +296,194 @@ async def make_transaction(
             detail="Invalid signature"
         )
 
-    existing_transaction = await session.execute(
-        select(transaction).where(transaction.c.transaction_id == data.transaction_id)
-    )
-    if existing_transaction.scalar():
+    await reject_seen_transaction(data.transaction_id, session)
+
+    if TRANSACTION_COALESCE_ENABLED:
+        new_balance = await payment_coalescer.submit(data)
+        remember_transactions([data.transaction_id])
+        replica_set.mark_write(data.user_id)
+        singleflight.invalidate('accounts')
+        return {
+            "message": "Transaction processed",
+            "new_balance": new_balance
+        }
+
+    result = await session.execute(apply_payment, data.model_dump())
+    applied = result.one_or_none()
+
+    if applied is None or applied.balance is None:
+        await session.rollback()
+        existing_transaction = await session.execute(
+            select_transaction_id, {'transaction_id': data.transaction_id}
+        )
+        if existing_transaction.scalar() is not None:
+            remember_transactions([data.transaction_id])
+            raise HTTPException(
+                status_code=400,
+                detail="Transaction already processed"
+            )
         raise HTTPException(
             status_code=400,
-            detail="Transaction already processed"
+            detail="Account belongs to another user"
         )
 
-    account_exists = await session.execute(
-        select(account).where(
-            and_(
-                account.c.user_id == data.user_id,
-                account.c.id == data.account_id
-            )
+    await session.commit()
+    remember_transactions([data.transaction_id])
+    replica_set.mark_write(data.user_id)
+    singleflight.invalidate('accounts')
+
+    return {
+        "message": "Transaction processed",
+        "new_balance": applied.balance
+    }
+
+
+@router.post('/make_transactions_batch', response_model=BatchResult)
+async def make_transactions_batch(
+        data: list[Payment],
+        session: AsyncSession = Depends(get_async_session),
+        _: User = Depends(get_current_user)
+):
+    """
+        Обрабатывает пакет транзакций одним запросом к БД в рамках одной транзакции.
+
+        Args:
+            data (list[Payment]): Список транзакций
+            session (AsyncSession): Сессия подключения к БД
+            current_user (User): Текущий аутентифицированный пользователь
+
+        Returns:
+            {
+                "results": [
+                    {
+                        "transaction_id": str,
+                        "status": str - applied, duplicate, invalid_signature или account_mismatch,
+                        "new_balance": float | None - Баланс счета после применения пакета
+                    }
+                ]
+            }
+
+        Raises:
+            HTTPException: 400 - Если размер пакета превышает TRANSACTION_BATCH_MAX_SIZE
+            HTTPException: 409 - Если владелец счета изменился во время обработки пакета
+        """
+    if len(data) > TRANSACTION_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size exceeds {TRANSACTION_BATCH_MAX_SIZE}"
         )
-    )
 
-    if account_exists.scalar() is None:
-        await session.execute(
-            insert(account).values(
-                user_id=data.user_id,
-                account_id=data.account_id,
-                amount=data.amount
-            )
+    results, to_apply = prepare_batch(data, TRANSACTION_SECRET_KEY)
+    if seen_transactions is not None:
+        for result, payment in to_apply:
+            if seen_transactions.is_recent(payment.transaction_id):
+                result['status'] = PaymentStatus.duplicate
+        to_apply = [
+            (result, payment) for result, payment in to_apply
+            if result['status'] is not PaymentStatus.duplicate
+        ]
+    if not to_apply:
+        return {'results': results}
+
+    applied, existing_ids = await apply_payments(session, [payment for _, payment in to_apply])
+    await session.commit()
+    remember_transactions([*applied, *existing_ids])
+    for user_id in {payment.user_id for _, payment in to_apply if payment.transaction_id in applied}:
+        replica_set.mark_write(user_id)
+    if applied:
+        singleflight.invalidate('accounts')
+
+    for result, payment in to_apply:
+        if payment.transaction_id in applied:
+            result['status'] = PaymentStatus.applied
+            result['new_balance'] = applied[payment.transaction_id]
+        elif payment.transaction_id in existing_ids:
+            result['status'] = PaymentStatus.duplicate
+        else:
+            result['status'] = PaymentStatus.account_mismatch
+
+    return {'results': results}
+
+
+@router.post('/enqueue_transaction', response_model=QueuedPayment, status_code=202)
+async def enqueue_transaction(
+        data: Payment,
+        session: AsyncSession = Depends(get_async_session),
+        _: User = Depends(get_current_user)
+):
+    """
+        Принимает транзакцию в очередь и сразу отвечает, не дожидаясь обновления баланса.
+        Платеж применяют воркеры очереди, результат доступен по /transaction/status/{transaction_id}.
+        Повторная постановка того же transaction_id возвращает его текущий статус.
+
+        Args:
+            data (Payment): Данные транзакции
+            session (AsyncSession): Сессия подключения к БД
+            current_user (User): Текущий аутентифицированный пользователь
+
+        Returns:
+            {
+                "transaction_id": str,
+                "status": str - pending, applied, duplicate, account_mismatch или failed,
+                "new_balance": float | None - Баланс счета после применения
+            }
+
+        Raises:
+            HTTPException: 503 - Если очередь платежей выключена
+            HTTPException: 403 - При невалидной подписи транзакции
+            HTTPException: 400 - При попытке повторной обработки транзакции
+        """
+    if not PAYMENT_QUEUE_ENABLED:
+        raise HTTPException(
+            status_code=503,
+            detail="Payment queue is disabled"
         )
-    else:
-        await session.execute(
-            update(account)
-            .where(
-                and_(
-                    account.c.user_id == data.user_id,
-                    account.c.id == data.account_id
-                )
-            )
-            .values(amount=account.c.amount + data.amount)
+    if not verify_signature(data, TRANSACTION_SECRET_KEY):
+        raise HTTPException(
+            status_code=403,
+            detail="Invalid signature"
         )
 
-    await session.execute(
-        insert(transaction).values(
-            transaction_id=data.transaction_id,
-            user_id=data.user_id,
-            account_id=data.account_id,
-            amount=data.amount,
-            signature=data.signature
-        )
-    )
+    await reject_seen_transaction(data.transaction_id, session)
 
+    result = await session.execute(enqueue_payment, data.model_dump())
+    queued = result.one_or_none()
+    if queued is None:
+        result = await session.execute(select_queued_payment, {'transaction_id': data.transaction_id})
+        queued = result.one()
     await session.commit()
+    return queued
 
-    updated_balance = await session.execute(
-        select(account.c.amount).where(
-            and_(
-                account.c.user_id == data.user_id,
-                account.c.id == data.account_id
-            )
-        )
-    )
 
-    return {
-        "message": "Transaction processed",
-        "new_balance": updated_balance.scalar()
-    }
+@router.get('/status/{transaction_id}', response_model=QueuedPayment)
+async def transaction_status(
+        transaction_id: str,
+        session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Получает статус транзакции текущего пользователя, принятой в очередь.
+    Для транзакций, которых уже нет в очереди, но которые есть в истории, возвращается applied.
+
+    Args:
+        transaction_id (str): ID транзакции
+        session (AsyncSession): Асинхронная сессия подключения к БД
+        current_user (User): Данные текущего аутентифицированного пользователя
+
+    Returns:
+        dict: Словарь с ключами 'transaction_id', 'status' и 'new_balance'
+
+    Raises:
+        HTTPException: 404 - Если транзакция пользователя не найдена
+        HTTPException: 401 - Если пользователь не авторизован
+    """
+    result = await session.execute(select_queued_payment, {'transaction_id': transaction_id})
+    queued = result.one_or_none()
+    if queued is not None:
+        if queued.user_id == current_user['id']:
+            return queued
+    else:
+        result = await session.execute(select_transaction_user_id, {'transaction_id': transaction_id})
+        if result.scalar() == current_user['id']:
+            return {'transaction_id': transaction_id, 'status': QueueStatus.applied, 'new_balance': None}
+    raise HTTPException(status_code=404, detail='Transaction not found')
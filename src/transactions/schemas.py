@@ -1,8 +1,78 @@
-from pydantic import BaseModel
+from datetime import datetime
+from enum import Enum
+
+from pydantic import BaseModel, ConfigDict
 
 class Payment(BaseModel):
     transaction_id: str
     account_id: int
     user_id: int
     amount: int
-    signature: str
\ No newline at end of file
+    signature: str
+
+class PaymentStatus(str, Enum):
+    applied = 'applied'
+    duplicate = 'duplicate'
+    invalid_signature = 'invalid_signature'
+    account_mismatch = 'account_mismatch'
+
+class QueueStatus(str, Enum):
+    pending = 'pending'
+    applied = 'applied'
+    duplicate = 'duplicate'
+    account_mismatch = 'account_mismatch'
+    failed = 'failed'
+
+class ExportFormat(str, Enum):
+    csv = 'csv'
+    parquet = 'parquet'
+
+class Transaction(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    transaction_id: str
+    user_id: int | None
+    account_id: int | None
+    amount: float
+    signature: str
+    created_at: datetime
+
+class TransactionInfo(BaseModel):
+    transaction_info: list[Transaction]
+
+class UserTransactions(BaseModel):
+    user_id: int
+    transactions: list[Transaction]
+
+class TransactionPage(BaseModel):
+    transactions: list[Transaction]
+    next_after: str | None
+
+class TransactionResult(BaseModel):
+    message: str
+    new_balance: float
+
+class PaymentResult(BaseModel):
+    transaction_id: str
+    status: PaymentStatus
+    new_balance: float | None
+
+class BatchResult(BaseModel):
+    results: list[PaymentResult]
+
+class AccountDrift(BaseModel):
+    account_id: int
+    drift: float
+
+class ReconciliationReport(BaseModel):
+    mode: str
+    accounts_folded: int
+    drifted_accounts: int
+    drift: list[AccountDrift]
+
+class QueuedPayment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    transaction_id: str
+    status: QueueStatus
+    new_balance: float | None
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import math
+from collections import OrderedDict
+from enum import Enum
+
+from sqlalchemy import select
+
+from database import engine
+from transactions.models import transaction_key
+
+
+class SeenState(str, Enum):
+    recent = 'recent'
+    maybe = 'maybe'
+    new = 'new'
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray с двойным хешированием blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        self.add_positions([self._positions(key)])
+
+    def positions(self, keys: list[str]) -> list[tuple[int, ...]]:
+        """Позиции битов ключей. Фильтр не меняет, поэтому может выполняться в другом потоке."""
+        return [tuple(self._positions(key)) for key in keys]
+
+    def add_positions(self, positions) -> None:
+        for key_positions in positions:
+            for pos in key_positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class SeenTransactions:
+    """
+    Фильтр уже обработанных transaction_id перед обращением к БД.
+
+    Недавние ID хранятся в LRU и отклоняются без запроса к БД. Все известные процессу
+    ID (загруженные при старте и обработанные им) попадают в фильтр Блума: его ответ
+    "точно новый" позволяет пропустить проверочный SELECT, а "возможно виден" требует
+    проверки по БД, результат которой вызывающий код сообщает через add или
+    record_false_positive. Пакеты проверяются только по LRU (is_recent), так как дубликаты
+    в них отсеивает сам запрос применения.
+    """
+
+    def __init__(self, recent_size: int, capacity: int, error_rate: float):
+        self._recent_size = recent_size
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self.checks = 0
+        self.recent_hits = 0
+        self.maybe_seen = 0
+        self.false_positives = 0
+
+    def check(self, transaction_id: str) -> SeenState:
+        self.checks += 1
+        if transaction_id in self._recent:
+            self._recent.move_to_end(transaction_id)
+            self.recent_hits += 1
+            return SeenState.recent
+        if transaction_id in self._bloom:
+            self.maybe_seen += 1
+            return SeenState.maybe
+        return SeenState.new
+
+    def is_recent(self, transaction_id: str) -> bool:
+        """Проверяет только LRU, не обращаясь к фильтру Блума."""
+        self.checks += 1
+        if transaction_id not in self._recent:
+            return False
+        self._recent.move_to_end(transaction_id)
+        self.recent_hits += 1
+        return True
+
+    def add(self, transaction_id: str) -> None:
+        self._recent[transaction_id] = None
+        self._recent.move_to_end(transaction_id)
+        if len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+        self._bloom.add(transaction_id)
+
+    def record_false_positive(self) -> None:
+        self.false_positives += 1
+
+    async def warmup(self, chunk_rows: int = 10000) -> None:
+        """
+        Загружает в фильтр Блума все transaction_id из БД через серверный курсор.
+
+        Хеши каждой порции считаются в пуле потоков, а в event loop только выставляются
+        биты, поэтому прогрев на большой таблице не блокирует обработку запросов.
+        """
+        loop = asyncio.get_running_loop()
+        query = select(transaction_key.c.transaction_id).execution_options(yield_per=chunk_rows)
+        async with engine.connect() as conn:
+            result = await conn.stream_scalars(query)
+            async for chunk in result.partitions():
+                positions = await loop.run_in_executor(None, self._bloom.positions, chunk)
+                self._bloom.add_positions(positions)
+
+    def stats(self) -> dict:
+        return {
+            'checks': self.checks,
+            'recent_hits': self.recent_hits,
+            'recent_hit_rate': self.recent_hits / self.checks if self.checks else 0.0,
+            'maybe_seen': self.maybe_seen,
+            'false_positives': self.false_positives,
+            'false_positive_rate': self.false_positives / self.maybe_seen if self.maybe_seen else 0.0,
+            'recent_size': len(self._recent),
+            'bloom_items': self._bloom.count,
+            'bloom_bits': self._bloom.size,
+            'bloom_hashes': self._bloom.hashes,
+        }
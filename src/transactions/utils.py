@@ -1,9 +1,260 @@
 import hashlib
 
-from transactions.schemas import Payment
+from fastapi import HTTPException
+from sqlalchemy import Double, Integer, String, Table, Text, bindparam, cast, column, exists, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from account.events import ACCOUNT_EVENTS_CHANNEL
+from account.models import account, account_summary, account_daily_summary
+from config import ACCOUNT_EVENTS_ENABLED
+from metrics import SIGNATURE_VERIFY_LATENCY
+from transactions.models import transaction, transaction_key
+from transactions.queries import select_existing_transaction_ids
+from transactions.schemas import Payment, PaymentStatus
 
+
+@SIGNATURE_VERIFY_LATENCY.time()
 def verify_signature(data: Payment, secret_key: str) -> bool:
     message = f"{data.account_id}{data.amount}{data.transaction_id}{data.user_id}{secret_key}"
     expected_signature = hashlib.sha256(message.encode()).hexdigest()
-    return expected_signature == data.signature
\ No newline at end of file
+    return expected_signature == data.signature
+
+
+def prepare_batch(payments: list[Payment], secret_key: str) -> tuple[list[dict], list[tuple[dict, Payment]]]:
+    """
+    Отбрасывает платежи пакета, которые можно отклонить без обращения к БД.
+
+    Returns:
+        tuple: список результатов по каждому платежу (в порядке пакета) и список пар
+        (результат, платеж) для платежей, которые нужно применить в БД.
+    """
+    results = [
+        {'transaction_id': p.transaction_id, 'status': PaymentStatus.invalid_signature, 'new_balance': None}
+        for p in payments
+    ]
+    to_apply = []
+    seen_ids = set()
+    for result, payment in zip(results, payments):
+        if not verify_signature(payment, secret_key):
+            continue
+        if payment.transaction_id in seen_ids:
+            result['status'] = PaymentStatus.duplicate
+            continue
+        seen_ids.add(payment.transaction_id)
+        # Владельца счета определяет запрос применения по данным БД (см. build_apply_statement).
+        to_apply.append((result, payment))
+    return results, to_apply
+
+
+PAYMENT_COLUMNS = {
+    'transaction_id': String,
+    'user_id': Integer,
+    'account_id': Integer,
+    'amount': Double,
+    'signature': String,
+}
+
+
+def apply_payments_params(payments: list[Payment]) -> dict:
+    """Параметры apply_payments_batch: значения каждого столбца платежей одним массивом."""
+    return {name: [getattr(p, name) for p in payments] for name in PAYMENT_COLUMNS}
+
+
+def build_apply_statement(payments):
+    """
+    Собирает один SQL-запрос, который атомарно применяет платежи.
+
+    transaction_id регистрируются в transaction_key с ON CONFLICT DO NOTHING, и в
+    секционированную таблицу transaction попадают только новые, поэтому повторы
+    отбрасываются самой БД без гонок. Суммы только что вставленных транзакций
+    агрегируются по счету и применяются через upsert таблицы account. Платежи на счет,
+    принадлежащий другому пользователю, не вставляются; если счета еще нет, его владельцем
+    становится пользователь первого платежа на этот счет в запросе, а платежи других
+    пользователей на него не вставляются. Счета и их итоги обновляются в порядке
+    account_id, поэтому одновременные запросы с общими счетами не блокируют друг друга
+    взаимно; обновление строки счета меняет ее xmin, по которому выдаются ETag (см.
+    select_accounts_version). Суммы и число транзакций добавляются в account_summary и
+    в account_daily_summary за текущий день. При ACCOUNT_EVENTS_ENABLED для каждой вставленной транзакции
+    вызывается pg_notify; уведомления доставляются только после фиксации транзакции БД.
+
+    Args:
+        payments: выборка платежей со столбцами PAYMENT_COLUMNS и position - порядковым
+            номером платежа
+
+    Returns:
+        Select: запрос, возвращающий по строке на каждую вставленную транзакцию
+        (transaction_id, account_id, amount, balance), где balance - баланс счета
+        после применения всех платежей запроса.
+    """
+    # CTE, чтобы параметры платежей передавались один раз, хотя incoming читают два запроса.
+    incoming = select(payments).cte('incoming')
+    ranked = select(
+        incoming.c.account_id,
+        incoming.c.user_id,
+        func.row_number().over(partition_by=incoming.c.account_id, order_by=incoming.c.position).label('rank'),
+    ).subquery('ranked')
+    first_owners = select(ranked.c.account_id, ranked.c.user_id).where(ranked.c.rank == 1).cte('first_owners')
+
+    existing_account = exists().where(account.c.id == incoming.c.account_id)
+    foreign_account = exists().where(
+        account.c.id == incoming.c.account_id,
+        account.c.user_id.is_distinct_from(incoming.c.user_id),
+    )
+    registered = (
+        insert(transaction_key)
+        .from_select(
+            ['transaction_id', 'user_id'],
+            select(incoming.c.transaction_id, incoming.c.user_id)
+            .join(first_owners, first_owners.c.account_id == incoming.c.account_id)
+            .where(~foreign_account, existing_account | (first_owners.c.user_id == incoming.c.user_id)),
+        )
+        .on_conflict_do_nothing(index_elements=[transaction_key.c.transaction_id])
+        .returning(transaction_key.c.transaction_id, transaction_key.c.created_at)
+        .cte('registered')
+    )
+    new_transactions = (
+        insert(transaction)
+        .from_select(
+            ['transaction_id', 'user_id', 'account_id', 'amount', 'signature', 'created_at'],
+            select(*(incoming.c[name] for name in PAYMENT_COLUMNS), registered.c.created_at).join(
+                registered, registered.c.transaction_id == incoming.c.transaction_id
+            ),
+        )
+        .returning(
+            transaction.c.transaction_id,
+            transaction.c.user_id,
+            transaction.c.account_id,
+            transaction.c.amount,
+        )
+        .cte('new_transactions')
+    )
+
+    upsert_accounts = insert(account).from_select(
+        ['id', 'user_id', 'amount'],
+        select(
+            new_transactions.c.account_id,
+            new_transactions.c.user_id,
+            func.sum(new_transactions.c.amount),
+        )
+        .group_by(new_transactions.c.account_id, new_transactions.c.user_id)
+        .order_by(new_transactions.c.account_id),
+    )
+    balances = (
+        upsert_accounts.on_conflict_do_update(
+            index_elements=[account.c.id],
+            set_={'amount': account.c.amount + upsert_accounts.excluded.amount},
+            where=account.c.user_id == upsert_accounts.excluded.user_id,
+        )
+        .returning(account.c.id, account.c.amount)
+        .cte('balances')
+    )
+
+    summaries = upsert_summary(account_summary, new_transactions).cte('summaries')
+    daily_summaries = upsert_summary(account_daily_summary, new_transactions, func.current_date()).cte(
+        'daily_summaries'
+    )
+
+    columns = [
+        new_transactions.c.transaction_id,
+        new_transactions.c.account_id,
+        new_transactions.c.amount,
+        balances.c.amount.label('balance'),
+    ]
+    if ACCOUNT_EVENTS_ENABLED:
+        event = func.json_build_object(
+            'user_id', new_transactions.c.user_id,
+            'account_id', new_transactions.c.account_id,
+            'transaction_id', new_transactions.c.transaction_id,
+            'amount', new_transactions.c.amount,
+            'balance', balances.c.amount,
+        )
+        columns.append(func.pg_notify(ACCOUNT_EVENTS_CHANNEL, cast(event, Text)).label('notified'))
+
+    return select(*columns).outerjoin(
+        balances, balances.c.id == new_transactions.c.account_id
+    ).add_cte(summaries, daily_summaries)
+
+
+def upsert_summary(summary: Table, transactions, day=None):
+    """
+    Upsert агрегатов summary (account_summary или account_daily_summary за день day)
+    суммами и числом транзакций из transactions.
+    """
+    amount = transactions.c.amount
+    columns = [
+        transactions.c.account_id,
+        transactions.c.user_id,
+        func.sum(amount),
+        func.coalesce(func.sum(amount).filter(amount > 0), 0),
+        func.coalesce(func.sum(amount).filter(amount < 0), 0),
+        func.count(),
+    ]
+    names = ['account_id', 'user_id', 'total', 'inflow', 'outflow', 'transaction_count']
+    if day is not None:
+        columns.append(day)
+        names.append('day')
+    upsert = insert(summary).from_select(
+        names,
+        select(*columns)
+        .group_by(transactions.c.account_id, transactions.c.user_id)
+        .order_by(transactions.c.account_id),
+    )
+    return upsert.on_conflict_do_update(
+        index_elements=list(summary.primary_key),
+        set_={
+            name: summary.c[name] + upsert.excluded[name]
+            for name in ('total', 'inflow', 'outflow', 'transaction_count')
+        },
+    )
+
+
+# Запрос для одного платежа собирается один раз; параметры передаются по именам полей Payment.
+# Платеж - SELECT из параметров, а не VALUES: у VALUES нет ключа кэша, и SQLAlchemy компилировал
+# бы запрос заново при каждом выполнении.
+apply_payment = build_apply_statement(select(
+    *(bindparam(name, type_=type_).label(name) for name, type_ in PAYMENT_COLUMNS.items()),
+    literal(0, Integer).label('position'),
+).subquery('payments'))
+
+# Запрос для пакета тоже собирается один раз: столбцы платежей передаются массивами и
+# разворачиваются через unnest, поэтому текст запроса не зависит от размера пакета и берется
+# из кэша скомпилированных запросов и кэша подготовленных запросов соединения.
+apply_payments_batch = build_apply_statement(
+    func.unnest(*(bindparam(name, type_=ARRAY(type_)) for name, type_ in PAYMENT_COLUMNS.items()))
+    .table_valued(
+        *(column(name, type_) for name, type_ in PAYMENT_COLUMNS.items()),
+        with_ordinality='position',
+        name='payments',
+    )
+    .render_derived()
+)
+
+
+async def apply_payments(session: AsyncSession, payments: list[Payment]) -> tuple[dict[str, float], set[str]]:
+    """
+    Применяет платежи одним запросом. Транзакцию БД фиксирует или откатывает вызывающий код.
+
+    Returns:
+        tuple: словарь transaction_id -> баланс счета после применения для вставленных
+        транзакций и множество transaction_id из пропущенных, которые уже были в БД
+        (остальные пропущенные относятся к счетам другого пользователя).
+
+    Raises:
+        HTTPException: 409 - Если владелец счета изменился во время применения
+    """
+    rows = await session.execute(apply_payments_batch, apply_payments_params(payments))
+    applied = {row.transaction_id: row.balance for row in rows}
+    if None in applied.values():
+        raise HTTPException(
+            status_code=409,
+            detail="Account ownership changed concurrently, retry"
+        )
+
+    not_applied = [p.transaction_id for p in payments if p.transaction_id not in applied]
+    existing_ids = set()
+    if not_applied:
+        existing = await session.execute(select_existing_transaction_ids, {'transaction_ids': not_applied})
+        existing_ids = set(existing.scalars())
+
+    return applied, existing_ids
@@ -1,4 +1,4 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, ForeignKey
+from sqlalchemy import MetaData, Table, Column, Integer, String, ForeignKey, Index
 
 auth_metadata = MetaData()
 
@@ -16,5 +16,6 @@ user = Table(
     Column("email", String, nullable=False),
     Column("full_name", String, nullable=False),
     Column("hashed_password", String, nullable=False),
-    Column("role_id", Integer, ForeignKey(role.c.id))
+    Column("role_id", Integer, ForeignKey(role.c.id)),
+    Index("ix_user_email", "email", unique=True),
 )
\ No newline at end of file
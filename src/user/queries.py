@@ -0,0 +1,7 @@
+from sqlalchemy import bindparam, select
+
+from user.models import user
+
+select_user_by_email = select(user).where(user.c.email == bindparam('email'))
+select_user_by_id = select(user).where(user.c.id == bindparam('user_id'))
+delete_user_by_id = user.delete().where(user.c.id == bindparam('user_id'))
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordRequestForm
 
 from datetime import timedelta
 
-from sqlalchemy import select, insert
-from user.schemas import Token, User
+from sqlalchemy import insert
+from user.schemas import Token, User, UserCreate, CurrentUserInfo, UserRecordInfo, UserPage
 from user.models import user
-from user.utils import authenticate_user, create_access_token, get_current_user
+from user.queries import select_user_by_id, delete_user_by_id
+from user.utils import authenticate_user, create_access_token, get_current_user, revoked_users, hash_password
 from config import ACCESS_TOKEN_EXPIRE_MINUTES
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_async_session
+from database import get_async_session, get_read_session
+from pagination import keyset_page, ndjson_response, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from singleflight import coalesced_response, singleflight
 
 from user.utils import verify_admin
 
@@ -39,6 +42,7 @@ async def login(
 
     Raises:
         HTTPException: 401 - При неверных учетных данных
+        HTTPException: 429 - Если очередь проверки паролей переполнена
 
     """
     user = await authenticate_user(form_data.username, form_data.password, session)
@@ -50,12 +54,18 @@ async def login(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user['email']}, expires_delta=access_token_expires
+        data={
+            "sub": user['email'],
+            "id": user['id'],
+            "full_name": user['full_name'],
+            "role_id": user['role_id'],
+        },
+        expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.get("/user")
+@router.get("/user", response_model=CurrentUserInfo)
 async def get_user(current_user: User = Depends(get_current_user)):
     """
     Получение информации о текущем аутентифицированном пользователе.
@@ -68,10 +78,10 @@ async def get_user(current_user: User = Depends(get_current_user)):
     return {'user_info': current_user}
 
 
-@router.get("/admin/user_info/{user_id}")
+@router.get("/admin/user_info/{user_id}", response_model=UserRecordInfo)
 async def user_info(
         user_id: int,
-        session: AsyncSession = Depends(get_async_session),
+        session: AsyncSession = Depends(get_read_session),
         _: User = Depends(verify_admin),
 ):
     """
@@ -90,17 +100,16 @@ async def user_info(
         HTTPException: 403 - Если запрашивающий не является администратором
     """
 
-    query = select(user).where(user.c.id == user_id)
-    result = await session.execute(query)
-    user_info = [dict(r._mapping) for r in result]
-    if not user_info:
+    result = await session.execute(select_user_by_id, {'user_id': user_id})
+    user_info = result.first()
+    if user_info is None:
         raise HTTPException(status_code=404, detail='User not found')
-    return {'user_info': user_info[0]}
+    return {'user_info': user_info}
 
 
 @router.post('/admin/add_user')
 async def add_user(
-        user_to_add: User,
+        user_to_add: UserCreate,
         session: AsyncSession = Depends(get_async_session),
         _: User = Depends(verify_admin),
 ):
@@ -108,7 +117,7 @@ async def add_user(
         Создание нового пользователя (доступно только администраторам).
 
         Args:
-            user_to_add (UserCreateSchema): Данные для создания пользователя
+            user_to_add (UserCreate): Данные для создания пользователя с паролем в открытом виде
             session (AsyncSession): Сессия подключения к БД
             _ (User): Проверка прав администратора
 
@@ -118,11 +127,17 @@ async def add_user(
         Raises:
             HTTPException: 400 - При невалидных данных
             HTTPException: 403 - Если нет прав администратора
+            HTTPException: 429 - Если очередь хеширования паролей переполнена
     """
+    hashed_password = await hash_password(user_to_add.password)
     try:
-        stmt = insert(user).values(**user_to_add.dict())
+        stmt = insert(user).values(
+            **user_to_add.dict(exclude={'password'}),
+            hashed_password=hashed_password,
+        )
         await session.execute(stmt)
         await session.commit()
+        singleflight.invalidate('users')
         return {'status': 'User added successfully'}
     except Exception as ex:
         raise HTTPException(status_code=400, detail=str(ex))
@@ -150,38 +165,62 @@ async def delete_user(
             HTTPException: 404 - Если пользователь не найден
             HTTPException: 403 - Если запрашивающий не является администратором
     """
-    query = select(user).where(user.c.id == user_id)
-    result = await session.execute(query)
+    result = await session.execute(select_user_by_id, {'user_id': user_id})
     user_to_delete = result.scalar_one_or_none()
     if not user_to_delete:
         raise HTTPException(status_code=404, detail="User not found")
 
-    await session.execute(
-        user.delete().where(user.c.id == user_id)
-    )
+    await session.execute(delete_user_by_id, {'user_id': user_id})
     await session.commit()
+    revoked_users.revoke(user_id)
+    singleflight.invalidate('users', 'accounts')
 
     return {"message": f"User with id {user_id} deleted successfully"}
 
 
-@router.get('/admin/get_all_users')
+@router.get('/admin/get_all_users', response_model=UserPage)
 async def get_all_users(
-        session: AsyncSession = Depends(get_async_session),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+        after: int | None = None,
         _: User = Depends(verify_admin),
 ):
     """
-    Получение списка всех пользователей (только для администраторов).
+    Получение страницы списка всех пользователей, упорядоченного по ID (только для администраторов).
+    Одинаковые одновременные запросы выполняют одну выборку (см. singleflight).
 
     Args:
-        session (AsyncSession): Асинхронная сессия подключения к БД
+        limit (int): Максимальное количество пользователей на странице
+        after (int | None): ID последнего пользователя предыдущей страницы
         _ (User): Проверка прав администратора (не используется напрямую)
 
     Returns:
-        dict: Словарь с ключом 'users', содержащим список пользователей
+        dict: Словарь с ключом 'users', содержащим страницу пользователей, и ключом 'next_after'
+        со значением after для следующей страницы (None, если страница последняя)
         
     Raises:
         HTTPException: 403 - Если запрашивающий не является администратором
     """
-    query = select(user)
-    result = await session.execute(query)
-    return {'users': [dict(r._mapping) for r in result]}
+    async def query(session: AsyncSession) -> dict:
+        users, next_after = await keyset_page(session, user, user.c.id, limit, after)
+        return {'users': users, 'next_after': next_after}
+
+    return await coalesced_response('users', ('get_all_users', limit, after), UserPage, query)
+
+
+@router.get('/admin/stream_all_users')
+async def stream_all_users(
+        _: User = Depends(verify_admin),
+):
+    """
+    Выгрузка всех пользователей в формате NDJSON потоком (только для администраторов).
+
+    Args:
+        _ (User): Проверка прав администратора (не используется напрямую)
+
+    Returns:
+        StreamingResponse: Поток application/x-ndjson со всеми пользователями, упорядоченными по ID
+
+    Raises:
+        HTTPException: 403 - Если запрашивающий не является администратором
+    """
+    return ndjson_response(user, user.c.id)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class User(BaseModel):
     id: int
@@ -7,6 +7,34 @@ class User(BaseModel):
     role_id: int
     hashed_password: str
 
+class UserCreate(BaseModel):
+    id: int
+    email: str
+    full_name: str
+    role_id: int
+    password: str
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+class UserInfo(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    full_name: str
+    role_id: int | None
+
+class UserRecord(UserInfo):
+    hashed_password: str
+
+class CurrentUserInfo(BaseModel):
+    user_info: UserInfo
+
+class UserRecordInfo(BaseModel):
+    user_info: UserRecord
+
+class UserPage(BaseModel):
+    users: list[UserRecord]
+    next_after: int | None
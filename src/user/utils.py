@@ -1,3 +1,8 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator
+
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -5,26 +10,102 @@ from jose import JWTError, jwt
 
 from datetime import datetime, timedelta
 
-from config import SECRET_KEY, ALGORITHM
-from sqlalchemy import select
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_STATELESS,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_async_session
+from database import get_read_session, read_session_maker
+from metrics import PASSWORD_HASH_LATENCY
 
-from user.models import user
+from account.queries import select_accounts_version
+from user.queries import select_user_by_email
 
 from user.schemas import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/user/login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+class RevokedUsers:
+    """
+    Список отозванных пользователей внутри процесса.
+
+    Токен пользователя считается отозванным, если он выпущен не позже момента отзыва.
+    Записи хранятся не дольше времени жизни токена: после этого все токены,
+    выпущенные до отзыва, истекают сами.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self._ttl = ttl_seconds
+        self._revoked_at: dict[int, float] = {}
+
+    def revoke(self, user_id: int) -> None:
+        now = time.time()
+        self._revoked_at = {
+            uid: revoked_at for uid, revoked_at in self._revoked_at.items()
+            if revoked_at + self._ttl > now
+        }
+        self._revoked_at[user_id] = now
+
+    def is_revoked(self, user_id: int, issued_at: float | None) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        if revoked_at is None:
+            return False
+        return issued_at is None or issued_at <= revoked_at
+
+
+revoked_users = RevokedUsers(ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в отдельном пуле потоков, чтобы не блокировать event loop.
+
+    bcrypt отпускает GIL на время хеширования, поэтому потоки масштабируются по ядрам.
+    Если в очереди уже max_pending операций, новые сразу отклоняются с 429.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._max_pending = max_pending
+        self._pending = 0
+
+    async def run(self, func, *args):
+        if self._pending >= self._max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many password operations, retry later",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, func, *args)
+        finally:
+            self._pending -= 1
+
+    @staticmethod
+    def _timed(func, *args):
+        with PASSWORD_HASH_LATENCY.labels(func.__name__).time():
+            return func(*args)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(
+        bcrypt.checkpw, plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+    )
+
+
+async def hash_password(plain_password: str) -> str:
+    hashed = await password_hasher.run(bcrypt.hashpw, plain_password.encode("utf-8"), bcrypt.gensalt())
+    return hashed.decode("utf-8")
 
 
 async def get_user(email: str, session: AsyncSession) -> dict | None:
-    query = select(user).where(user.c.email == email)
-    result = await session.execute(query)
+    result = await session.execute(select_user_by_email, {'email': email})
     user_row = result.fetchone()
     return dict(user_row._mapping) if user_row else None
 
@@ -33,7 +114,7 @@ async def authenticate_user(email: str, password: str, session: AsyncSession) ->
     user = await get_user(email, session)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password(password, user["hashed_password"]):
         return False
     return user
 
@@ -44,14 +125,14 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,6 +148,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
+    if AUTH_STATELESS and "id" in payload:
+        if revoked_users.is_revoked(payload["id"], payload.get("iat")):
+            raise credentials_exception
+        return {
+            "id": payload["id"],
+            "email": email,
+            "full_name": payload["full_name"],
+            "role_id": payload["role_id"],
+        }
+
     user = await get_user(email, session)
     if user is None:
         raise credentials_exception
@@ -76,6 +167,14 @@ async def get_current_user(
     return user
 
 
+async def get_user_read_session(
+        current_user: User = Depends(get_current_user)
+) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия чтения данных текущего пользователя с учетом его недавних записей (read-your-writes)."""
+    async with read_session_maker(current_user['id'])() as session:
+        yield session
+
+
 async def verify_admin(
         current_user: User = Depends(get_current_user)
 ) -> User:
@@ -85,3 +184,15 @@ async def verify_admin(
             detail="Need Admin role"
         )
     return current_user
+
+
+async def get_balance_etag(user_id: int, session: AsyncSession) -> str:
+    """ETag счетов и истории транзакций пользователя; меняется при каждом его платеже."""
+    result = await session.execute(select_accounts_version, {'user_id': user_id})
+    return f'W/"{user_id}-{result.scalar() or 0}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
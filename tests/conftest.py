@@ -0,0 +1,121 @@
+"""
+Общие фикстуры тестов.
+
+Тесты с фикстурой db работают с БД из .env (DB_*), к которой применены миграции
+(alembic upgrade head), и пропускаются, если БД недоступна. Тестовые пользователи
+и счета создаются с ID больше существующих и удаляются после теста вместе со всеми
+связанными строками, но очередь платежей и сверка общие на БД, поэтому использовать
+для тестов нужно отдельную БД.
+"""
+import hashlib
+
+import httpx
+import pytest
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.exc import DBAPIError
+
+from account.models import account, account_summary, account_daily_summary
+from config import TRANSACTION_SECRET_KEY
+from database import async_session_maker, engine
+from transactions.models import (
+    transaction, transaction_key, payment_queue, reconciliation_checkpoint, archived_transaction_totals,
+)
+from transactions.schemas import Payment
+from user.models import user
+from user.utils import create_access_token
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def api():
+    """Клиент приложения без запуска lifespan (фоновые задачи и прогрев пула не нужны)."""
+    from main import app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        yield client
+
+
+@pytest.fixture
+async def db():
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text('SELECT 1'))
+    except (OSError, DBAPIError) as ex:
+        pytest.skip(f'database is not available: {ex}')
+    factory = Factory()
+    yield factory
+    await factory.cleanup()
+    # Пул привязан к event loop теста.
+    await engine.dispose()
+
+
+class Factory:
+    """Создает тестовых пользователей и счета и удаляет все их строки после теста."""
+
+    def __init__(self):
+        self.user_ids: list[int] = []
+        self.account_ids: list[int] = []
+
+    async def user(self, role_id: int = 2) -> int:
+        async with async_session_maker() as session:
+            user_id = (await session.execute(select(func.coalesce(func.max(user.c.id), 0) + 1))).scalar()
+            await session.execute(insert(user).values(
+                id=user_id, email=f'test-{user_id}@example.com', full_name='Test', hashed_password='-', role_id=role_id,
+            ))
+            await session.commit()
+        self.user_ids.append(user_id)
+        return user_id
+
+    async def account(self, user_id: int, amount: float = 0.0) -> int:
+        async with async_session_maker() as session:
+            account_id = (await session.execute(select(func.coalesce(func.max(account.c.id), 0) + 1))).scalar()
+            await session.execute(insert(account).values(id=account_id, user_id=user_id, amount=amount))
+            await session.commit()
+        self.account_ids.append(account_id)
+        return account_id
+
+    def new_account_id(self) -> int:
+        """ID счета, которого еще нет: его создаст первый платеж."""
+        account_id = max(self.account_ids, default=0) + 1000000
+        self.account_ids.append(account_id)
+        return account_id
+
+    async def balance(self, account_id: int) -> float | None:
+        async with async_session_maker() as session:
+            return (await session.execute(select(account.c.amount).where(account.c.id == account_id))).scalar()
+
+    async def cleanup(self) -> None:
+        async with async_session_maker() as session:
+            user_ids, account_ids = self.user_ids, self.account_ids
+            await session.execute(delete(payment_queue).where(payment_queue.c.user_id.in_(user_ids)))
+            await session.execute(delete(transaction).where(transaction.c.user_id.in_(user_ids)))
+            await session.execute(delete(transaction_key).where(transaction_key.c.user_id.in_(user_ids)))
+            for table in (account_summary, account_daily_summary, reconciliation_checkpoint, archived_transaction_totals):
+                await session.execute(delete(table).where(table.c.account_id.in_(account_ids)))
+            await session.execute(delete(account).where(
+                account.c.id.in_(account_ids) | account.c.user_id.in_(user_ids)
+            ))
+            await session.execute(delete(user).where(user.c.id.in_(user_ids)))
+            await session.commit()
+
+
+def payment(transaction_id: str, account_id: int, user_id: int, amount: int) -> Payment:
+    """Платеж с верной подписью."""
+    message = f'{account_id}{amount}{transaction_id}{user_id}{TRANSACTION_SECRET_KEY}'
+    return Payment(
+        transaction_id=transaction_id,
+        account_id=account_id,
+        user_id=user_id,
+        amount=amount,
+        signature=hashlib.sha256(message.encode()).hexdigest(),
+    )
+
+
+def auth_headers(user_id: int, role_id: int = 2) -> dict:
+    token = create_access_token(
+        {'sub': f'test-{user_id}@example.com', 'id': user_id, 'full_name': 'Test', 'role_id': role_id}
+    )
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,97 @@
+import asyncio
+
+import asyncpg
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from account import events
+from account.events import RESYNC, AccountEventHub, account_event_hub
+from database import async_session_maker
+
+pytestmark = pytest.mark.anyio
+
+APPLICATION_NAME = 'account-events-test'
+
+
+def hub(dsn: str = account_event_hub._dsn) -> AccountEventHub:
+    return AccountEventHub(dsn, buffer=10, max_subscribers=10, liveness_interval=0.2, liveness_timeout=1)
+
+
+async def next_event(subscriber, timeout: float = 5):
+    return await asyncio.wait_for(subscriber.queue.get(), timeout)
+
+
+async def test_malformed_payload_is_skipped():
+    events_hub = hub()
+    subscriber = events_hub.subscribe(1)
+
+    for payload in ('not json', '[]', '{"user_id": 1}'):
+        events_hub._on_notification(None, 0, events.ACCOUNT_EVENTS_CHANNEL, payload)
+    events_hub._on_notification(None, 0, events.ACCOUNT_EVENTS_CHANNEL, '{"user_id": 1, "account_id": 2}')
+
+    assert events_hub.malformed == 3
+    assert subscriber.queue.get_nowait() == {'user_id': 1, 'account_id': 2}
+    assert subscriber.queue.empty()
+
+
+async def test_add_listener_failure_reconnects(db, monkeypatch):
+    monkeypatch.setattr(events, 'RECONNECT_DELAY', 0.05)
+    add_listener = asyncpg.Connection.add_listener
+    failures = [asyncpg.InterfaceError('listener failed')]
+
+    async def flaky_add_listener(self, channel, callback):
+        if failures:
+            raise failures.pop()
+        await add_listener(self, channel, callback)
+
+    monkeypatch.setattr(asyncpg.Connection, 'add_listener', flaky_add_listener)
+    events_hub = hub()
+    subscriber = events_hub.subscribe(1)
+    events_hub.start()
+    try:
+        assert await next_event(subscriber) is RESYNC
+        assert events_hub.connected
+        assert events_hub.reconnects == 1
+    finally:
+        await events_hub.stop()
+
+
+async def test_terminated_connection_reconnects_with_resync(db, monkeypatch):
+    monkeypatch.setattr(events, 'RECONNECT_DELAY', 0.05)
+    events_hub = hub(f'{account_event_hub._dsn}?application_name={APPLICATION_NAME}')
+    subscriber = events_hub.subscribe(1)
+    events_hub.start()
+    try:
+        assert await next_event(subscriber) is RESYNC
+        async with async_session_maker() as session:
+            await session.execute(
+                text('SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE application_name = :name'),
+                {'name': APPLICATION_NAME},
+            )
+        assert await next_event(subscriber) is RESYNC
+        assert events_hub.reconnects >= 1
+    finally:
+        await events_hub.stop()
+
+
+async def test_stream_subscribes_only_while_read():
+    events_hub = hub()
+    stream = events_hub.stream(1)
+    # Клиент отключился до чтения тела: подписчика нет.
+    assert events_hub.stats()['subscribers'] == 0
+
+    assert await stream.__anext__() == b'event: ready\ndata: {}\n\n'
+    assert events_hub.stats()['subscribers'] == 1
+    await stream.aclose()
+    assert events_hub.stats()['subscribers'] == 0
+
+
+async def test_check_capacity_rejects_over_limit():
+    events_hub = hub()
+    for _ in range(10):
+        events_hub.subscribe(1)
+
+    with pytest.raises(HTTPException) as error:
+        events_hub.check_capacity()
+    assert error.value.status_code == 503
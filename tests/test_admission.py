@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, PriorityClass, TokenBuckets
+
+pytestmark = pytest.mark.anyio
+
+
+def controller(capacity: int = 1, max_wait: float = 1) -> AdmissionController:
+    return AdmissionController(
+        [
+            PriorityClass('payment', 0, capacity, max_wait, False),
+            PriorityClass('user', 1, capacity, max_wait, True),
+            PriorityClass('admin', 2, max(1, capacity // 2), 0, True),
+        ],
+        max_waiters=10,
+    )
+
+
+async def test_freed_slot_goes_to_highest_priority_waiter():
+    admission = controller()
+    payment, user = admission.classes['payment'], admission.classes['user']
+    assert await admission.acquire(payment)
+
+    user_waiter = asyncio.create_task(admission.acquire(user))
+    await asyncio.sleep(0)
+    payment_waiter = asyncio.create_task(admission.acquire(payment))
+    await asyncio.sleep(0)
+    assert admission.waiting == {'payment': 1, 'user': 1, 'admin': 0}
+
+    admission.release()
+    assert await payment_waiter
+    assert not user_waiter.done()
+
+    admission.release()
+    assert await user_waiter
+    assert admission.inflight == 1
+
+
+async def test_new_request_does_not_overtake_waiters():
+    admission = controller(capacity=2)
+    payment, admin = admission.classes['payment'], admission.classes['admin']
+    assert await admission.acquire(payment)
+    assert await admission.acquire(payment)
+    waiter = asyncio.create_task(admission.acquire(payment))
+    await asyncio.sleep(0)
+
+    admission.release()
+    # Освободившееся место сразу отдано ожидающему, а не следующему пришедшему.
+    assert admission.inflight == 2
+    assert not await admission.acquire(admin)
+    assert await waiter
+
+
+async def test_lower_class_is_cut_at_its_share():
+    admission = controller(capacity=4)
+    admin, payment = admission.classes['admin'], admission.classes['payment']
+    assert await admission.acquire(admin)
+    assert await admission.acquire(admin)
+    assert not await admission.acquire(admin)
+    assert await admission.acquire(payment)
+    assert admission.stats()['admitted'] == {'payment': 1, 'user': 0, 'admin': 2}
+
+
+async def test_waiter_times_out():
+    admission = controller(max_wait=0.05)
+    payment = admission.classes['payment']
+    assert await admission.acquire(payment)
+
+    assert not await admission.acquire(payment)
+    assert admission.waiting['payment'] == 0
+    admission.release()
+    assert admission.inflight == 0
+
+
+def test_token_bucket_allows_burst_then_limits():
+    buckets = TokenBuckets(rate=1, burst=2)
+
+    assert buckets.take('a') == 0
+    assert buckets.take('a') == 0
+    assert 0 < buckets.take('a') <= 1
+    assert buckets.take('b') == 0
+
+
+def test_token_buckets_evict_least_recently_used():
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    for key in ('a', 'b', 'c'):
+        assert buckets.take(key) == 0
+
+    # Корзина 'a' вытеснена и создается заново полной.
+    assert buckets.take('a') == 0
+    assert buckets.take('c') > 0
@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.engine.default import CacheStats
+
+from account.models import account, account_summary
+from conftest import auth_headers, payment
+from database import async_session_maker, engine
+from transactions.utils import apply_payment, apply_payments, apply_payments_batch, apply_payments_params
+
+pytestmark = pytest.mark.anyio
+
+
+def ids(count: int) -> list[str]:
+    prefix = uuid.uuid4().hex
+    return [f'{prefix}-{number}' for number in range(count)]
+
+
+async def apply(*payments):
+    async with async_session_maker() as session:
+        applied, existing_ids = await apply_payments(session, list(payments))
+        await session.commit()
+    return applied, existing_ids
+
+
+async def test_owner_is_checked_against_db_not_batch_order(db):
+    owner, stranger = await db.user(), await db.user()
+    account_id = await db.account(owner, amount=100)
+    foreign, own = ids(2)
+
+    applied, existing_ids = await apply(
+        payment(foreign, account_id, stranger, 5),
+        payment(own, account_id, owner, 10),
+    )
+
+    assert applied == {own: 110}
+    assert existing_ids == set()
+    assert await db.balance(account_id) == 110
+
+
+async def test_new_account_goes_to_first_payer(db):
+    first, second = await db.user(), await db.user()
+    account_id = db.new_account_id()
+    first_1, second_1, first_2 = ids(3)
+
+    applied, _ = await apply(
+        payment(first_1, account_id, first, 10),
+        payment(second_1, account_id, second, 99),
+        payment(first_2, account_id, first, 5),
+    )
+
+    assert applied == {first_1: 15, first_2: 15}
+    async with async_session_maker() as session:
+        owner = (await session.execute(select(account.c.user_id).where(account.c.id == account_id))).scalar()
+    assert owner == first
+
+
+async def test_repeated_transaction_is_reported_existing(db):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    first, second = ids(2)
+    await apply(payment(first, account_id, owner, 10))
+
+    applied, existing_ids = await apply(payment(first, account_id, owner, 10), payment(second, account_id, owner, 1))
+
+    assert applied == {second: 11}
+    assert existing_ids == {first}
+    async with async_session_maker() as session:
+        summary = (await session.execute(
+            select(account_summary.c.total, account_summary.c.transaction_count)
+            .where(account_summary.c.account_id == account_id)
+        )).one()
+    assert tuple(summary) == (11, 2)
+
+
+async def test_batch_endpoint_statuses(db, api):
+    owner, stranger = await db.user(), await db.user()
+    account_id = await db.account(owner)
+    foreign, own, repeated = ids(3)
+    body = [
+        payment(foreign, account_id, stranger, 5).model_dump(),
+        payment(own, account_id, owner, 10).model_dump(),
+        payment(own, account_id, owner, 10).model_dump(),
+        {**payment(repeated, account_id, owner, 1).model_dump(), 'signature': 'bad'},
+    ]
+
+    response = await api.post('/transaction/make_transactions_batch', json=body, headers=auth_headers(owner))
+
+    assert response.status_code == 200
+    assert [(r['status'], r['new_balance']) for r in response.json()['results']] == [
+        ('account_mismatch', None),
+        ('applied', 10),
+        ('duplicate', None),
+        ('invalid_signature', None),
+    ]
+
+
+
+@pytest.mark.parametrize('batch', [False, True])
+async def test_apply_statement_is_compiled_once(db, batch):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    cache_stats = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        cache_stats.append(context.cache_hit)
+
+    # Пересборка запроса на каждый платеж стоила больше CPU, чем он экономил на обращениях к БД.
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        for transaction_id in ids(2):
+            data = payment(transaction_id, account_id, owner, 1)
+            async with async_session_maker() as session:
+                if batch:
+                    await session.execute(apply_payments_batch, apply_payments_params([data]))
+                else:
+                    await session.execute(apply_payment, data.model_dump())
+                await session.commit()
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+    assert cache_stats[-1] is CacheStats.CACHE_HIT
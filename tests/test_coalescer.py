@@ -0,0 +1,51 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import payment
+from transactions.coalescer import PaymentCoalescer
+
+pytestmark = pytest.mark.anyio
+
+
+async def submit_all(coalescer: PaymentCoalescer, payments) -> list:
+    results = await asyncio.gather(*(coalescer.submit(p) for p in payments), return_exceptions=True)
+    await coalescer.close()
+    return [r.detail if isinstance(r, HTTPException) else r for r in results]
+
+
+async def test_results_fan_out_in_submit_order(db):
+    owner, stranger = await db.user(), await db.user()
+    account_id = await db.account(owner, amount=100)
+    prefix = uuid.uuid4().hex
+    payments = [
+        payment(f'{prefix}-foreign', account_id, stranger, 1),
+        payment(f'{prefix}-1', account_id, owner, 10),
+        payment(f'{prefix}-2', account_id, owner, -30),
+        payment(f'{prefix}-1', account_id, owner, 10),
+        payment(f'{prefix}-3', account_id, owner, 5),
+    ]
+
+    results = await submit_all(PaymentCoalescer(max_batch=10, max_linger=0.05), payments)
+
+    assert results == [
+        'Account belongs to another user',
+        110,
+        80,
+        'Transaction already processed',
+        85,
+    ]
+    assert await db.balance(account_id) == 85
+
+
+async def test_batches_split_at_max_batch(db):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    prefix = uuid.uuid4().hex
+    payments = [payment(f'{prefix}-{number}', account_id, owner, 1) for number in range(5)]
+
+    results = await submit_all(PaymentCoalescer(max_batch=2, max_linger=0.05), payments)
+
+    assert results == [1, 2, 3, 4, 5]
@@ -0,0 +1,44 @@
+import uuid
+
+import pytest
+
+from conftest import auth_headers, payment
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_payment_changes_etag(db, api):
+    owner = await db.user()
+    account_id = await db.account(owner, amount=10)
+    headers = auth_headers(owner)
+
+    first = await api.get('/account/my_account_info', headers=headers)
+    etag = first.headers['ETag']
+    not_modified = await api.get('/account/my_account_info', headers={**headers, 'If-None-Match': etag})
+    assert not_modified.status_code == 304
+
+    response = await api.post(
+        '/transaction/make_transaction', headers=headers,
+        json=payment(uuid.uuid4().hex, account_id, owner, 5).model_dump(),
+    )
+    assert response.status_code == 200
+
+    for path in ('/account/my_account_info', '/transaction/transactions_info'):
+        changed = await api.get(path, headers={**headers, 'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+
+
+async def test_other_users_payment_keeps_etag(db, api):
+    owner, other = await db.user(), await db.user()
+    await db.account(owner, amount=10)
+    other_account_id = await db.account(other)
+    etag = (await api.get('/account/my_account_info', headers=auth_headers(owner))).headers['ETag']
+
+    await api.post(
+        '/transaction/make_transaction', headers=auth_headers(other),
+        json=payment(uuid.uuid4().hex, other_account_id, other, 5).model_dump(),
+    )
+
+    response = await api.get('/account/my_account_info', headers={**auth_headers(owner), 'If-None-Match': etag})
+    assert response.status_code == 304
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from diagnostics.event_loop import EventLoopMonitor
+
+pytestmark = pytest.mark.anyio
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+async def blocking_handler() -> None:
+    await asyncio.sleep(0)
+    block_the_loop(0.3)
+
+
+async def test_stall_is_captured_with_blocking_stack():
+    monitor = EventLoopMonitor(interval=0.01, threshold=0.05, history=10)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        await asyncio.create_task(blocking_handler(), name='blocking-request')
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    stats = monitor.stats()
+    assert not stats['running']
+    assert stats['stalls_total'] == 1
+    assert stats['max_lag_seconds'] >= 0.25
+    stall = stats['recent_stalls'][0]
+    assert stall['task'] == 'blocking-request'
+    assert stall['coroutine'] == 'blocking_handler'
+    assert stall['duration_seconds'] >= 0.25
+    assert any('block_the_loop' in line for line in stall['stack'])
+
+
+async def test_idle_loop_has_no_stalls():
+    monitor = EventLoopMonitor(interval=0.01, threshold=0.2, history=10)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+
+    assert monitor.stats()['stalls_total'] == 0
+    assert monitor.stats()['recent_stalls'] == []
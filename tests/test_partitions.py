@@ -0,0 +1,81 @@
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import insert, select, text
+
+from account.models import account_summary
+from account.summary import rebuild_chunk
+from database import async_session_maker
+from transactions.models import archived_transaction_totals, reconciliation_checkpoint, transaction, transaction_key
+from transactions.partitions import add_months, archive_partition, partition_name
+from transactions.reconciliation import reconcile_incremental
+
+pytestmark = pytest.mark.anyio
+
+MONTH = date(2001, 1, 1)
+PARTITION = partition_name(MONTH)
+
+
+async def add_transaction(user_id: int, account_id: int, amount: float, day: int) -> None:
+    transaction_id = uuid.uuid4().hex
+    created_at = datetime(MONTH.year, MONTH.month, day, tzinfo=timezone.utc)
+    async with async_session_maker() as session:
+        await session.execute(insert(transaction_key).values(
+            transaction_id=transaction_id, user_id=user_id, created_at=created_at,
+        ))
+        await session.execute(insert(transaction).values(
+            transaction_id=transaction_id, user_id=user_id, account_id=account_id, amount=amount,
+            signature='-', created_at=created_at,
+        ))
+        await session.commit()
+
+
+async def reconcile() -> dict:
+    async with async_session_maker() as session:
+        return await reconcile_incremental(session)
+
+
+@pytest.fixture
+async def old_partition(db):
+    async with async_session_maker() as session:
+        await session.execute(text(
+            f"CREATE TABLE {PARTITION} PARTITION OF transaction "
+            f"FOR VALUES FROM ('{MONTH.isoformat()} 00:00+00') TO ('{add_months(MONTH, 1).isoformat()} 00:00+00')"
+        ))
+        await session.commit()
+    yield
+    async with async_session_maker() as session:
+        await session.execute(text(f'DROP TABLE IF EXISTS {PARTITION}'))
+        await session.commit()
+
+
+async def test_archive_keeps_ledger_totals(db, old_partition, tmp_path):
+    owner = await db.user()
+    account_id = await db.account(owner, amount=30)
+    await add_transaction(owner, account_id, 10, day=5)
+    # Первая строка свернута сверкой, вторая еще нет: обе должны остаться в итогах.
+    await reconcile()
+    await add_transaction(owner, account_id, 20, day=6)
+
+    path = await archive_partition(PARTITION, str(tmp_path), drop=True)
+
+    assert len((tmp_path / f'{PARTITION}.csv').read_text().splitlines()) == 3
+    assert path.endswith(f'{PARTITION}.csv')
+    report = await reconcile()
+    assert account_id not in {row['account_id'] for row in report['drift']}
+    await rebuild_chunk(account_id, account_id)
+    async with async_session_maker() as session:
+        checkpoint = (await session.execute(
+            select(reconciliation_checkpoint.c.ledger_total, reconciliation_checkpoint.c.transaction_count)
+            .where(reconciliation_checkpoint.c.account_id == account_id)
+        )).one()
+        archived = (await session.execute(
+            select(archived_transaction_totals.c.total, archived_transaction_totals.c.transaction_count)
+            .where(archived_transaction_totals.c.account_id == account_id)
+        )).one()
+        summary = (await session.execute(
+            select(account_summary.c.total, account_summary.c.transaction_count)
+            .where(account_summary.c.account_id == account_id)
+        )).one()
+    assert tuple(checkpoint) == tuple(archived) == tuple(summary) == (30, 2)
@@ -0,0 +1,82 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select
+
+from conftest import payment
+from database import async_session_maker
+from transactions.models import payment_queue
+from transactions.queries import enqueue_payment
+from transactions.queue import PaymentQueueWorkers
+
+pytestmark = pytest.mark.anyio
+
+
+async def enqueue(*payments) -> None:
+    async with async_session_maker() as session:
+        await session.execute(enqueue_payment, [p.model_dump() for p in payments])
+        await session.commit()
+
+
+async def queue_rows(transaction_ids: list[str]) -> dict[str, tuple]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(payment_queue.c.transaction_id, payment_queue.c.status, payment_queue.c.attempts)
+            .where(payment_queue.c.transaction_id.in_(transaction_ids))
+        )
+        return {row.transaction_id: (row.status, row.attempts) for row in result}
+
+
+def workers(max_attempts: int = 3) -> PaymentQueueWorkers:
+    return PaymentQueueWorkers(1, 100, 0, max_attempts, timedelta(hours=1), 1)
+
+
+async def test_failing_payment_does_not_fail_batch(db):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    # Пользователя нет: вставка платежа нарушает внешний ключ.
+    ghost = owner + 1000
+    db.user_ids.append(ghost)
+    prefix = uuid.uuid4().hex
+    ok_1 = payment(f'{prefix}-1', account_id, owner, 10)
+    bad = payment(f'{prefix}-bad', db.new_account_id(), ghost, 5)
+    ok_2 = payment(f'{prefix}-2', account_id, owner, 20)
+    await enqueue(ok_1, bad, ok_2)
+    ids = [ok_1.transaction_id, bad.transaction_id, ok_2.transaction_id]
+    queue = workers(max_attempts=2)
+
+    assert await queue.process_batch() == 3
+    assert await queue_rows(ids) == {
+        ok_1.transaction_id: ('applied', 0),
+        bad.transaction_id: ('pending', 1),
+        ok_2.transaction_id: ('applied', 0),
+    }
+    assert await db.balance(account_id) == 30
+
+    assert await queue.process_batch() == 1
+    assert (await queue_rows([bad.transaction_id]))[bad.transaction_id] == ('failed', 2)
+    assert queue.processed['applied'] == 2
+    assert queue.processed['failed'] == 1
+    assert await queue.process_batch() == 0
+
+
+async def test_duplicate_in_queue_is_reported(db):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    first = payment(uuid.uuid4().hex, account_id, owner, 7)
+    await enqueue(first)
+    assert await workers().process_batch() == 1
+
+    # Тот же transaction_id уже применен: повтор не должен изменить баланс.
+    repeat = payment(first.transaction_id, account_id, owner, 7)
+    async with async_session_maker() as session:
+        await session.execute(
+            payment_queue.update()
+            .where(payment_queue.c.transaction_id == first.transaction_id)
+            .values(status='pending')
+        )
+        await session.commit()
+    assert await workers().process_batch() == 1
+    assert await queue_rows([repeat.transaction_id]) == {repeat.transaction_id: ('duplicate', 0)}
+    assert await db.balance(account_id) == 7
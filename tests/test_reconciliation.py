@@ -0,0 +1,20 @@
+import pytest
+
+from conftest import auth_headers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reconcile_reports_drift(db, api):
+    admin = await db.user(role_id=1)
+    owner = await db.user()
+    # Баланс без единой транзакции - расхождение на всю сумму.
+    account_id = await db.account(owner, amount=100)
+
+    response = await api.post('/transaction/admin/reconcile', headers=auth_headers(admin, role_id=1))
+
+    assert response.status_code == 200
+    report = response.json()
+    assert set(report) == {'mode', 'accounts_folded', 'drifted_accounts', 'drift'}
+    assert report['mode'] == 'incremental'
+    assert {'account_id': account_id, 'drift': 100.0} in report['drift']
@@ -0,0 +1,114 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from conftest import auth_headers, payment
+from database import engine
+from transactions.router import seen_transactions
+from transactions.seen_ids import BloomFilter, SeenState, SeenTransactions
+
+pytestmark = pytest.mark.anyio
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f'tx-{number}' for number in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other-{number}' in bloom for number in range(10000))
+    assert false_positives < 300
+
+
+def test_evicted_recent_id_is_maybe_seen():
+    seen = SeenTransactions(recent_size=2, capacity=100, error_rate=0.01)
+    for transaction_id in ('a', 'b', 'c'):
+        seen.add(transaction_id)
+
+    assert seen.check('c') is SeenState.recent
+    assert seen.check('a') is SeenState.maybe
+    assert seen.check('never') is SeenState.new
+
+
+@contextmanager
+def recorded_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+
+async def test_maybe_seen_duplicate_rejected_by_lookup(db, api):
+    owner = await db.user()
+    account_id = await db.account(owner, amount=10)
+    transaction_id = uuid.uuid4().hex
+    body = payment(transaction_id, account_id, owner, 5).model_dump()
+    assert (await api.post('/transaction/make_transaction', headers=auth_headers(owner), json=body)).status_code == 200
+    # Как после вытеснения из LRU: ID остался только в фильтре Блума.
+    seen_transactions._recent.pop(transaction_id)
+
+    with recorded_statements() as statements:
+        response = await api.post('/transaction/make_transaction', headers=auth_headers(owner), json=body)
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Transaction already processed'
+    assert len(statements) == 1 and statements[0].lstrip().startswith('SELECT')
+    assert seen_transactions.check(transaction_id) is SeenState.recent
+
+
+async def test_maybe_seen_new_payment_counts_false_positive(db, api):
+    owner = await db.user()
+    account_id = await db.account(owner, amount=10)
+    transaction_id = uuid.uuid4().hex
+    seen_transactions._bloom.add(transaction_id)
+    maybe_seen, false_positives = seen_transactions.maybe_seen, seen_transactions.false_positives
+
+    response = await api.post(
+        '/transaction/make_transaction', headers=auth_headers(owner),
+        json=payment(transaction_id, account_id, owner, 5).model_dump(),
+    )
+
+    assert response.status_code == 200
+    assert response.json()['new_balance'] == 15
+    assert seen_transactions.maybe_seen == maybe_seen + 1
+    assert seen_transactions.false_positives == false_positives + 1
+
+
+async def test_batch_checks_only_recent_ids(db, api):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    transaction_id = uuid.uuid4().hex
+    seen_transactions._bloom.add(transaction_id)
+    maybe_seen = seen_transactions.maybe_seen
+
+    response = await api.post(
+        '/transaction/make_transactions_batch', headers=auth_headers(owner),
+        json=[payment(transaction_id, account_id, owner, 5).model_dump()],
+    )
+
+    assert response.json()['results'][0]['status'] == 'applied'
+    assert seen_transactions.maybe_seen == maybe_seen
+
+
+async def test_warmup_loads_existing_ids(db, api):
+    owner = await db.user()
+    account_id = await db.account(owner)
+    transaction_id = uuid.uuid4().hex
+    await api.post(
+        '/transaction/make_transaction', headers=auth_headers(owner),
+        json=payment(transaction_id, account_id, owner, 5).model_dump(),
+    )
+    seen = SeenTransactions(recent_size=10, capacity=100000, error_rate=0.01)
+
+    await seen.warmup(chunk_rows=1000)
+
+    assert seen.check(transaction_id) is SeenState.maybe
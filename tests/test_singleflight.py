@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class Fetch:
+    """fetch, который ждет release и считает свои вызовы."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        await self.release.wait()
+        return f'body-{self.calls}'.encode()
+
+
+async def test_concurrent_requests_share_one_fetch():
+    flight, fetch = SingleFlight(ttl=0, max_entries=10), Fetch()
+    waiters = [asyncio.create_task(flight.do('accounts', 'page', fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    fetch.release.set()
+
+    assert await asyncio.gather(*waiters) == [b'body-1'] * 5
+    assert fetch.calls == 1
+    assert flight.stats()['executed'] == 1
+    assert flight.stats()['shared'] == 4
+
+
+async def test_cancelled_waiter_does_not_cancel_fetch():
+    flight, fetch = SingleFlight(ttl=0, max_entries=10), Fetch()
+    first = asyncio.create_task(flight.do('accounts', 'page', fetch))
+    second = asyncio.create_task(flight.do('accounts', 'page', fetch))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    fetch.release.set()
+
+    assert await second == b'body-1'
+    assert first.cancelled()
+
+
+async def test_fetch_error_reaches_all_waiters_and_is_not_cached():
+    flight = SingleFlight(ttl=60, max_entries=10)
+    calls = 0
+
+    async def failing() -> bytes:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        raise RuntimeError('db is down')
+
+    results = await asyncio.gather(
+        *(flight.do('users', 'page', failing) for _ in range(3)), return_exceptions=True
+    )
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    with pytest.raises(RuntimeError):
+        await flight.do('users', 'page', failing)
+    assert calls == 2
+
+
+async def test_cached_response_until_invalidated():
+    flight, fetch = SingleFlight(ttl=60, max_entries=10), Fetch()
+    fetch.release.set()
+
+    assert await flight.do('accounts', 'page', fetch) == b'body-1'
+    assert await flight.do('accounts', 'page', fetch) == b'body-1'
+    flight.invalidate('users')
+    assert await flight.do('accounts', 'page', fetch) == b'body-1'
+
+    flight.invalidate('accounts')
+    assert await flight.do('accounts', 'page', fetch) == b'body-2'
+    assert fetch.calls == 2
+
+
+async def test_fetch_started_before_write_is_not_cached():
+    flight, fetch = SingleFlight(ttl=60, max_entries=10), Fetch()
+    before_write = asyncio.create_task(flight.do('accounts', 'page', fetch))
+    await asyncio.sleep(0)
+
+    flight.invalidate('accounts')
+    fetch.release.set()
+
+    assert await before_write == b'body-1'
+    assert await flight.do('accounts', 'page', fetch) == b'body-2'
@@ -0,0 +1,19 @@
+import orjson
+import pytest
+
+from conftest import auth_headers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ndjson_stream_encodes_rows(db, api):
+    admin = await db.user(role_id=1)
+    owner = await db.user()
+    account_id = await db.account(owner, amount=12.5)
+
+    response = await api.get('/account/admin/stream_all_accounts', headers=auth_headers(admin, role_id=1))
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert {'id': account_id, 'user_id': owner, 'amount': 12.5} in rows